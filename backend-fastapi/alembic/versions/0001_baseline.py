@@ -0,0 +1,108 @@
+"""Исходная схема: users, chats, chat_members, messages, attachments (+ handle, email nullable).
+
+Идемпотентна: базы, поднятые старым create_all или infrastructure/postgres/init.sql,
+остаются как есть, недостающее добавляется (бывшие run_handle_migration / run_email_nullable_migration).
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id UUID PRIMARY KEY,
+            username VARCHAR(50) NOT NULL,
+            handle VARCHAR(50),
+            email VARCHAR(255),
+            password_hash VARCHAR(255) NOT NULL,
+            avatar VARCHAR(500),
+            online_status VARCHAR(20),
+            created_at TIMESTAMP WITH TIME ZONE,
+            updated_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS chats (
+            id UUID PRIMARY KEY,
+            type VARCHAR(20) NOT NULL,
+            name VARCHAR(255),
+            created_at TIMESTAMP WITH TIME ZONE,
+            updated_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS chat_members (
+            id UUID PRIMARY KEY,
+            chat_id UUID NOT NULL REFERENCES chats(id) ON DELETE CASCADE,
+            user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            role VARCHAR(20),
+            joined_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            id UUID PRIMARY KEY,
+            chat_id UUID NOT NULL REFERENCES chats(id) ON DELETE CASCADE,
+            user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            content TEXT,
+            type VARCHAR(20),
+            created_at TIMESTAMP WITH TIME ZONE,
+            updated_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS attachments (
+            id UUID PRIMARY KEY,
+            message_id UUID NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
+            url VARCHAR(500) NOT NULL,
+            type VARCHAR(50),
+            filename VARCHAR(255),
+            created_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+
+    # handle: старые базы могли быть созданы без него — добавляем и заполняем slug(username)_начало id
+    op.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS handle VARCHAR(50)")
+    op.execute("""
+        UPDATE users
+        SET handle = LOWER(REGEXP_REPLACE(TRIM(COALESCE(username, 'user')), '[^a-z0-9_]', '_', 'g'))
+            || '_' || REPLACE(SUBSTRING(id::text FROM 1 FOR 8), '-', '')
+        WHERE handle IS NULL OR handle = ''
+    """)
+    op.execute("ALTER TABLE users ALTER COLUMN handle SET NOT NULL")
+    # Уникальность handle есть под одним из имён: ix_users_handle (create_all) или users_handle_key (init.sql)
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_indexes
+                WHERE tablename = 'users' AND indexname IN ('ix_users_handle', 'users_handle_key')
+            ) THEN
+                CREATE UNIQUE INDEX ix_users_handle ON users (handle);
+            END IF;
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_indexes
+                WHERE tablename = 'users' AND indexname IN ('ix_users_email', 'users_email_key')
+            ) THEN
+                CREATE UNIQUE INDEX ix_users_email ON users (email);
+            END IF;
+        END $$
+    """)
+    # Регистрация только по нику и паролю — email необязателен
+    op.execute("ALTER TABLE users ALTER COLUMN email DROP NOT NULL")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS attachments")
+    op.execute("DROP TABLE IF EXISTS messages")
+    op.execute("DROP TABLE IF EXISTS chat_members")
+    op.execute("DROP TABLE IF EXISTS chats")
+    op.execute("DROP TABLE IF EXISTS users")
@@ -0,0 +1,56 @@
+"""Денормализованная сводка чата в chats (последнее сообщение, число участников).
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        ALTER TABLE chats
+            ADD COLUMN IF NOT EXISTS last_message_id UUID,
+            ADD COLUMN IF NOT EXISTS last_message_preview VARCHAR(255),
+            ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP WITH TIME ZONE,
+            ADD COLUMN IF NOT EXISTS last_message_user_id UUID,
+            ADD COLUMN IF NOT EXISTS members_count INTEGER NOT NULL DEFAULT 0
+    """)
+    op.execute("""
+        UPDATE chats c
+        SET members_count = m.n
+        FROM (SELECT chat_id, COUNT(*) AS n FROM chat_members GROUP BY chat_id) m
+        WHERE m.chat_id = c.id
+    """)
+    op.execute("""
+        UPDATE chats c
+        SET last_message_id = l.id,
+            last_message_preview = LEFT(l.content, 255),
+            last_message_at = l.created_at,
+            last_message_user_id = l.user_id,
+            updated_at = GREATEST(c.updated_at, l.created_at)
+        FROM (
+            SELECT DISTINCT ON (chat_id) chat_id, id, content, created_at, user_id
+            FROM messages
+            ORDER BY chat_id, created_at DESC
+        ) l
+        WHERE l.chat_id = c.id AND c.last_message_id IS NULL
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chats_last_message_at ON chats (last_message_at DESC NULLS LAST)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_chats_last_message_at")
+    op.execute("""
+        ALTER TABLE chats
+            DROP COLUMN IF EXISTS last_message_id,
+            DROP COLUMN IF EXISTS last_message_preview,
+            DROP COLUMN IF EXISTS last_message_at,
+            DROP COLUMN IF EXISTS last_message_user_id,
+            DROP COLUMN IF EXISTS members_count
+    """)
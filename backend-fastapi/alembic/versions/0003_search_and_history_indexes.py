@@ -0,0 +1,41 @@
+"""Keyset-индекс истории, хранимый tsvector и триграммные индексы для поиска сообщений и людей.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_messages_chat_created_id "
+        "ON messages (chat_id, created_at DESC, id DESC)"
+    )
+    op.execute(
+        "ALTER TABLE messages ADD COLUMN IF NOT EXISTS content_tsv tsvector "
+        "GENERATED ALWAYS AS (to_tsvector('russian', coalesce(content, ''))) STORED"
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS idx_messages_content_tsv ON messages USING gin (content_tsv)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_messages_content_trgm ON messages USING gin (content gin_trgm_ops)")
+    # Индекс по выражению из init.sql приложением не используется — поиск идёт по content_tsv
+    op.execute("DROP INDEX IF EXISTS idx_messages_content_fts")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_users_handle_prefix ON users (handle varchar_pattern_ops)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_users_handle_trgm ON users USING gin (handle gin_trgm_ops)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_users_username_trgm ON users USING gin (username gin_trgm_ops)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS idx_users_username_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_users_handle_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_users_handle_prefix")
+    op.execute("DROP INDEX IF EXISTS idx_messages_content_trgm")
+    op.execute("DROP INDEX IF EXISTS idx_messages_content_tsv")
+    op.execute("ALTER TABLE messages DROP COLUMN IF EXISTS content_tsv")
+    op.execute("DROP INDEX IF EXISTS idx_messages_chat_created_id")
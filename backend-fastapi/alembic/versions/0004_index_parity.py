@@ -0,0 +1,53 @@
+"""Индексы и ограничения горячих запросов, которых не было в схеме от create_all.
+
+- UNIQUE (chat_id, user_id) в chat_members (дубликаты участников удаляются, остаётся самый ранний);
+- chat_members(user_id) — список чатов пользователя;
+- attachments(message_id) — вложения сообщений;
+- удаляются избыточные индексы init.sql: messages(chat_id) и messages(chat_id, created_at DESC)
+  покрываются idx_messages_chat_created_id, chat_members(chat_id) — уникальным (chat_id, user_id).
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        DELETE FROM chat_members cm
+        USING chat_members dup
+        WHERE cm.chat_id = dup.chat_id
+          AND cm.user_id = dup.user_id
+          AND (COALESCE(cm.joined_at, 'epoch'), cm.id::text) > (COALESCE(dup.joined_at, 'epoch'), dup.id::text)
+    """)
+    op.execute("""
+        DO $$
+        BEGIN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_constraint
+                WHERE conrelid = 'chat_members'::regclass AND contype = 'u'
+                  AND conname IN ('uq_chat_members_chat_user', 'chat_members_chat_id_user_id_key')
+            ) THEN
+                ALTER TABLE chat_members
+                    ADD CONSTRAINT uq_chat_members_chat_user UNIQUE (chat_id, user_id);
+            END IF;
+        END $$
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_members_user ON chat_members (user_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS idx_attachments_message ON attachments (message_id)")
+    op.execute("DROP INDEX IF EXISTS idx_messages_chat")
+    op.execute("DROP INDEX IF EXISTS idx_messages_created")
+    op.execute("DROP INDEX IF EXISTS idx_chat_members_chat")
+
+
+def downgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chat_members_chat ON chat_members (chat_id)")
+    op.execute("DROP INDEX IF EXISTS idx_attachments_message")
+    op.execute("DROP INDEX IF EXISTS idx_chat_members_user")
+    op.execute("ALTER TABLE chat_members DROP CONSTRAINT IF EXISTS uq_chat_members_chat_user")
@@ -0,0 +1,34 @@
+"""Уменьшенные копии картинок у вложений: attachments.thumb_url, attachments.medium_url.
+
+Для уже загруженных картинок ссылки проставляются сразу — сами файлы вариантов
+посчитаются лениво при первом запросе (app/image_variants.py).
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE attachments ADD COLUMN IF NOT EXISTS thumb_url VARCHAR(500)")
+    op.execute("ALTER TABLE attachments ADD COLUMN IF NOT EXISTS medium_url VARCHAR(500)")
+    op.execute("""
+        UPDATE attachments
+        SET thumb_url = '/api/upload/variants/thumb/' || substr(url, 14),
+            medium_url = '/api/upload/variants/medium/' || substr(url, 14)
+        WHERE thumb_url IS NULL
+          AND url LIKE '/api/uploads/%'
+          AND position('/' IN substr(url, 14)) = 0
+          AND lower(url) ~ '\\.(jpe?g|png|webp)$'
+    """)
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE attachments DROP COLUMN IF EXISTS medium_url")
+    op.execute("ALTER TABLE attachments DROP COLUMN IF EXISTS thumb_url")
@@ -0,0 +1,71 @@
+"""Контентно-адресуемые загрузки: таблица blobs и attachments.blob_sha256.
+
+blobs.ref_count ведут триггеры уровня оператора на attachments (INSERT / DELETE,
+в том числе каскадный при удалении сообщений и чатов). Старые загрузки с
+uuid-именами в blobs не попадают: у их вложений blob_sha256 остаётся NULL.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS blobs (
+            sha256 VARCHAR(64) PRIMARY KEY,
+            path VARCHAR(255) NOT NULL,
+            size BIGINT NOT NULL,
+            content_type VARCHAR(100),
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP WITH TIME ZONE,
+            last_uploaded_at TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS idx_blobs_orphans ON blobs (last_uploaded_at) WHERE ref_count <= 0")
+    op.execute("ALTER TABLE attachments ADD COLUMN IF NOT EXISTS blob_sha256 VARCHAR(64)")
+    op.execute("""
+        CREATE OR REPLACE FUNCTION blobs_ref_add() RETURNS TRIGGER AS $$
+        BEGIN
+            UPDATE blobs b SET ref_count = b.ref_count + n.cnt
+            FROM (SELECT blob_sha256, count(*) AS cnt FROM new_rows WHERE blob_sha256 IS NOT NULL GROUP BY blob_sha256) n
+            WHERE b.sha256 = n.blob_sha256;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE OR REPLACE FUNCTION blobs_ref_remove() RETURNS TRIGGER AS $$
+        BEGIN
+            UPDATE blobs b SET ref_count = b.ref_count - o.cnt
+            FROM (SELECT blob_sha256, count(*) AS cnt FROM old_rows WHERE blob_sha256 IS NOT NULL GROUP BY blob_sha256) o
+            WHERE b.sha256 = o.blob_sha256;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP TRIGGER IF EXISTS attachments_blob_ref_add ON attachments")
+    op.execute("""
+        CREATE TRIGGER attachments_blob_ref_add AFTER INSERT ON attachments
+            REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION blobs_ref_add()
+    """)
+    op.execute("DROP TRIGGER IF EXISTS attachments_blob_ref_remove ON attachments")
+    op.execute("""
+        CREATE TRIGGER attachments_blob_ref_remove AFTER DELETE ON attachments
+            REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION blobs_ref_remove()
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS attachments_blob_ref_remove ON attachments")
+    op.execute("DROP TRIGGER IF EXISTS attachments_blob_ref_add ON attachments")
+    op.execute("DROP FUNCTION IF EXISTS blobs_ref_remove()")
+    op.execute("DROP FUNCTION IF EXISTS blobs_ref_add()")
+    op.execute("ALTER TABLE attachments DROP COLUMN IF EXISTS blob_sha256")
+    op.execute("DROP TABLE IF EXISTS blobs")
@@ -0,0 +1,51 @@
+"""Курсоры прочтения и счётчики непрочитанных.
+
+chats.message_seq — сколько сообщений когда-либо записано в чат (растёт вместе со
+сводкой), chat_members.read_seq — его значение на момент последнего прочтения.
+Непрочитанные = message_seq - read_seq, без COUNT(*) по messages. Существующая
+история при миграции считается прочитанной.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE chats ADD COLUMN IF NOT EXISTS message_seq BIGINT NOT NULL DEFAULT 0")
+    op.execute("""
+        ALTER TABLE chat_members
+            ADD COLUMN IF NOT EXISTS last_read_message_id UUID,
+            ADD COLUMN IF NOT EXISTS last_read_at TIMESTAMP WITH TIME ZONE,
+            ADD COLUMN IF NOT EXISTS read_seq BIGINT NOT NULL DEFAULT 0
+    """)
+    op.execute("""
+        UPDATE chats c
+        SET message_seq = m.n
+        FROM (SELECT chat_id, COUNT(*) AS n FROM messages GROUP BY chat_id) m
+        WHERE m.chat_id = c.id
+    """)
+    op.execute("""
+        UPDATE chat_members cm
+        SET read_seq = c.message_seq,
+            last_read_message_id = c.last_message_id,
+            last_read_at = c.last_message_at
+        FROM chats c
+        WHERE c.id = cm.chat_id AND c.message_seq > 0
+    """)
+
+
+def downgrade() -> None:
+    op.execute("""
+        ALTER TABLE chat_members
+            DROP COLUMN IF EXISTS last_read_message_id,
+            DROP COLUMN IF EXISTS last_read_at,
+            DROP COLUMN IF EXISTS read_seq
+    """)
+    op.execute("ALTER TABLE chats DROP COLUMN IF EXISTS message_seq")
@@ -0,0 +1,60 @@
+"""Токен загрузки в URL блобов: /api/uploads/<nonce>-<hmac>/blobs/...
+
+Голые URL блобов (/api/uploads/blobs/...) больше не отдаются — имя выводится из
+содержимого (app/blob_store.py). Существующим вложениям проставляется токен; он
+подписан секретом приложения (JWT_SECRET), поэтому миграция считает его в Python
+и в режиме --sql ничего не переписывает.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17
+"""
+from alembic import context, op
+from sqlalchemy import text
+
+from app.blob_store import public_key
+from app.image_variants import variant_urls
+from app.storage import UPLOADS_URL_PREFIX
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+BATCH = 1000
+
+
+def upgrade() -> None:
+    if context.is_offline_mode():
+        return
+    bind = op.get_bind()
+    while True:
+        rows = bind.execute(
+            text("SELECT id, url FROM attachments WHERE url LIKE '/api/uploads/blobs/%' LIMIT :n"), {"n": BATCH}
+        ).all()
+        if not rows:
+            break
+        params = []
+        for attachment_id, url in rows:
+            new_url = UPLOADS_URL_PREFIX + public_key(url[len(UPLOADS_URL_PREFIX):])
+            variants = variant_urls(new_url)
+            params.append({
+                "id": attachment_id,
+                "url": new_url,
+                "thumb_url": variants["thumb_url"],
+                "medium_url": variants["medium_url"],
+            })
+        bind.execute(
+            text("UPDATE attachments SET url = :url, thumb_url = :thumb_url, medium_url = :medium_url WHERE id = :id"),
+            params,
+        )
+
+
+def downgrade() -> None:
+    op.execute(r"""
+        UPDATE attachments
+        SET url = regexp_replace(url, '/[0-9a-f]{16}-[0-9a-f]{32}/blobs/', '/blobs/'),
+            thumb_url = regexp_replace(thumb_url, '/[0-9a-f]{16}-[0-9a-f]{32}/blobs/', '/blobs/'),
+            medium_url = regexp_replace(medium_url, '/[0-9a-f]{16}-[0-9a-f]{32}/blobs/', '/blobs/')
+        WHERE url ~ '^/api/uploads/[0-9a-f]{16}-[0-9a-f]{32}/blobs/'
+    """)
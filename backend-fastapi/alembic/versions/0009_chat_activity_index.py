@@ -0,0 +1,28 @@
+"""Порядок списка чатов по активности: coalesce(last_message_at, created_at).
+
+Чаты без сообщений встают по времени создания рядом с активными, а не в конец
+списка; индекс по тому же выражению (с id для стабильного порядка) заменяет
+idx_chats_last_message_at.
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chats_activity ON chats ((coalesce(last_message_at, created_at)) DESC, id)"
+    )
+    op.execute("DROP INDEX IF EXISTS idx_chats_last_message_at")
+
+
+def downgrade() -> None:
+    op.execute("CREATE INDEX IF NOT EXISTS idx_chats_last_message_at ON chats (last_message_at DESC NULLS LAST)")
+    op.execute("DROP INDEX IF EXISTS idx_chats_activity")
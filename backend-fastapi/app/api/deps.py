@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from typing import Annotated
 from uuid import UUID
 from fastapi import Depends, HTTPException, status
@@ -11,10 +12,25 @@ from app.core.security import decode_token
 security = HTTPBearer(auto_error=False)
 
 
-async def get_current_user(
-    credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(security)],
-    db: Annotated[AsyncSession, Depends(get_db)],
-) -> User:
+@dataclass(frozen=True)
+class Principal:
+    """Аутентифицированный пользователь из claims JWT — без запроса к users.
+    Профиль (если нужен) — через app.user_cache.user_cache.get(db, principal.id)."""
+    id: UUID
+    username: str | None = None
+
+
+def principal_from_token(token: str | None) -> Principal | None:
+    payload = decode_token(token) if token else None
+    if not payload or "sub" not in payload:
+        return None
+    try:
+        return Principal(id=UUID(payload["sub"]), username=payload.get("username"))
+    except (ValueError, TypeError):
+        return None
+
+
+def _require_principal(credentials: HTTPAuthorizationCredentials | None) -> Principal:
     token = None
     if credentials:
         token = credentials.credentials
@@ -24,11 +40,26 @@ async def get_current_user(
             detail="Not authenticated",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    payload = decode_token(token)
-    if not payload or "sub" not in payload:
+    principal = principal_from_token(token)
+    if not principal:
         raise HTTPException(status_code=401, detail="Invalid token")
-    user_id = payload["sub"]
-    result = await db.execute(select(User).where(User.id == UUID(user_id)))
+    return principal
+
+
+async def get_current_principal(
+    credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(security)],
+) -> Principal:
+    """Для эндпоинтов, которым нужен только current_user.id: таблица users не читается."""
+    return _require_principal(credentials)
+
+
+async def get_current_user(
+    credentials: Annotated[HTTPAuthorizationCredentials | None, Depends(security)],
+    db: Annotated[AsyncSession, Depends(get_db)],
+) -> User:
+    """Полная строка User в сессии запроса — только там, где профиль меняется."""
+    principal = _require_principal(credentials)
+    result = await db.execute(select(User).where(User.id == principal.id))
     user = result.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
@@ -41,8 +72,8 @@ async def get_optional_user(
 ) -> User | None:
     if not credentials:
         return None
-    payload = decode_token(credentials.credentials)
-    if not payload or "sub" not in payload:
+    principal = principal_from_token(credentials.credentials)
+    if not principal:
         return None
-    result = await db.execute(select(User).where(User.id == UUID(payload["sub"])))
+    result = await db.execute(select(User).where(User.id == principal.id))
     return result.scalar_one_or_none()
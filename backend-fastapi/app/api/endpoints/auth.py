@@ -1,13 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from app.database import get_db
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from app.database import AsyncSessionLocal, get_db
 from app.models import User
 from app.schemas.user import UserCreate, UserResponse, Token, LoginRequest
-from app.core.security import verify_password, get_password_hash, create_access_token
+from app.core.security import password_hasher, PasswordHasherBusy, create_access_token
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
+BUSY_DETAIL = "Сервер перегружен, повторите позже"
+HANDLE_TAKEN_DETAIL = "Этот ник уже занят"
+
 
 def _normalize_handle(handle: str) -> str:
     return handle.strip().lower().replace(" ", "_")
@@ -20,15 +24,26 @@ async def register(data: UserCreate, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Ник от 2 символов (латиница, цифры, _)")
     r = await db.execute(select(User).where(User.handle == handle))
     if r.scalar_one_or_none():
-        raise HTTPException(status_code=400, detail="Этот ник уже занят")
+        raise HTTPException(status_code=400, detail=HANDLE_TAKEN_DETAIL)
+    # Соединение не держим, пока bcrypt стоит в очереди: при всплеске регистраций кончился бы пул
+    await db.commit()
+    try:
+        password_hash = await password_hasher.hash(data.password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL)
     user = User(
         username=data.username.strip(),
         handle=handle,
         email=None,
-        password_hash=get_password_hash(data.password),
+        password_hash=password_hash,
     )
     db.add(user)
-    await db.commit()
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Тот же ник успели зарегистрировать, пока считался хеш: уникальный индекс на handle
+        await db.rollback()
+        raise HTTPException(status_code=400, detail=HANDLE_TAKEN_DETAIL)
     await db.refresh(user)
     token = create_access_token(str(user.id), user.username)
     return Token(
@@ -44,8 +59,21 @@ async def login(data: LoginRequest, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=401, detail="Неверный ник или пароль")
     r = await db.execute(select(User).where(User.handle == handle))
     user = r.scalar_one_or_none()
-    if not user or not verify_password(data.password, user.password_hash):
+    if not user:
         raise HTTPException(status_code=401, detail="Неверный ник или пароль")
+    # Транзакция закрыта, соединение вернулось в пул — bcrypt ждёт очереди без него (expire_on_commit=False)
+    await db.commit()
+    try:
+        if not await password_hasher.verify(data.password, user.password_hash):
+            raise HTTPException(status_code=401, detail="Неверный ник или пароль")
+        # Сменился BCRYPT_ROUNDS — пароль известен только сейчас, пересчитываем хеш
+        if password_hasher.needs_rehash(user.password_hash):
+            new_hash = await password_hasher.hash(data.password)
+            async with AsyncSessionLocal() as rehash_db:
+                await rehash_db.execute(update(User).where(User.id == user.id).values(password_hash=new_hash))
+                await rehash_db.commit()
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail=BUSY_DETAIL)
     token = create_access_token(str(user.id), user.username)
     return Token(
         access_token=token,
@@ -3,76 +3,107 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, delete
 from sqlalchemy.orm import selectinload
-from app.database import get_db
-from app.models import User, Chat, ChatMember, Message
-from app.schemas.chat import ChatCreate, ChatResponse, ChatUpdate, AddMembersRequest, ChatMemberWithUserResponse
-from app.api.deps import get_current_user
+from app.database import get_db, get_read_db, release_connection
+from app.models import User, Chat, ChatMember
+from app.schemas.chat import (
+    ChatCreate,
+    ChatResponse,
+    ChatUpdate,
+    AddMembersRequest,
+    ChatMemberWithUserResponse,
+    MarkReadRequest,
+    ReadStateResponse,
+)
+from app.api.deps import Principal, get_current_principal
+from app.membership import membership_cache
+from app.chat_summary import last_message_dict, refresh_members_count
+from app.notifications import read_receipts
+from app.read_state import mark_read, unread_count
 
 router = APIRouter(prefix="/chats", tags=["chats"])
 
 
-async def _chat_response(chat: Chat, db: AsyncSession, current_user: User) -> dict:
-    members_count = await db.scalar(select(func.count()).select_from(ChatMember).where(ChatMember.chat_id == chat.id))
-    current_member = await db.execute(
-        select(ChatMember).where(ChatMember.chat_id == chat.id, ChatMember.user_id == current_user.id)
-    )
-    last_msg = await db.execute(
-        select(Message)
-        .where(Message.chat_id == chat.id)
-        .order_by(Message.created_at.desc())
-        .limit(1)
-    )
-    last_message = last_msg.scalar_one_or_none()
-    display_name = chat.name
-    if chat.type == "private" and members_count == 2:
-        other = await db.execute(
-            select(User)
-            .where(User.id != current_user.id)
-            .where(User.id.in_(select(ChatMember.user_id).where(ChatMember.chat_id == chat.id)))
+_MEMBER_STATE = (ChatMember.role, ChatMember.read_seq, ChatMember.last_read_message_id)
+
+
+async def _chat_responses(
+    chats: list[Chat],
+    db: AsyncSession,
+    current_user: Principal,
+    memberships: dict | None = None,
+) -> list[dict]:
+    """Собирает ChatResponse для страницы чатов. Счётчики и последнее сообщение берутся из
+    денормализованной сводки в chats, роль и непрочитанные — из строки chat_members текущего
+    пользователя (memberships: chat_id -> строка с role, read_seq, last_read_message_id);
+    отдельным запросом — только собеседники личных чатов."""
+    if not chats:
+        return []
+    chat_ids = [c.id for c in chats]
+    if memberships is None:
+        r = await db.execute(
+            select(ChatMember.chat_id, *_MEMBER_STATE)
+            .where(ChatMember.chat_id.in_(chat_ids), ChatMember.user_id == current_user.id)
+        )
+        memberships = {row.chat_id: row for row in r.all()}
+    private_ids = [c.id for c in chats if c.type == "private" and c.members_count == 2]
+    peers: dict = {}
+    if private_ids:
+        peer_rows = await db.execute(
+            select(ChatMember.chat_id, User.id, User.username, User.handle)
+            .join(User, User.id == ChatMember.user_id)
+            .where(ChatMember.chat_id.in_(private_ids), ChatMember.user_id != current_user.id)
         )
-        other_user = other.scalar_one_or_none()
-        if other_user:
-            display_name = other_user.username or getattr(other_user, "handle", None) or str(other_user.id)
-    m = current_member.scalar_one_or_none()
-    return {
-        "id": chat.id,
-        "type": chat.type,
-        "name": chat.name,
-        "display_name": display_name,
-        "created_at": chat.created_at,
-        "members_count": members_count,
-        "current_user_role": m.role if m else None,
-        "last_message": {
-            "id": str(last_message.id),
-            "content": last_message.content,
-            "created_at": last_message.created_at.isoformat(),
-        } if last_message else None,
-    }
+        for chat_id, uid, username, handle in peer_rows.all():
+            peers[chat_id] = username or handle or str(uid)
+
+    return [
+        {
+            "id": chat.id,
+            "type": chat.type,
+            "name": chat.name,
+            "display_name": peers.get(chat.id, chat.name),
+            "created_at": chat.created_at,
+            "members_count": chat.members_count,
+            "current_user_role": m.role if m else None,
+            "last_message": last_message_dict(chat),
+            "unread_count": unread_count(chat.message_seq, m.read_seq) if m else 0,
+            "last_read_message_id": m.last_read_message_id if m else None,
+        }
+        for chat in chats
+        for m in (memberships.get(chat.id),)
+    ]
+
+
+async def _chat_response(chat: Chat, db: AsyncSession, current_user: Principal) -> dict:
+    return (await _chat_responses([chat], db, current_user))[0]
 
 
 @router.get("", response_model=list[ChatResponse])
 async def list_chats(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    subq = select(ChatMember.chat_id).where(ChatMember.user_id == current_user.id)
+    # Один индексный проход: чаты пользователя вместе с его ролью и курсором прочтения, по последней активности
     result = await db.execute(
-        select(Chat).where(Chat.id.in_(subq)).order_by(Chat.updated_at.desc()).offset(skip).limit(limit)
+        select(Chat, *_MEMBER_STATE)
+        .join(ChatMember, (ChatMember.chat_id == Chat.id) & (ChatMember.user_id == current_user.id))
+        .order_by(func.coalesce(Chat.last_message_at, Chat.created_at).desc(), Chat.id)
+        .offset(skip)
+        .limit(limit)
     )
-    chats = result.scalars().all()
-    out = []
-    for c in chats:
-        out.append(ChatResponse(**(await _chat_response(c, db, current_user))))
-    return out
+    rows = result.all()
+    chats = [row.Chat for row in rows]
+    memberships = {row.Chat.id: row for row in rows}
+    return [ChatResponse(**r) for r in await _chat_responses(chats, db, current_user, memberships)]
 
 
 @router.post("", response_model=ChatResponse)
 async def create_chat(
     data: ChatCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     # Для личного чата: если уже есть чат с этим же участником — возвращаем его
     if data.type == "private" and len(data.member_ids) == 1:
@@ -82,21 +113,21 @@ async def create_chat(
                 Chat.type == "private",
                 Chat.id.in_(select(ChatMember.chat_id).where(ChatMember.user_id == current_user.id)),
                 Chat.id.in_(select(ChatMember.chat_id).where(ChatMember.user_id == other_id)),
+                Chat.members_count == 2,
             )
-            existing = await db.execute(q)
-            for chat in existing.scalars().all():
-                n = await db.scalar(select(func.count()).select_from(ChatMember).where(ChatMember.chat_id == chat.id))
-                if n == 2:
-                    return ChatResponse(**(await _chat_response(chat, db, current_user)))
+            existing = (await db.execute(q.limit(1))).scalar_one_or_none()
+            if existing:
+                return ChatResponse(**(await _chat_response(existing, db, current_user)))
 
-    chat = Chat(type=data.type, name=data.name or None)
+    member_ids = {uid for uid in data.member_ids if uid != current_user.id}
+    chat = Chat(type=data.type, name=data.name or None, members_count=len(member_ids) + 1)
     db.add(chat)
     await db.flush()
     db.add(ChatMember(chat_id=chat.id, user_id=current_user.id, role="admin"))
-    for uid in data.member_ids:
-        if uid != current_user.id:
-            db.add(ChatMember(chat_id=chat.id, user_id=uid, role="member"))
+    for uid in member_ids:
+        db.add(ChatMember(chat_id=chat.id, user_id=uid, role="member"))
     await db.commit()
+    await membership_cache.invalidate(chat.id)
     await db.refresh(chat)
     # Не шлём chats_updated получателю — чат появится у него только после первого сообщения
     return ChatResponse(**(await _chat_response(chat, db, current_user)))
@@ -106,11 +137,10 @@ async def create_chat(
 async def list_chat_members(
     chat_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """Список участников чата. Доступно всем участникам чата."""
-    r = await db.execute(select(ChatMember).where(ChatMember.chat_id == chat_id, ChatMember.user_id == current_user.id))
-    if not r.scalar_one_or_none():
+    if not await membership_cache.role(db, chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not a member")
     result = await db.execute(
         select(ChatMember, User)
@@ -135,7 +165,7 @@ async def list_chat_members(
 async def get_chat(
     chat_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     r = await db.execute(
         select(Chat).where(Chat.id == chat_id)
@@ -143,10 +173,14 @@ async def get_chat(
     chat = r.scalar_one_or_none()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
-    r2 = await db.execute(select(ChatMember).where(ChatMember.chat_id == chat_id, ChatMember.user_id == current_user.id))
-    if not r2.scalar_one_or_none():
+    if not await membership_cache.role(db, chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not a member")
-    return ChatResponse(**(await _chat_response(chat, db, current_user)))
+    response = await _chat_response(chat, db, current_user)
+    response["peers_last_read_at"] = await db.scalar(
+        select(func.max(ChatMember.last_read_at))
+        .where(ChatMember.chat_id == chat_id, ChatMember.user_id != current_user.id)
+    )
+    return ChatResponse(**response)
 
 
 @router.patch("/{chat_id}", response_model=ChatResponse)
@@ -154,15 +188,13 @@ async def update_chat(
     chat_id: UUID,
     data: ChatUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     r = await db.execute(select(Chat).where(Chat.id == chat_id))
     chat = r.scalar_one_or_none()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
-    r2 = await db.execute(select(ChatMember).where(ChatMember.chat_id == chat_id, ChatMember.user_id == current_user.id))
-    member = r2.scalar_one_or_none()
-    if not member or member.role != "admin":
+    if await membership_cache.role(db, chat_id, current_user.id) != "admin":
         raise HTTPException(status_code=403, detail="Only admin can update")
     if data.name is not None:
         chat.name = data.name
@@ -176,7 +208,7 @@ async def add_chat_members(
     chat_id: UUID,
     data: AddMembersRequest,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     r = await db.execute(select(Chat).where(Chat.id == chat_id))
     chat = r.scalar_one_or_none()
@@ -184,28 +216,53 @@ async def add_chat_members(
         raise HTTPException(status_code=404, detail="Chat not found")
     if chat.type != "group":
         raise HTTPException(status_code=400, detail="Добавлять участников можно только в групповой чат")
-    r2 = await db.execute(select(ChatMember).where(ChatMember.chat_id == chat_id, ChatMember.user_id == current_user.id))
-    member = r2.scalar_one_or_none()
-    if not member or member.role != "admin":
+    if await membership_cache.role(db, chat_id, current_user.id) != "admin":
         raise HTTPException(status_code=403, detail="Только администратор группы может добавлять участников")
     existing = await db.execute(select(ChatMember.user_id).where(ChatMember.chat_id == chat_id))
     existing_ids = {row[0] for row in existing.all()}
+    seq_now = select(Chat.message_seq).where(Chat.id == chat_id).scalar_subquery()
     added = 0
     for uid in data.member_ids:
         if uid != current_user.id and uid not in existing_ids:
-            db.add(ChatMember(chat_id=chat_id, user_id=uid, role="member"))
+            # История до вступления не считается непрочитанной: message_seq берётся в момент INSERT
+            db.add(ChatMember(chat_id=chat_id, user_id=uid, role="member", read_seq=seq_now))
             existing_ids.add(uid)
             added += 1
+    if added:
+        await db.flush()
+        await refresh_members_count(db, chat_id)
     await db.commit()
+    await release_connection(db)
+    if added:
+        await membership_cache.invalidate(chat_id)
     return None
 
 
+@router.post("/{chat_id}/read", response_model=ReadStateResponse)
+async def mark_chat_read(
+    chat_id: UUID,
+    data: MarkReadRequest | None = None,
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Сдвинуть курсор прочтения до message_id (без тела — до последнего сообщения)."""
+    result = await mark_read(db, chat_id, current_user.id, data.message_id if data else None)
+    if result is None:
+        raise HTTPException(status_code=403, detail="Not a member")
+    state, moved = result
+    await db.commit()
+    await release_connection(db)
+    if moved:
+        read_receipts.notify(str(chat_id), str(current_user.id), state)
+    return ReadStateResponse(**state)
+
+
 @router.delete("/{chat_id}/members/{user_id}", status_code=204)
 async def remove_chat_member(
     chat_id: UUID,
     user_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     """Выйти из группы: только если user_id = текущий пользователь. Только для группового чата."""
     r = await db.execute(select(Chat).where(Chat.id == chat_id))
@@ -216,11 +273,13 @@ async def remove_chat_member(
         raise HTTPException(status_code=400, detail="Только групповой чат")
     if user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Можно выйти только из себя")
-    r2 = await db.execute(select(ChatMember).where(ChatMember.chat_id == chat_id, ChatMember.user_id == current_user.id))
-    if not r2.scalar_one_or_none():
+    if not await membership_cache.role(db, chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not a member")
     await db.execute(delete(ChatMember).where(ChatMember.chat_id == chat_id, ChatMember.user_id == user_id))
+    await refresh_members_count(db, chat_id)
     await db.commit()
+    await release_connection(db)
+    await membership_cache.invalidate(chat_id)
     return None
 
 
@@ -228,14 +287,15 @@ async def remove_chat_member(
 async def delete_chat(
     chat_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     r = await db.execute(select(Chat).where(Chat.id == chat_id))
     chat = r.scalar_one_or_none()
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
-    r2 = await db.execute(select(ChatMember).where(ChatMember.chat_id == chat_id, ChatMember.user_id == current_user.id))
-    if not r2.scalar_one_or_none():
+    if not await membership_cache.role(db, chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not a member")
     await db.delete(chat)
     await db.commit()
+    await release_connection(db)
+    await membership_cache.invalidate(chat_id)
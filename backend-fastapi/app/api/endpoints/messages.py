@@ -1,54 +1,113 @@
+import html
+from datetime import datetime
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, tuple_, func, literal_column
 from sqlalchemy.orm import selectinload
-from app.database import get_db
-from app.models import User, Chat, ChatMember, Message, Attachment
-from app.schemas.message import MessageCreate, MessageUpdate, MessageResponse, AttachmentResponse, AttachmentCreate
-from app.api.deps import get_current_user
+from app.database import get_db, get_read_db, release_connection
+from app.models import ChatMember, Message
+from app.models.message import FTS_CONFIG
+from app.schemas.message import MessageCreate, MessageUpdate, MessageResponse, MessageSearchResult
+from app.api.deps import Principal, get_current_principal
+from app.membership import membership_cache
+from app.api.pagination import encode_cursor, decode_cursor, decode_time_id_cursor
+from app.api.search_utils import LIKE_ESCAPE, like_pattern
 from app.ws_manager import ws_manager
+from app import chat_summary
+from app.notifications import notify_chat_members
+from app.message_writer import serialize_message, sender_name_of
+from app.write_behind import write_message, QueueFullError
+from app.user_cache import user_cache
 
 router = APIRouter(prefix="/messages", tags=["messages"])
 
 
 def _message_to_response(msg: Message) -> dict:
-    user = getattr(msg, "user", None)
-    sender_name = (user.username or getattr(user, "handle", None)) if user else None
-    return {
-        "id": msg.id,
-        "chat_id": msg.chat_id,
-        "user_id": msg.user_id,
-        "content": msg.content,
-        "type": msg.type,
-        "created_at": msg.created_at,
-        "updated_at": getattr(msg, "updated_at", None),
-        "attachments": [AttachmentResponse.model_validate(a) for a in msg.attachments],
-        "sender_name": sender_name,
-    }
+    return serialize_message(msg, sender_name_of(getattr(msg, "user", None)))
+
+
+def _page_query(chat_id: UUID):
+    return (
+        select(Message)
+        .where(Message.chat_id == chat_id)
+        .options(selectinload(Message.attachments), selectinload(Message.user))
+    )
+
+
+def _msg_key():
+    return tuple_(Message.created_at, Message.id)
+
+
+async def _older_than(db: AsyncSession, chat_id: UUID, key: tuple | None, limit: int, inclusive: bool = False) -> tuple[list[Message], bool]:
+    """Страница сообщений старше ключа (новые первыми) и флаг «есть ещё старее»."""
+    q = _page_query(chat_id)
+    if key is not None:
+        q = q.where(_msg_key() <= tuple_(*key) if inclusive else _msg_key() < tuple_(*key))
+    r = await db.execute(q.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1))
+    rows = list(r.scalars().all())
+    return rows[:limit], len(rows) > limit
+
+
+async def _newer_than(db: AsyncSession, chat_id: UUID, key: tuple, limit: int) -> tuple[list[Message], bool]:
+    """Страница сообщений новее ключа (старые первыми) и флаг «есть ещё новее»."""
+    q = _page_query(chat_id).where(_msg_key() > tuple_(*key))
+    r = await db.execute(q.order_by(Message.created_at.asc(), Message.id.asc()).limit(limit + 1))
+    rows = list(r.scalars().all())
+    return rows[:limit], len(rows) > limit
 
 
 @router.get("/chat/{chat_id}", response_model=list[MessageResponse])
 async def list_messages(
     chat_id: UUID,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    before: str | None = Query(None, description="Курсор: сообщения старше"),
+    after: str | None = Query(None, description="Курсор: сообщения новее"),
+    around: UUID | None = Query(None, description="Окно вокруг сообщения (переход к сообщению)"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    r = await db.execute(select(ChatMember).where(ChatMember.chat_id == chat_id, ChatMember.user_id == current_user.id))
-    if not r.scalar_one_or_none():
+    """История чата в хронологическом порядке. Keyset-пагинация по (created_at, id):
+    курсоры следующей (старее) и предыдущей (новее) страницы — в заголовках X-Next-Cursor / X-Prev-Cursor."""
+    if not await membership_cache.role(db, chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not a member")
-    result = await db.execute(
-        select(Message)
-        .where(Message.chat_id == chat_id)
-        .options(selectinload(Message.attachments), selectinload(Message.user))
-        .order_by(Message.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-    )
-    messages = result.scalars().all()
-    return [MessageResponse(**_message_to_response(m)) for m in reversed(messages)]
+    has_older = has_newer = False
+    if around is not None:
+        anchor = (await db.execute(
+            select(Message.created_at, Message.id).where(Message.id == around, Message.chat_id == chat_id)
+        )).first()
+        if not anchor:
+            raise HTTPException(status_code=404, detail="Сообщение не найдено")
+        older, has_older = await _older_than(db, chat_id, tuple(anchor), limit - limit // 2, inclusive=True)
+        newer, has_newer = await _newer_than(db, chat_id, tuple(anchor), limit // 2)
+        messages = list(reversed(older)) + newer
+    elif after:
+        messages, has_newer = await _newer_than(db, chat_id, decode_time_id_cursor(after), limit)
+        has_older = True
+    elif before:
+        older, has_older = await _older_than(db, chat_id, decode_time_id_cursor(before), limit)
+        messages = list(reversed(older))
+        has_newer = True
+    else:
+        # Без курсора — последние сообщения; skip оставлен для старых клиентов
+        result = await db.execute(
+            _page_query(chat_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .offset(skip)
+            .limit(limit + 1)
+        )
+        rows = list(result.scalars().all())
+        has_older = len(rows) > limit
+        has_newer = skip > 0
+        messages = list(reversed(rows[:limit]))
+    if messages:
+        if has_older:
+            response.headers["X-Next-Cursor"] = encode_cursor(messages[0].created_at, messages[0].id)
+        if has_newer:
+            response.headers["X-Prev-Cursor"] = encode_cursor(messages[-1].created_at, messages[-1].id)
+    return [MessageResponse(**_message_to_response(m)) for m in messages]
 
 
 @router.post("/chat/{chat_id}", response_model=MessageResponse)
@@ -56,53 +115,30 @@ async def create_message(
     chat_id: UUID,
     data: MessageCreate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    r = await db.execute(select(ChatMember).where(ChatMember.chat_id == chat_id, ChatMember.user_id == current_user.id))
-    if not r.scalar_one_or_none():
+    if not await membership_cache.role(db, chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Not a member")
     msg_type = data.type or ("image" if data.attachments else "text")
-    msg = Message(
-        chat_id=chat_id,
-        user_id=current_user.id,
-        content=data.content,
-        type=msg_type,
-    )
-    db.add(msg)
-    await db.commit()
-    await db.refresh(msg)
-    for att in data.attachments:
-        att_obj = Attachment(
-            message_id=msg.id,
-            url=att.url,
-            type=att.type,
-            filename=att.filename,
+    try:
+        payload = await write_message(
+            db,
+            chat_id,
+            current_user.id,
+            data.content,
+            msg_type,
+            data.attachments,
+            sender_name_of(await user_cache.get(db, current_user.id)),
         )
-        db.add(att_obj)
-    await db.commit()
-    result = await db.execute(select(Message).where(Message.id == msg.id).options(selectinload(Message.attachments), selectinload(Message.user)))
-    msg = result.scalar_one()
-    resp = _message_to_response(msg)
-    user = getattr(msg, "user", None)
-    sender_name = (user.username or getattr(user, "handle", None)) if user else None
-    payload = {
-        "id": str(msg.id),
-        "chat_id": str(msg.chat_id),
-        "user_id": str(msg.user_id),
-        "content": msg.content,
-        "type": msg.type,
-        "created_at": msg.created_at.isoformat(),
-        "attachments": [{"id": str(a.id), "url": a.url, "type": a.type, "filename": a.filename} for a in msg.attachments],
-        "sender_name": sender_name,
-    }
+    except QueueFullError:
+        raise HTTPException(status_code=503, detail="Сервер перегружен, повторите позже")
+    await release_connection(db)
     try:
         await ws_manager.broadcast_to_chat(str(chat_id), {"type": "new_message", "message": payload})
-        members = await db.execute(select(ChatMember.user_id).where(ChatMember.chat_id == chat_id))
-        for (member_uid,) in members.all():
-            await ws_manager.broadcast_to_user(str(member_uid), {"type": "chats_updated"})
+        await notify_chat_members(db, chat_id, chat_summary.last_message_from_payload(payload), current_user.id)
     except Exception:
         pass
-    return MessageResponse(**resp)
+    return MessageResponse(**payload)
 
 
 @router.patch("/{message_id}", response_model=MessageResponse)
@@ -110,7 +146,7 @@ async def update_message(
     message_id: UUID,
     data: MessageUpdate,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     r = await db.execute(
         select(Message)
@@ -122,39 +158,28 @@ async def update_message(
         raise HTTPException(status_code=404, detail="Сообщение не найдено")
     if msg.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Можно редактировать только свои сообщения")
-    r = await db.execute(select(ChatMember).where(ChatMember.chat_id == msg.chat_id, ChatMember.user_id == current_user.id))
-    if not r.scalar_one_or_none():
+    if not await membership_cache.role(db, msg.chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Нет доступа к чату")
     if data.content is not None:
         msg.content = data.content
+        await chat_summary.on_message_updated(db, msg)
     await db.commit()
     await db.refresh(msg)
-    resp = _message_to_response(msg)
-    payload = {
-        "id": str(msg.id),
-        "chat_id": str(msg.chat_id),
-        "user_id": str(msg.user_id),
-        "content": msg.content,
-        "type": msg.type,
-        "created_at": msg.created_at.isoformat(),
-        "updated_at": (msg.updated_at.isoformat() if msg.updated_at else None),
-        "attachments": [{"id": str(a.id), "url": a.url, "type": a.type, "filename": a.filename} for a in msg.attachments],
-    }
+    payload = _message_to_response(msg)
+    await release_connection(db)
     try:
         await ws_manager.broadcast_to_chat(str(msg.chat_id), {"type": "message_updated", "message": payload})
-        members = await db.execute(select(ChatMember.user_id).where(ChatMember.chat_id == msg.chat_id))
-        for (member_uid,) in members.all():
-            await ws_manager.broadcast_to_user(str(member_uid), {"type": "chats_updated"})
+        await notify_chat_members(db, msg.chat_id)
     except Exception:
         pass
-    return MessageResponse(**resp)
+    return MessageResponse(**payload)
 
 
 @router.delete("/{message_id}", status_code=204)
 async def delete_message(
     message_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
     r = await db.execute(select(Message).where(Message.id == message_id))
     msg = r.scalar_one_or_none()
@@ -162,39 +187,141 @@ async def delete_message(
         raise HTTPException(status_code=404, detail="Сообщение не найдено")
     if msg.user_id != current_user.id:
         raise HTTPException(status_code=403, detail="Можно удалять только свои сообщения")
-    r = await db.execute(select(ChatMember).where(ChatMember.chat_id == msg.chat_id, ChatMember.user_id == current_user.id))
-    if not r.scalar_one_or_none():
+    if not await membership_cache.role(db, msg.chat_id, current_user.id):
         raise HTTPException(status_code=403, detail="Нет доступа к чату")
     chat_id_str = str(msg.chat_id)
     chat_id_uuid = msg.chat_id
     await db.delete(msg)
+    await db.flush()
+    await chat_summary.on_message_deleted(db, chat_id_uuid, message_id)
     await db.commit()
+    await release_connection(db)
     try:
         await ws_manager.broadcast_to_chat(chat_id_str, {"type": "message_deleted", "message_id": str(message_id)})
-        members = await db.execute(select(ChatMember.user_id).where(ChatMember.chat_id == chat_id_uuid))
-        for (member_uid,) in members.all():
-            await ws_manager.broadcast_to_user(str(member_uid), {"type": "chats_updated"})
+        await notify_chat_members(db, chat_id_uuid)
     except Exception:
         pass
     return None
 
 
-@router.get("/search", response_model=list[MessageResponse])
-async def search_messages(
-    q: str = Query(..., min_length=1),
-    chat_id: UUID | None = Query(None),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
-):
-    from sqlalchemy import or_
+SEARCH_MIN_FTS_LEN = 3
+# ts_headline размечает совпадения символами из Private Use Area: текст экранируется
+# в Python, и только потом маркеры становятся <mark>…</mark>
+MARK_START, MARK_STOP = "\ue000", "\ue001"
+HEADLINE_OPTIONS = f'StartSel="{MARK_START}", StopSel="{MARK_STOP}", MaxWords=25, MinWords=8, MaxFragments=2'
+
+
+def _marked_html(headline: str | None) -> str | None:
+    if headline is None:
+        return None
+    return html.escape(headline).replace(MARK_START, "<mark>").replace(MARK_STOP, "</mark>")
+
+
+def _search_base(current_user: Principal, chat_id: UUID | None):
     subq = select(ChatMember.chat_id).where(ChatMember.user_id == current_user.id)
     query = select(Message).options(selectinload(Message.attachments), selectinload(Message.user)).where(
         Message.chat_id.in_(subq),
-        Message.content.ilike(f"%{q}%"),
     )
     if chat_id:
         query = query.where(Message.chat_id == chat_id)
-    query = query.order_by(Message.created_at.desc()).limit(50)
-    result = await db.execute(query)
-    messages = result.scalars().all()
-    return [MessageResponse(**_message_to_response(m)) for m in messages]
+    return query
+
+
+def _trigram_snippet(content: str | None, term: str, radius: int = 60) -> str | None:
+    if not content:
+        return None
+    pos = content.lower().find(term.lower())
+    if pos < 0:
+        return html.escape(content[: radius * 2])
+    start = max(0, pos - radius)
+    end = min(len(content), pos + len(term) + radius)
+    return (
+        ("…" if start else "")
+        + html.escape(content[start:pos])
+        + "<mark>" + html.escape(content[pos:pos + len(term)]) + "</mark>"
+        + html.escape(content[pos + len(term):end])
+        + ("…" if end < len(content) else "")
+    )
+
+
+async def _search_fts(db: AsyncSession, base, q: str, limit: int, after: list | None):
+    """websearch_to_tsquery по хранимому content_tsv (GIN), сортировка по ts_rank_cd."""
+    config = literal_column(f"'{FTS_CONFIG}'::regconfig")
+    tsq = func.websearch_to_tsquery(config, q)
+    rank = func.ts_rank_cd(Message.content_tsv, tsq)
+    query = base.add_columns(rank.label("rank"), func.ts_headline(config, Message.content, tsq, HEADLINE_OPTIONS))
+    query = query.where(Message.content_tsv.op("@@")(tsq))
+    if after:
+        query = query.where(tuple_(rank, Message.created_at, Message.id) < tuple_(*after))
+    r = await db.execute(query.order_by(rank.desc(), Message.created_at.desc(), Message.id.desc()).limit(limit + 1))
+    rows = r.all()
+    results = [
+        MessageSearchResult(**_message_to_response(m), rank=float(rk), snippet=_marked_html(snippet))
+        for m, rk, snippet in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        m, rk, _ = rows[limit - 1]
+        next_cursor = encode_cursor("fts", float(rk), m.created_at, m.id)
+    return results, next_cursor
+
+
+async def _search_trigram(db: AsyncSession, base, q: str, limit: int, after: tuple | None):
+    """Подстрока по триграммному GIN-индексу — для коротких и частичных запросов."""
+    query = base.where(Message.content.ilike(like_pattern(q), escape=LIKE_ESCAPE))
+    if after:
+        query = query.where(tuple_(Message.created_at, Message.id) < tuple_(*after))
+    r = await db.execute(query.order_by(Message.created_at.desc(), Message.id.desc()).limit(limit + 1))
+    rows = list(r.scalars().all())
+    results = [
+        MessageSearchResult(**_message_to_response(m), snippet=_trigram_snippet(m.content, q))
+        for m in rows[:limit]
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        m = rows[limit - 1]
+        next_cursor = encode_cursor("trgm", m.created_at, m.id)
+    return results, next_cursor
+
+
+@router.get("/search", response_model=list[MessageSearchResult])
+async def search_messages(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    chat_id: UUID | None = Query(None),
+    limit: int = Query(50, ge=1, le=100),
+    cursor: str | None = Query(None, description="X-Next-Cursor предыдущей страницы"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Полнотекстовый поиск (websearch-синтаксис, ранжирование, подсветка); для коротких запросов
+    и если полнотекстовый ничего не нашёл — поиск подстроки по триграммам. Курсор следующей
+    страницы — в заголовке X-Next-Cursor."""
+    q = q.strip()
+    if not q:
+        return []
+    base = _search_base(current_user, chat_id)
+    if cursor:
+        values = decode_cursor(cursor)
+        try:
+            if values[0] == "fts" and len(values) == 4:
+                results, next_cursor = await _search_fts(
+                    db, base, q, limit, [float(values[1]), datetime.fromisoformat(values[2]), UUID(values[3])]
+                )
+            elif values[0] == "trgm" and len(values) == 3:
+                results, next_cursor = await _search_trigram(
+                    db, base, q, limit, (datetime.fromisoformat(values[1]), UUID(values[2]))
+                )
+            else:
+                raise ValueError(values[0])
+        except (ValueError, TypeError, IndexError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    else:
+        results, next_cursor = [], None
+        if len(q) >= SEARCH_MIN_FTS_LEN:
+            results, next_cursor = await _search_fts(db, base, q, limit, None)
+        if not results:
+            results, next_cursor = await _search_trigram(db, base, q, limit, None)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return results
@@ -1,30 +1,42 @@
 import re
-import uuid
 import mimetypes
 from pathlib import Path
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from fastapi.responses import FileResponse
-from pydantic import BaseModel
-from app.api.deps import get_current_user
-from app.models import User
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import RedirectResponse, Response
+from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import Principal, get_current_principal
+from app.core.config import settings
+from app.database import get_db
+from app.storage import IMMUTABLE_CACHE_CONTROL, UPLOADS_URL_PREFIX, LocalStorage, storage
+from app.file_serving import serve_file
+from app.upload_stream import receive_body, receive_files, discard
+from app.image_variants import VARIANTS, VARIANTS_DIR, image_pipeline, variant_key, variant_urls
+from app import blob_store
 
 router = APIRouter(prefix="/upload", tags=["upload"])
+# /api/uploads/<token>/<key>: локально — файл с ETag/Range, для S3 — редирект в хранилище
+files_router = APIRouter(prefix="/uploads", tags=["upload"])
 
-# Каталог для файлов (рядом с app/); в Docker лучше монтировать volume
-UPLOADS_DIR = Path(__file__).resolve().parent.parent.parent.parent / "uploads"
 ALLOWED_IMAGE_TYPES = {"image/jpeg", "image/png", "image/gif", "image/webp"}
 ALLOWED_EXT = {".jpg", ".jpeg", ".png", ".gif", ".webp", ".pdf", ".txt", ".doc", ".docx"}
+MB = 1024 * 1024
 
 
-def _ensure_uploads_dir():
-    UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+def _safe_ext(original: str) -> str:
+    ext = Path(original).suffix.lower()
+    return ext if re.fullmatch(r"\.[a-z0-9]{1,10}", ext) else ".bin"
 
 
-def _safe_filename(original: str) -> str:
-    ext = Path(original).suffix.lower() or ""
-    if ext not in ALLOWED_EXT and not ext:
-        ext = ".bin"
-    return f"{uuid.uuid4().hex}{ext}"
+def _safe_key(key: str) -> bool:
+    # ./blobs/..., //blobs/... хранилище нормализует в blobs/... — до проверки префиксов такие пути не пускаем
+    return blob_store.canonical_key(key)
+
+
+def _storage_redirect(key: str) -> RedirectResponse:
+    # Presigned-ссылка истекает — редирект кэшируем не дольше её срока
+    cache = IMMUTABLE_CACHE_CONTROL if storage.stable_urls else f"private, max-age={storage.presign_ttl // 2}"
+    return RedirectResponse(storage.url(key), status_code=307, headers={"Cache-Control": cache})
 
 
 def _safe_download_filename(name: str) -> str:
@@ -38,55 +50,213 @@ class FileInfo(BaseModel):
     url: str
     type: str | None
     filename: str | None
+    size: int | None = None
+    thumb_url: str | None = None
+    medium_url: str | None = None
+
+
+def _file_info(key: str, filename: str, size: int) -> FileInfo:
+    # Для блоба в URL — свой токен этой загрузки (app/blob_store.py)
+    url = UPLOADS_URL_PREFIX + blob_store.public_key(key)
+    mime, _ = mimetypes.guess_type(filename)
+    return FileInfo(url=url, type=mime, filename=filename, size=size, **variant_urls(url))
 
 
 class UploadResponse(BaseModel):
     files: list[FileInfo]
 
 
-@router.post("", response_model=UploadResponse)
+class PresignRequest(BaseModel):
+    filename: str = Field(min_length=1, max_length=255)
+    size: int = Field(gt=0)
+    sha256: str = Field(pattern=r"^[0-9a-f]{64}$")
+
+
+class DirectUpload(BaseModel):
+    method: str
+    url: str
+    headers: dict[str, str]
+
+
+class PresignResponse(BaseModel):
+    sha256: str
+    # PUT байтов по ссылке, затем POST /api/upload/complete с upload_id
+    upload: DirectUpload
+    upload_id: str
+
+
+class CompleteRequest(BaseModel):
+    filename: str = Field(min_length=1, max_length=255)
+    sha256: str = Field(pattern=r"^[0-9a-f]{64}$")
+    upload_id: str = Field(min_length=1, max_length=512)
+
+
+# Тело разбирается потоково (app/upload_stream.py), поэтому схему формы описываем вручную
+_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                    "required": ["files"],
+                }
+            }
+        },
+    }
+}
+
+
+@router.post("", response_model=UploadResponse, openapi_extra=_UPLOAD_OPENAPI)
 async def upload_files(
-    current_user: User = Depends(get_current_user),
-    files: list[UploadFile] = File(...),
+    request: Request,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
 ):
-    _ensure_uploads_dir()
-    if not files or len(files) > 10:
-        raise HTTPException(status_code=400, detail="От 1 до 10 файлов")
-    result = []
-    for f in files:
-        if not f.filename:
-            continue
-        content = await f.read()
-        if len(content) == 0:
+    """Загрузка через API (multipart). Для больших файлов и S3 лучше прямая загрузка: /presign."""
+    received = await receive_files(
+        request,
+        storage.temp_dir,
+        max_file_bytes=settings.upload_max_file_mb * MB,
+        max_request_bytes=settings.upload_max_request_mb * MB,
+        max_files=settings.upload_max_files,
+    )
+    try:
+        files = [f for f in received if f.filename]
+        if not files:
+            raise HTTPException(status_code=400, detail=f"От 1 до {settings.upload_max_files} файлов")
+        if any(f.size == 0 for f in files):
             raise HTTPException(status_code=400, detail="Вложение не поддерживается")
-        safe_name = _safe_filename(f.filename)
-        path = UPLOADS_DIR / safe_name
-        path.write_bytes(content)
-        mime, _ = mimetypes.guess_type(f.filename)
-        result.append(
-            FileInfo(
-                url=f"/api/uploads/{safe_name}",
-                type=mime,
-                filename=f.filename,
-            )
-        )
+        result = []
+        keys = []
+        for f in files:
+            mime, _ = mimetypes.guess_type(f.filename)
+            # Ключ — SHA-256 содержимого: повторная загрузка того же файла не пишет его заново
+            key = await blob_store.store(db, storage, f, _safe_ext(f.filename), mime)
+            keys.append(key)
+            result.append(_file_info(key, f.filename, f.size))
+        await db.commit()
+    finally:
+        await discard(received)
+    for key in keys:
+        image_pipeline.schedule(key)
     return UploadResponse(files=result)
 
 
-@router.get("/download/{stored_name:path}")
+@router.post("/presign", response_model=PresignResponse)
+async def presign_upload(
+    body: PresignRequest,
+    current_user: Principal = Depends(get_current_principal),
+):
+    """Прямая загрузка: ссылка на PUT во временный ключ хранилища и квитанция для /complete.
+
+    Байты загружаются всегда, даже если такое содержимое уже хранится: по одному
+    хэшу готовый файл не выдаётся.
+    """
+    if body.size > settings.upload_max_file_mb * MB:
+        raise HTTPException(status_code=413, detail=f"Файл «{body.filename}» слишком большой")
+    mime, _ = mimetypes.guess_type(body.filename)
+    # Квитанция живёт дольше ссылки: PUT, начатый в последний момент, успеет завершиться
+    key, upload_id = blob_store.issue_upload(
+        current_user.id, body.sha256, body.size, _safe_ext(body.filename), storage.presign_ttl * 2
+    )
+    upload = storage.presign_upload(key, mime or "application/octet-stream", body.size, body.sha256)
+    return PresignResponse(sha256=body.sha256, upload=DirectUpload(**upload), upload_id=upload_id)
+
+
+@router.put("/direct/{key:path}", include_in_schema=False)
+async def direct_upload(key: str, size: int, sha256: str, expires: int, sig: str, request: Request):
+    """PUT по подписанной ссылке из /presign для локального хранилища (аналог presigned PUT в S3)."""
+    if not isinstance(storage, LocalStorage) or not storage.verify_upload(key, size, sha256, expires, sig):
+        raise HTTPException(status_code=403, detail="Ссылка недействительна или истекла")
+    received = await receive_body(request, storage.temp_dir, Path(key).name, max_bytes=size)
+    try:
+        if received.size != size or received.sha256 != sha256:
+            raise HTTPException(status_code=400, detail="Содержимое не совпадает с заявленным")
+        await storage.put_file(key, received.temp_path, request.headers.get("content-type"))
+    finally:
+        await discard([received])
+    return Response(status_code=200)
+
+
+@router.post("/complete", response_model=FileInfo)
+async def complete_upload(
+    body: CompleteRequest,
+    current_user: Principal = Depends(get_current_principal),
+    db: AsyncSession = Depends(get_db),
+):
+    """После прямой загрузки: перенести байты из временного ключа в блоб и вернуть данные для вложения.
+
+    Квитанция подписана для пользователя, хэша, размера и расширения из /presign —
+    чужую загрузку или другой размер ею не подтвердить.
+    """
+    ticket = blob_store.open_upload(body.upload_id, current_user.id, body.sha256)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail="Загрузка не найдена")
+    incoming, size, ext = ticket
+    if not await storage.exists(incoming):
+        raise HTTPException(status_code=409, detail="Файл ещё не загружен в хранилище")
+    if not await storage.verify(incoming, size, body.sha256):
+        await storage.delete([incoming])
+        raise HTTPException(status_code=400, detail="Содержимое не совпадает с заявленным")
+    mime, _ = mimetypes.guess_type(body.filename)
+    key = await blob_store.adopt(db, storage, incoming, body.sha256, size, ext, mime)
+    await db.commit()
+    image_pipeline.schedule(key)
+    return _file_info(key, body.filename, size)
+
+
+@router.api_route("/download/{stored_name:path}", methods=["GET", "HEAD"])
 async def download_file(
     stored_name: str,
+    request: Request,
     filename: str | None = None,
 ):
-    """Скачать файл с заголовком Content-Disposition: attachment. Без авторизации: ссылка с uuid не угадывается."""
-    if ".." in stored_name or "/" in stored_name.replace("\\", "/"):
+    """Скачать файл с заголовком Content-Disposition: attachment. Без авторизации: доступ даёт сама ссылка —
+    uuid старых загрузок или токен загрузки блоба (по содержимому файла её не построить)."""
+    if not _safe_key(stored_name):
         raise HTTPException(status_code=400, detail="Invalid path")
-    path = UPLOADS_DIR / stored_name
-    if not path.is_file():
+    stored_name = blob_store.resolve_key(stored_name)
+    if stored_name is None:
         raise HTTPException(status_code=404, detail="File not found")
-    download_name = _safe_download_filename(filename) if filename else path.name
-    return FileResponse(
-        path,
-        filename=download_name,
-        media_type="application/octet-stream",
-    )
+    download_name = _safe_download_filename(filename) if filename else Path(stored_name).name
+    path = storage.local_path(stored_name)
+    if path is None:
+        # Байты идут из хранилища напрямую, не через воркер
+        return RedirectResponse(storage.download_url(stored_name, download_name), status_code=307)
+    return await serve_file(request, path, stored_name, media_type="application/octet-stream", filename=download_name)
+
+
+@router.api_route("/variants/{variant}/{stored_name:path}", methods=["GET", "HEAD"])
+async def get_variant(variant: str, stored_name: str, request: Request):
+    """Уменьшенная копия картинки; для старых загрузок считается при первом запросе."""
+    if variant not in VARIANTS or not _safe_key(stored_name):
+        raise HTTPException(status_code=404, detail="File not found")
+    stored_name = blob_store.resolve_key(stored_name)
+    if stored_name is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not await image_pipeline.ensure(stored_name, variant):
+        raise HTTPException(status_code=404, detail="File not found")
+    key = variant_key(stored_name, variant)
+    path = storage.local_path(key)
+    if path is None:
+        return _storage_redirect(key)
+    return await serve_file(request, path, key, media_type="image/webp", cache_control=IMMUTABLE_CACHE_CONTROL)
+
+
+@files_router.api_route("/{key:path}", methods=["GET", "HEAD"])
+async def get_uploaded_file(key: str, request: Request):
+    """Загруженный файл: с диска (ETag, 304, Range) или редирект на публичный URL бакета / presigned GET.
+    Блобы — только по URL с токеном загрузки, варианты — через /upload/variants."""
+    if not _safe_key(key):
+        raise HTTPException(status_code=404, detail="File not found")
+    key = blob_store.resolve_key(key)
+    if key is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    path = storage.local_path(key)
+    if path is None:
+        return _storage_redirect(key)
+    # Блобы и варианты по имени не меняются; старые uuid-файлы — с обычной ревалидацией по ETag
+    immutable = key.startswith((blob_store.BLOBS_DIR + "/", VARIANTS_DIR + "/"))
+    return await serve_file(request, path, key, cache_control=IMMUTABLE_CACHE_CONTROL if immutable else None)
@@ -1,62 +1,136 @@
+import time
+from collections import OrderedDict
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, or_
-from app.database import get_db
+from sqlalchemy import select, or_, case, tuple_
+from app.database import get_db, get_read_db
 from app.models import User
 from app.schemas.user import UserResponse, UserUpdate
-from app.api.deps import get_current_user
+from app.api.deps import Principal, get_current_principal, get_current_user
+from app.user_cache import user_cache
+from app.api.pagination import encode_cursor, decode_cursor
+from app.api.search_utils import LIKE_ESCAPE, like_pattern, like_prefix
 
 router = APIRouter(prefix="/users", tags=["users"])
 # Роутер с динамическим путём подключаем отдельно и после статических, чтобы /list не матчился как {user_id}
 router_with_id = APIRouter(prefix="/users", tags=["users"])
 
 
+class _PrefixCache:
+    """Первая страница выдачи по горячим запросам (term -> строки без фильтра «кроме меня»).
+    Короткий TTL: новые пользователи и смена ника видны не позже чем через ttl секунд."""
+
+    def __init__(self, maxsize: int = 1000, ttl: float = 30.0) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[tuple[str, int], tuple[float, list]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple[str, int]) -> list | None:
+        entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple[str, int], rows: list) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, rows)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+user_search_cache = _PrefixCache()
+
+FUZZY_MIN_LEN = 3
+
+
+def _user_response(u: User) -> UserResponse:
+    # На случай если в БД нет колонки handle или она NULL
+    handle_val = getattr(u, "handle", None) or getattr(u, "username", "") or ""
+    return UserResponse(
+        id=u.id,
+        username=u.username,
+        handle=handle_val,
+        email=u.email,
+        avatar=u.avatar,
+        online_status=u.online_status or "offline",
+        created_at=u.created_at,
+    )
+
+
+async def _search_users(db: AsyncSession, term: str, limit: int, after: tuple[int, str] | None) -> list[tuple[int, UserResponse]]:
+    """Ранжирование: 0 — точный handle, 1 — префикс handle, 2 — префикс имени, 3 — подстрока/опечатка."""
+    pattern = like_pattern(term)
+    prefix = like_prefix(term)
+    tier = case(
+        (User.handle == term, 0),
+        (User.handle.like(prefix, escape=LIKE_ESCAPE), 1),
+        (User.username.ilike(prefix, escape=LIKE_ESCAPE), 2),
+        else_=3,
+    )
+    match = [User.handle.ilike(pattern, escape=LIKE_ESCAPE), User.username.ilike(pattern, escape=LIKE_ESCAPE)]
+    if len(term) >= FUZZY_MIN_LEN:
+        match.append(User.handle.op("%")(term))
+    q = select(User, tier).where(or_(*match))
+    if after:
+        q = q.where(tuple_(tier, User.handle) > tuple_(*after))
+    r = await db.execute(q.order_by(tier, User.handle).limit(limit))
+    return [(t, _user_response(u)) for u, t in r.all()]
+
+
 @router.get("/list", response_model=list[UserResponse])
 async def list_users(
+    response: Response,
     search: str | None = Query(None),
     limit: int = Query(50, ge=1, le=100),
-    db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    cursor: str | None = Query(None, description="X-Next-Cursor предыдущей страницы"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Principal = Depends(get_current_principal),
 ):
     term = (search or "").lstrip("@").strip().lower()
     if not term:
         return []
-    # Ищем по handle (ID) или по username на случай старых записей
-    q = (
-        select(User)
-        .where(User.id != current_user.id)
-        .where(
-            or_(
-                User.handle.ilike(f"%{term}%"),
-                User.username.ilike(f"%{term}%"),
-            )
-        )
-        .order_by(User.handle)
-        .limit(limit)
-    )
-    r = await db.execute(q)
-    out = []
-    for u in r.scalars().all():
-        # На случай если в БД нет колонки handle или она NULL
-        handle_val = getattr(u, "handle", None) or getattr(u, "username", "") or ""
-        out.append(
-            UserResponse(
-                id=u.id,
-                username=u.username,
-                handle=handle_val,
-                email=u.email,
-                avatar=u.avatar,
-                online_status=u.online_status or "offline",
-                created_at=u.created_at,
-            )
-        )
-    return out
+    # +2: одна строка может оказаться текущим пользователем, ещё одна — признак следующей страницы
+    fetch = limit + 2
+    if cursor:
+        values = decode_cursor(cursor, 2)
+        try:
+            after = (int(values[0]), str(values[1]))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        rows = await _search_users(db, term, fetch, after)
+    else:
+        rows = user_search_cache.get((term, fetch))
+        if rows is None:
+            rows = await _search_users(db, term, fetch, None)
+            user_search_cache.put((term, fetch), rows)
+    rows = [(t, u) for t, u in rows if u.id != current_user.id]
+    if len(rows) > limit:
+        t, u = rows[limit - 1]
+        response.headers["X-Next-Cursor"] = encode_cursor(t, u.handle)
+    return [u for _, u in rows[:limit]]
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_me(current_user: User = Depends(get_current_user)):
-    return UserResponse.model_validate(current_user)
+async def get_me(
+    db: AsyncSession = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    profile = await user_cache.get(db, current_user.id)
+    if not profile:
+        raise HTTPException(status_code=401, detail="User not found")
+    return profile
 
 
 @router.patch("/me", response_model=UserResponse)
@@ -81,17 +155,19 @@ async def update_me(
         current_user.online_status = data.online_status
     await db.commit()
     await db.refresh(current_user)
-    return UserResponse.model_validate(current_user)
+    await user_cache.invalidate(current_user.id)
+    if data.username is not None or data.handle is not None:
+        user_search_cache.clear()
+    return user_cache.put(current_user)
 
 
 @router_with_id.get("/{user_id}", response_model=UserResponse)
 async def get_user(
     user_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_principal),
 ):
-    r = await db.execute(select(User).where(User.id == user_id))
-    user = r.scalar_one_or_none()
-    if not user:
+    profile = await user_cache.get(db, user_id)
+    if not profile:
         raise HTTPException(status_code=404, detail="User not found")
-    return UserResponse.model_validate(user)
+    return profile
@@ -0,0 +1,32 @@
+"""Непрозрачные курсоры для keyset-пагинации: base64url от JSON-списка значений ключа."""
+import base64
+import json
+from datetime import datetime
+from uuid import UUID
+
+from fastapi import HTTPException
+
+
+def encode_cursor(*values) -> str:
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else str(v) for v in values])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int | None = None) -> list[str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or (size is not None and len(values) != size):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
+
+
+def decode_time_id_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Курсор вида (created_at, id)."""
+    ts, id_ = decode_cursor(cursor, 2)
+    try:
+        return datetime.fromisoformat(ts), UUID(id_)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
@@ -0,0 +1,17 @@
+"""Шаблоны LIKE/ILIKE с экранированием спецсимволов; использовать вместе с escape=LIKE_ESCAPE."""
+
+LIKE_ESCAPE = "!"
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("!", "!!").replace("%", "!%").replace("_", "!_")
+
+
+def like_pattern(term: str) -> str:
+    """%term% — подстрока."""
+    return "%" + _escape_like(term) + "%"
+
+
+def like_prefix(term: str) -> str:
+    """term% — префикс."""
+    return _escape_like(term) + "%"
@@ -1,43 +1,27 @@
-"""WebSocket API: один эндпоинт для real-time (join_chat, send_message, new_message)."""
+"""WebSocket API: один эндпоинт для real-time (join_chat, send_message, mark_read, new_message)."""
 import json
 import logging
 from uuid import UUID
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.database import AsyncSessionLocal
-from app.models import User, ChatMember, Message
+from app.database import AsyncSessionLocal, release_connection
 from app.ws_manager import ws_manager
-from app.core.security import decode_token
+from app.notifications import notify_chat_members, read_receipts
+from app.read_state import mark_read
+from app.membership import membership_cache
+from app.message_writer import sender_name_of
+from app.write_behind import write_message, QueueFullError
+from app import chat_summary
+from app.user_cache import user_cache
+from app.api.deps import principal_from_token
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
-async def get_user_from_token(token: str) -> User | None:
-    payload = decode_token(token)
-    if not payload or "sub" not in payload:
-        return None
-    async with AsyncSessionLocal() as db:
-        r = await db.execute(select(User).where(User.id == UUID(payload["sub"])))
-        return r.scalar_one_or_none()
-
-
-def _message_to_dict(msg: Message) -> dict:
-    return {
-        "id": str(msg.id),
-        "chat_id": str(msg.chat_id),
-        "user_id": str(msg.user_id),
-        "content": msg.content,
-        "type": msg.type,
-        "created_at": msg.created_at.isoformat(),
-        "attachments": [],
-    }
-
-
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket) -> None:
     await websocket.accept()
@@ -45,7 +29,8 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
     if not token:
         await websocket.close(code=4001)
         return
-    user = await get_user_from_token(token)
+    # Достаточно claims токена: сокету нужен только user.id
+    user = principal_from_token(token)
     if not user:
         await websocket.close(code=4001)
         return
@@ -78,30 +63,38 @@ async def websocket_endpoint(websocket: WebSocket) -> None:
                 except (ValueError, TypeError):
                     continue
                 async with AsyncSessionLocal() as db:
-                    r = await db.execute(
-                        select(ChatMember).where(
-                            ChatMember.chat_id == cid,
-                            ChatMember.user_id == user.id,
+                    if not await membership_cache.role(db, cid, user.id):
+                        continue
+                    # data["type"] здесь — тип WS-события, не сообщения; по сокету шлётся только текст
+                    try:
+                        payload = await write_message(
+                            db,
+                            cid,
+                            user.id,
+                            content,
+                            "text",
+                            sender_name=sender_name_of(await user_cache.get(db, user.id)),
                         )
-                    )
-                    if not r.scalar_one_or_none():
+                    except QueueFullError:
+                        ws_manager.send_to(websocket, {"type": "error", "detail": "overloaded", "chat_id": chat_id})
                         continue
-                    msg = Message(
-                        chat_id=cid,
-                        user_id=user.id,
-                        content=content,
-                        type=data.get("type") or "text",
-                    )
-                    db.add(msg)
-                    await db.commit()
-                    await db.refresh(msg)
-                    payload = _message_to_dict(msg)
+                    await release_connection(db)
                     await ws_manager.broadcast_to_chat(str(chat_id), {"type": "new_message", "message": payload})
-                    members = await db.execute(
-                        select(ChatMember.user_id).where(ChatMember.chat_id == cid)
-                    )
-                    for (member_uid,) in members.all():
-                        await ws_manager.broadcast_to_user(str(member_uid), {"type": "chats_updated"})
+                    await notify_chat_members(db, cid, chat_summary.last_message_from_payload(payload), user.id)
+            elif msg_type == "mark_read":
+                try:
+                    cid = UUID(data.get("chat_id"))
+                    mid = UUID(data["message_id"]) if data.get("message_id") else None
+                except (ValueError, TypeError):
+                    continue
+                async with AsyncSessionLocal() as db:
+                    result = await mark_read(db, cid, user.id, mid)
+                    if result is None:
+                        continue
+                    await db.commit()
+                state, moved = result
+                if moved:
+                    read_receipts.notify(str(cid), str(user.id), state)
     except WebSocketDisconnect:
         pass
     finally:
@@ -0,0 +1,267 @@
+"""Контентно-адресуемое хранение загрузок.
+
+Файл сохраняется в хранилище (app/storage.py) под ключом из SHA-256 содержимого:
+blobs/ab/<sha256><ext>. Хэш считается при потоковом приёме (app/upload_stream.py)
+или присылается клиентом при прямой загрузке и проверяется при записи. Одно и то
+же содержимое, загруженное повторно (мем, пересланный в 50 чатов), хранится один
+раз, а его URL никогда не меняет содержимое — отдаётся с immutable-кэшем.
+
+Учёт — таблица blobs. ref_count ведут триггеры на attachments (app/models/blob.py),
+поэтому каскадные удаления сообщений и чатов тоже уменьшают счётчик. BlobCollector
+периодически удаляет блобы без ссылок вместе с файлами и вариантами картинок;
+свежие загрузки, ещё не прикреплённые к сообщению, защищены отсрочкой
+BLOB_GC_GRACE_HOURS (повторная загрузка её продлевает).
+
+Прямая загрузка (presign -> PUT -> complete) не доверяет заявленному хэшу: байты
+всегда кладутся во временный ключ incoming/<nonce> (хранилище сверяет размер и
+SHA-256), а строка блоба появляется только в complete — по квитанции, подписанной
+для этого пользователя, хэша, размера и расширения. Готовый блоб по одному хэшу,
+без байтов, не выдаётся: иначе по хэшу можно было бы проверить и получить чужой
+файл. Брошенные incoming/ удаляет BlobCollector.
+
+Имя блоба выводится из содержимого, поэтому наружу он отдаётся только по URL с
+токеном загрузки: /api/uploads/<nonce>-<hmac>/blobs/ab/<sha256><ext>. nonce свой у
+каждой загрузки, подпись — HMAC от nonce и ключа на секрете сервера: имея сам
+файл, ссылку на него не построить и не проверить, был ли он загружен. Хранится
+блоб по-прежнему один раз; голый ключ blobs/... (и variants/...) API не отдаёт.
+"""
+import asyncio
+import hashlib
+import hmac
+import logging
+import re
+import secrets
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.core.config import settings
+from app.image_variants import VARIANTS, VARIANTS_DIR, variant_key
+from app.models import Blob
+from app.storage import INCOMING_DIR, Storage
+from app.upload_stream import ReceivedFile
+
+logger = logging.getLogger(__name__)
+
+BLOBS_DIR = "blobs"
+_BLOB_URL = re.compile(r"^/api/uploads/(?:[0-9a-f]{16}-[0-9a-f]{32}/)?blobs/[0-9a-f]{2}/([0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+_URL_KEY = hashlib.sha256(b"upload-url:" + settings.jwt_secret.encode()).digest()
+_TICKET_KEY = hashlib.sha256(b"upload-ticket:" + settings.jwt_secret.encode()).digest()
+GC_LOCK_KEY = 0x626C6F62  # "blob"
+
+
+def blob_key(sha256: str, ext: str) -> str:
+    return f"{BLOBS_DIR}/{sha256[:2]}/{sha256}{ext}"
+
+
+def _url_signature(nonce: str, key: str) -> str:
+    return hmac.new(_URL_KEY, f"{nonce}:{key}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def public_key(key: str) -> str:
+    """Путь файла в публичном URL: для блоба — с новым токеном загрузки, остальное как есть."""
+    if not key.startswith(BLOBS_DIR + "/"):
+        return key
+    nonce = secrets.token_hex(8)
+    return f"{nonce}-{_url_signature(nonce, key)}/{key}"
+
+
+def canonical_key(path: str) -> bool:
+    """Ключ без пустых, «.» и «..» сегментов: проверка префикса по строке совпадает с файлом в хранилище."""
+    if not path or "\\" in path or "\0" in path:
+        return False
+    return all(segment not in ("", ".", "..") for segment in path.split("/"))
+
+
+def resolve_key(path: str) -> str | None:
+    """Ключ в хранилище по пути из публичного URL; None — токен неверен или путь не публичный."""
+    if not canonical_key(path):
+        return None
+    token, _, rest = path.partition("/")
+    if rest.startswith(BLOBS_DIR + "/"):
+        nonce, _, signature = token.partition("-")
+        if nonce and hmac.compare_digest(signature, _url_signature(nonce, rest)):
+            return rest
+        return None
+    if path.startswith((BLOBS_DIR + "/", VARIANTS_DIR + "/", INCOMING_DIR + "/")):
+        return None
+    return path
+
+
+def _ticket_signature(user_id, sha256: str, nonce: str, size: int, ext: str, expires: int) -> str:
+    message = f"{user_id}\n{sha256}\n{nonce}\n{size}\n{ext}\n{expires}".encode()
+    return hmac.new(_TICKET_KEY, message, hashlib.sha256).hexdigest()
+
+
+def issue_upload(user_id, sha256: str, size: int, ext: str, ttl: int) -> tuple[str, str]:
+    """Временный ключ для PUT и квитанция для complete: (key, upload_id)."""
+    nonce = secrets.token_hex(16)
+    expires = int(time.time()) + ttl
+    signature = _ticket_signature(user_id, sha256, nonce, size, ext, expires)
+    return f"{INCOMING_DIR}/{nonce}", f"{nonce}:{size}:{ext}:{expires}:{signature}"
+
+
+def open_upload(upload_id: str, user_id, sha256: str) -> tuple[str, int, str] | None:
+    """(временный ключ, размер, расширение) по квитанции этого пользователя; None — чужая, истёкшая или поддельная."""
+    try:
+        nonce, size, ext, expires, signature = upload_id.split(":")
+        size, expires = int(size), int(expires)
+    except ValueError:
+        return None
+    if expires < time.time():
+        return None
+    if not hmac.compare_digest(signature, _ticket_signature(user_id, sha256, nonce, size, ext, expires)):
+        return None
+    return f"{INCOMING_DIR}/{nonce}", size, ext
+
+
+def blob_sha256(url: str | None) -> str | None:
+    """SHA-256 блоба по URL вложения; для старых (uuid) и внешних URL — None."""
+    match = _BLOB_URL.match(url or "")
+    return match.group(1) if match else None
+
+
+async def reserve(db: AsyncSession, sha256: str, size: int, ext: str, content_type: str | None) -> str:
+    """Строка блоба для содержимого sha256; вернуть его ключ в хранилище. Коммит — за вызывающим.
+
+    Вызывается только для уже проверенных байтов (размер и хэш посчитаны при приёме
+    или сверены хранилищем при прямой загрузке).
+
+    Если блоб уже есть, используется его ключ (расширение первой загрузки), а
+    last_uploaded_at сдвигается. Строка остаётся заблокированной до коммита,
+    поэтому сборщик не удалит её между upsert и размещением файла.
+    """
+    now = datetime.now(timezone.utc)
+    stmt = insert(Blob).values(
+        sha256=sha256,
+        path=blob_key(sha256, ext),
+        size=size,
+        content_type=content_type,
+        ref_count=0,
+        created_at=now,
+        last_uploaded_at=now,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Blob.sha256], set_={"last_uploaded_at": stmt.excluded.last_uploaded_at}
+    ).returning(Blob.path)
+    return (await db.execute(stmt)).scalar_one()
+
+
+async def store(db: AsyncSession, storage: Storage, file: ReceivedFile, ext: str, content_type: str | None) -> str:
+    """Записать принятый файл как блоб; вернуть его ключ. Тот же файл уже в хранилище — временный удалит discard()."""
+    key = await reserve(db, file.sha256, file.size, ext, content_type)
+    if not await storage.exists(key):
+        await storage.put_file(key, file.temp_path, content_type)
+    return key
+
+
+async def adopt(
+    db: AsyncSession, storage: Storage, incoming: str, sha256: str, size: int, ext: str, content_type: str | None
+) -> str:
+    """Прямая загрузка из incoming/ становится блобом (или удаляется, если такой блоб уже есть); вернуть ключ блоба."""
+    key = await reserve(db, sha256, size, ext, content_type)
+    if await storage.exists(key):
+        await storage.delete([incoming])
+    else:
+        await storage.move(incoming, key, content_type)
+    return key
+
+
+class BlobCollector:
+    """Периодическое удаление блобов без ссылок; между воркерами — advisory-lock."""
+
+    def __init__(self, interval: float = 3600, grace_hours: int = 24, batch: int = 500) -> None:
+        self.storage: Storage | None = None
+        self.interval = interval
+        self.grace_hours = grace_hours
+        self.batch = batch
+        self._engine: AsyncEngine | None = None
+        self._task: asyncio.Task | None = None
+        self.runs = 0
+        self.removed = 0
+        self.last_run_ms: float | None = None
+
+    def configure(self, engine: AsyncEngine, storage: Storage, interval: float, grace_hours: int, batch: int) -> None:
+        self._engine = engine
+        self.storage = storage
+        self.interval = interval
+        self.grace_hours = grace_hours
+        self.batch = batch
+
+    async def collect(self) -> int:
+        """Один проход; возвращает число удалённых блобов (0, если проход идёт в другом воркере)."""
+        started = time.perf_counter()
+        cutoff = datetime.now(timezone.utc) - timedelta(hours=self.grace_hours)
+        removed = 0
+        locked = False
+        while True:
+            # Файлы удаляются внутри транзакции: параллельная загрузка того же содержимого
+            # ждёт на удаляемой строке и после коммита заново положит файл
+            async with self._engine.begin() as conn:
+                locked = (await conn.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": GC_LOCK_KEY})).scalar()
+                if not locked:
+                    break
+                paths = (await conn.execute(
+                    text("""
+                        DELETE FROM blobs WHERE sha256 IN (
+                            SELECT sha256 FROM blobs
+                            WHERE ref_count <= 0 AND last_uploaded_at < :cutoff
+                            LIMIT :batch FOR UPDATE SKIP LOCKED
+                        )
+                        AND ref_count <= 0 AND last_uploaded_at < :cutoff
+                        RETURNING path
+                    """),
+                    {"cutoff": cutoff, "batch": self.batch},
+                )).scalars().all()
+                if paths:
+                    await self.storage.delete([
+                        key for path in paths for key in (path, *(variant_key(path, v) for v in VARIANTS))
+                    ])
+            removed += len(paths)
+            if len(paths) < self.batch:
+                break
+        if locked:
+            # Прямые загрузки без complete: incoming/ старше той же отсрочки
+            await self.storage.purge_incoming(cutoff)
+        self.runs += 1
+        self.removed += removed
+        self.last_run_ms = round((time.perf_counter() - started) * 1000, 1)
+        if removed:
+            logger.info("Blob GC removed %d orphaned blobs in %.1f ms", removed, self.last_run_ms)
+        return removed
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.collect()
+            except Exception as e:
+                logger.warning("Blob GC failed: %s", e)
+
+    def start(self) -> None:
+        if self._task is None and self._engine is not None and self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "interval_s": self.interval,
+            "grace_hours": self.grace_hours,
+            "runs": self.runs,
+            "removed": self.removed,
+            "last_run_ms": self.last_run_ms,
+        }
+
+
+blob_collector = BlobCollector()
@@ -0,0 +1,111 @@
+"""Сводка чата (последнее сообщение, число участников, счётчик сообщений) в колонках chats.
+
+Все функции только ставят UPDATE в текущую сессию — коммит делает вызывающий код,
+поэтому сводка меняется в одной транзакции с самим сообщением/участниками.
+"""
+from datetime import datetime
+from uuid import UUID
+
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Chat, ChatMember, Message
+
+PREVIEW_MAX_LEN = 255
+
+
+def make_preview(content: str | None) -> str | None:
+    if not content:
+        return None
+    return content[:PREVIEW_MAX_LEN]
+
+
+def last_message_dict(chat) -> dict | None:
+    """last_message в формате ChatResponse из денормализованных колонок (Chat или строка с теми же полями)."""
+    if not chat.last_message_id:
+        return None
+    return {
+        "id": str(chat.last_message_id),
+        "content": chat.last_message_preview,
+        "created_at": chat.last_message_at.isoformat() if chat.last_message_at else None,
+    }
+
+
+def message_created_stmt(chat_id: UUID, message_id: UUID, content: str | None, created_at: datetime, user_id: UUID):
+    """UPDATE сводки для нового сообщения — отдельно, чтобы его можно было встроить в CTE (app/message_writer.py)."""
+    return (
+        update(Chat.__table__)
+        .where(Chat.__table__.c.id == chat_id)
+        .values(
+            last_message_id=message_id,
+            last_message_preview=make_preview(content),
+            last_message_at=created_at,
+            last_message_user_id=user_id,
+            updated_at=created_at,
+            message_seq=Chat.__table__.c.message_seq + 1,
+        )
+    )
+
+
+def sender_read_stmt(chat_id, user_id, count=1):
+    """Свои сообщения не становятся непрочитанными: read_seq отправителя растёт вместе с message_seq.
+
+    chat_id/user_id/count — значения или bindparam (executemany в app/write_behind.py)."""
+    members_t = ChatMember.__table__
+    return (
+        update(members_t)
+        .where(members_t.c.chat_id == chat_id, members_t.c.user_id == user_id)
+        .values(read_seq=members_t.c.read_seq + count)
+    )
+
+
+def last_message_from_payload(payload: dict) -> dict:
+    """last_message для дельты chats_updated из сериализованного нового сообщения."""
+    return {"id": payload["id"], "content": make_preview(payload.get("content")), "created_at": payload["created_at"]}
+
+
+async def on_message_updated(db: AsyncSession, msg: Message) -> None:
+    """Правка текста: превью меняется, только если это последнее сообщение чата."""
+    await db.execute(
+        update(Chat)
+        .where(Chat.id == msg.chat_id, Chat.last_message_id == msg.id)
+        .values(last_message_preview=make_preview(msg.content))
+    )
+
+
+async def on_message_deleted(db: AsyncSession, chat_id: UUID, message_id: UUID) -> None:
+    """Удаление: если удалено последнее сообщение — берём предыдущее (удаление уже должно быть во flush)."""
+    current = await db.scalar(select(Chat.last_message_id).where(Chat.id == chat_id))
+    if current != message_id:
+        return
+    r = await db.execute(
+        select(Message.id, Message.content, Message.created_at, Message.user_id)
+        .where(Message.chat_id == chat_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(1)
+    )
+    prev = r.first()
+    await db.execute(
+        update(Chat)
+        .where(Chat.id == chat_id)
+        .values(
+            last_message_id=prev.id if prev else None,
+            last_message_preview=make_preview(prev.content) if prev else None,
+            last_message_at=prev.created_at if prev else None,
+            last_message_user_id=prev.user_id if prev else None,
+        )
+    )
+
+
+async def refresh_members_count(db: AsyncSession, chat_id: UUID) -> None:
+    """Пересчитать members_count после изменения состава (изменения участников уже должны быть во flush)."""
+    await db.execute(
+        update(Chat)
+        .where(Chat.id == chat_id)
+        .values(
+            members_count=select(func.count())
+            .select_from(ChatMember)
+            .where(ChatMember.chat_id == chat_id)
+            .scalar_subquery()
+        )
+    )
@@ -7,8 +7,76 @@ class Settings(BaseSettings):
     jwt_secret: str = "your-super-secret-key-change-in-production"
     jwt_algorithm: str = "HS256"
     jwt_expire_minutes: int = 60
+    # Реплика для чтения списков и поиска (пусто — всё читается с основной базы)
+    database_replica_url: str = ""
+    # Пул соединений (на каждый движок и воркер)
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 10.0
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # Кэш подготовленных выражений asyncpg на соединение; 0 — за pgbouncer (transaction pooling)
+    db_statement_cache_size: int = 500
+    # Отдавать соединение в пул после commit, до WebSocket-рассылки
+    db_release_before_fanout: bool = True
+    # bcrypt: cost (смена — хеши пересчитываются при входе), потоки и длина очереди
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_max_queue: int = 64
+    # Загрузки: лимиты проверяются по ходу приёма тела (nginx пропускает до 100 МБ)
+    upload_max_file_mb: int = 50
+    upload_max_request_mb: int = 100
+    upload_max_files: int = 10
+    # Хранилище загрузок (app/storage.py): local — каталог UPLOAD_DIR (пусто — backend-fastapi/uploads) | s3
+    storage_backend: str = "local"
+    upload_dir: str = ""
+    # S3-совместимое хранилище; S3_PRESIGN_ENDPOINT_URL — адрес бакета, видимый браузеру, если отличается
+    s3_bucket: str = "chat-uploads"
+    s3_endpoint_url: str = ""
+    s3_presign_endpoint_url: str = ""
+    s3_region: str = "us-east-1"
+    s3_access_key: str = ""
+    s3_secret_key: str = ""
+    # Публичный адрес бакета/CDN: постоянные URL вместо presigned GET
+    s3_public_url: str = ""
+    # Срок жизни presigned-ссылок на загрузку и скачивание
+    presign_ttl_seconds: int = 900
+    # Отдача локальных файлов через nginx: X-Accel-Redirect на internal-location (например /_uploads/); пусто — из Python
+    x_accel_redirect_prefix: str = ""
+    # Процессы для уменьшенных копий картинок
+    image_variant_workers: int = 2
+    # Сборка блобов без ссылок (app/blob_store.py): период, отсрочка для свежих загрузок, размер пачки
+    blob_gc_interval_seconds: int = 3600
+    blob_gc_grace_hours: int = 24
+    blob_gc_batch: int = 500
+    # Отладка SQL: заголовки X-Query-Count / X-Query-Warnings, лог N+1 и превышений бюджета (app/query_debug.py)
+    query_debug: bool = False
+    query_repeat_threshold: int = 3
+    # Рассылка WebSocket-событий между воркерами: memory (один процесс) | redis
+    broadcast_backend: str = "memory"
+    redis_url: str = "redis://localhost:6379/0"
+    # Очередь исходящих на каждый сокет и политика для медленных клиентов: drop_oldest | coalesce | disconnect
+    ws_send_queue_size: int = 256
+    ws_slow_consumer_policy: str = "drop_oldest"
+    # Окно объединения chats_updated по пользователю, мс
+    chats_updated_debounce_ms: int = 150
+    # Окно объединения read_receipts по чату, мс
+    read_receipts_debounce_ms: int = 500
+    # Кэш состава чатов (проверки доступа и рассылка)
+    membership_cache_size: int = 10000
+    membership_cache_ttl_seconds: float = 60.0
+    # Запись сообщений: direct (транзакция на сообщение) | write_behind (фоновая пачечная запись, app/write_behind.py)
+    message_write_mode: str = "direct"
+    write_behind_durability: str = "async"  # async | commit
+    write_behind_max_pending: int = 10000
+    write_behind_batch_size: int = 500
+    write_behind_flush_ms: int = 20
+    # alembic upgrade head при старте (один воркер под advisory-lock); false — миграции отдельным шагом деплоя
+    migrate_on_startup: bool = True
+    # Сверка индексов моделей с базой при каждом старте (один запрос к каталогу, только предупреждение в лог)
+    check_indexes_on_startup: bool = True
 
-    @field_validator("database_url", mode="before")
+    @field_validator("database_url", "database_replica_url", mode="before")
     @classmethod
     def set_async_driver(cls, v: str) -> str:
         if isinstance(v, str) and v.startswith("postgresql://") and "+asyncpg" not in v:
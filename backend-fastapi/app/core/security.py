@@ -1,9 +1,13 @@
+import asyncio
 import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 import bcrypt
 from app.core.config import settings
+from app.metrics import PASSWORD_HASH_SECONDS, PASSWORD_HASH_PENDING, PASSWORD_HASH_QUEUE_SECONDS
 
 # В bcrypt можно передать не более 72 байт. ВСЕГДА хешируем через SHA256 (32 байта) — так bcrypt 5.x не падает.
 BCRYPT_MAX_BYTES = 72
@@ -16,13 +20,101 @@ def _to_bcrypt_input(password: str) -> bytes:
 
 def verify_password(plain: str, hashed: str) -> bool:
     try:
-        return bcrypt.checkpw(_to_bcrypt_input(plain), hashed.encode("utf-8"))
+        with PASSWORD_HASH_SECONDS.labels("verify").time():
+            return bcrypt.checkpw(_to_bcrypt_input(plain), hashed.encode("utf-8"))
     except Exception:
         return False
 
 
-def get_password_hash(password: str) -> str:
-    return bcrypt.hashpw(_to_bcrypt_input(password), bcrypt.gensalt()).decode("utf-8")
+def get_password_hash(password: str, rounds: int | None = None) -> str:
+    salt = bcrypt.gensalt(rounds or settings.bcrypt_rounds)
+    with PASSWORD_HASH_SECONDS.labels("hash").time():
+        return bcrypt.hashpw(_to_bcrypt_input(password), salt).decode("utf-8")
+
+
+def hash_rounds(hashed: str) -> int | None:
+    """Cost bcrypt из хеша вида $2b$12$..."""
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+class PasswordHasher:
+    """bcrypt вне event loop: отдельный пул потоков (bcrypt отпускает GIL) с ограниченной очередью.
+
+    Одновременно считается не больше workers хешей, ещё max_queue ждут; сверх этого —
+    PasswordHasherBusy (эндпоинты отвечают 503), чтобы волна логинов после деплоя
+    не копила бесконечную очередь.
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 64, rounds: int = 12) -> None:
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+        self._executor: ThreadPoolExecutor | None = None
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def configure(self, workers: int, max_queue: int, rounds: int) -> None:
+        self.shutdown()
+        self.workers = workers
+        self.max_queue = max_queue
+        self.rounds = rounds
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            raise PasswordHasherBusy("Password hashing queue is full")
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self.pending += 1
+        PASSWORD_HASH_PENDING.inc()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, self._timed, time.perf_counter(), fn, *args
+            )
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            PASSWORD_HASH_PENDING.dec()
+
+    @staticmethod
+    def _timed(submitted: float, fn, *args):
+        PASSWORD_HASH_QUEUE_SECONDS.observe(time.perf_counter() - submitted)
+        return fn(*args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password, self.rounds)
+
+    async def verify(self, plain: str, hashed: str) -> bool:
+        return await self._run(verify_password, plain, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Хеш посчитан с другим cost — пересчитать при успешном входе."""
+        return hash_rounds(hashed) != self.rounds
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "pending": self.pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher()
 
 
 def create_access_token(sub: str, username: Optional[str] = None) -> str:
@@ -1,13 +1,94 @@
 import sys
+import time
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.core.config import settings
 from app.models import Base
 
-try:
+
+class PoolStats:
+    """Счётчики пула: выдачи соединений, ожидание свободного соединения, таймауты."""
+
+    def __init__(self) -> None:
+        self.checkouts = 0
+        self.connects = 0
+        self.waits = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def record_wait(self, seconds: float) -> None:
+        self.waits += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул, замеряющий время ожидания соединения (checkout при исчерпанном пуле)."""
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _create_connection(self):
+        self.stats.connects += 1
+        return super()._create_connection()
+
+    def _do_get(self):
+        self.stats.checkouts += 1
+        if self._max_overflow < 0 or self.checkedout() < self.size() + self._max_overflow:
+            return super()._do_get()
+        # Свободных соединений и места под overflow нет — ждём и считаем время
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            self.stats.timeouts += 1
+            raise
+        finally:
+            self.stats.record_wait(time.perf_counter() - started)
+
+
+def _make_engine(url: str):
     engine = create_async_engine(
-        settings.database_url,
+        url,
         echo=False,
+        poolclass=TimedQueuePool,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_recycle=settings.db_pool_recycle,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        # Кэш подготовленных выражений asyncpg (0 — выключить, нужно за pgbouncer в transaction-режиме)
+        connect_args={
+            "prepared_statement_cache_size": settings.db_statement_cache_size,
+            "statement_cache_size": settings.db_statement_cache_size,
+        },
     )
+    return engine
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.sync_engine.pool
+    stats: PoolStats = pool.stats
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "idle": pool.checkedin(),
+        "checkouts": stats.checkouts,
+        "connects": stats.connects,
+        "waits": stats.waits,
+        "wait_ms_avg": round(stats.wait_seconds_total / stats.waits * 1000, 2) if stats.waits else 0.0,
+        "wait_ms_max": round(stats.wait_seconds_max * 1000, 2),
+        "timeouts": stats.timeouts,
+    }
+
+
+try:
+    engine = _make_engine(settings.database_url)
+    # Реплика для чтения (списки и поиск); без DATABASE_REPLICA_URL — тот же движок
+    read_engine = _make_engine(settings.database_replica_url) if settings.database_replica_url else engine
 except Exception as e:
     print(f"Database engine failed: {type(e).__name__}: {e}", file=sys.stderr)
     raise
@@ -20,6 +101,16 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False,
 )
 
+# info["replica"] — данные могут отставать от основной базы; кэши их не сохраняют
+ReadSessionLocal = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autocommit=False,
+    autoflush=False,
+    info={"replica": read_engine is not engine},
+)
+
 
 async def get_db():
     async with AsyncSessionLocal() as session:
@@ -31,3 +122,28 @@ async def get_db():
             raise
         finally:
             await session.close()
+
+
+async def get_read_db():
+    """Сессия только для чтения: реплика, если задана (возможна задержка репликации)."""
+    async with ReadSessionLocal() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
+
+
+async def release_connection(db: AsyncSession) -> None:
+    """Вернуть соединение в пул до рассылки (DB_RELEASE_BEFORE_FANOUT).
+
+    Вызывается после commit: объекты остаются доступны (expire_on_commit=False),
+    а если сессия понадобится снова — она возьмёт новое соединение.
+    """
+    if settings.db_release_before_fanout:
+        await db.close()
+
+
+async def dispose_engines() -> None:
+    await engine.dispose()
+    if read_engine is not engine:
+        await read_engine.dispose()
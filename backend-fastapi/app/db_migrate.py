@@ -0,0 +1,145 @@
+"""Применение Alembic-миграций при старте и проверка индексов схемы.
+
+Схемой владеют миграции в alembic/versions (create_all больше не вызывается);
+модели в app/models объявляют те же индексы, и report_missing_indexes
+сообщает, каких из них нет в базе (например, база поднята вручную или миграция не дошла).
+Сверка идёт при каждом старте (check_indexes), в том числе когда схема уже на head.
+
+Старт воркера (ensure_schema): одна выборка из alembic_version; если версия
+совпадает с head из alembic/versions — миграции не трогаются совсем. Иначе воркер
+берёт advisory-lock, перепроверяет версию и только тогда мигрирует — остальные
+воркеры ждут на блокировке и, увидев head, сразу идут обслуживать запросы.
+"""
+import logging
+from functools import lru_cache
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import Column, UniqueConstraint, text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from app.models import Base
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def alembic_config(connection=None) -> Config:
+    cfg = Config(str(ALEMBIC_INI))
+    cfg.set_main_option("script_location", str(ALEMBIC_INI.parent / "alembic"))
+    cfg.attributes["connection"] = connection
+    return cfg
+
+
+def _upgrade(sync_conn) -> None:
+    command.upgrade(alembic_config(sync_conn), "head")
+
+
+async def run_migrations(conn: AsyncConnection) -> None:
+    """alembic upgrade head в переданном соединении (транзакцию открывает вызывающий)."""
+    await conn.run_sync(_upgrade)
+
+
+# Ключ pg_advisory_xact_lock для миграций при старте (общий для всех воркеров)
+MIGRATION_LOCK_KEY = 0x63686174  # "chat"
+
+
+@lru_cache(maxsize=1)
+def head_revision() -> str | None:
+    """head из alembic/versions — читается с диска, без обращения к БД."""
+    return ScriptDirectory.from_config(alembic_config()).get_current_head()
+
+
+async def current_revision(engine: AsyncEngine) -> str | None:
+    """Версия схемы из alembic_version (None — таблицы ещё нет)."""
+    async with engine.connect() as conn:
+        try:
+            return (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+        except ProgrammingError:
+            return None
+
+
+async def ensure_schema(engine: AsyncEngine, current: str | None) -> bool:
+    """Довести схему до head; current — уже прочитанная версия. True, если миграции выполнялись здесь."""
+    head = head_revision()
+    if current == head:
+        return False
+    async with engine.begin() as conn:
+        # Лидер — тот, кто первым взял блокировку; остальные ждут и перепроверяют версию
+        await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        current = None
+        if (await conn.execute(text("SELECT to_regclass('alembic_version') IS NOT NULL"))).scalar():
+            current = (await conn.execute(text("SELECT version_num FROM alembic_version"))).scalar()
+        if current == head:
+            return False
+        logger.warning("Migrating schema %s -> %s", current or "<empty>", head)
+        await run_migrations(conn)
+    return True
+
+
+async def check_indexes(engine: AsyncEngine) -> list[str]:
+    """report_missing_indexes в отдельном соединении — после ensure_schema или вместо неё."""
+    async with engine.connect() as conn:
+        return await report_missing_indexes(conn)
+
+
+def _signature(table: str, method: str, unique: bool, columns: list[str], opclasses: list[str]) -> tuple:
+    return (table, method, unique, tuple(columns), tuple(opclasses))
+
+
+def expected_indexes() -> dict[str, tuple]:
+    """name -> сигнатура (таблица, метод, unique, колонки, нестандартные opclass) по моделям."""
+    out: dict[str, tuple] = {}
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            cols = [c.name for c in index.columns]
+            exprs = [getattr(e, "element", e) for e in index.expressions]  # без DESC/NULLS LAST
+            if len(cols) != len(exprs) or not all(isinstance(e, Column) for e in exprs):
+                # индексы по выражениям сравниваем только по имени: сигнатура ни с чем не совпадёт
+                out[index.name] = (table.name, "expression", index.name)
+                continue
+            ops = index.dialect_options["postgresql"]["ops"] or {}
+            method = index.dialect_options["postgresql"]["using"] or "btree"
+            out[index.name] = _signature(table.name, method, bool(index.unique), cols, [ops.get(c, "") for c in cols])
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint) and constraint.name:
+                cols = [c.name for c in constraint.columns]
+                out[constraint.name] = _signature(table.name, "btree", True, cols, [""] * len(cols))
+    return out
+
+
+async def existing_indexes(conn: AsyncConnection) -> dict[str, tuple]:
+    r = await conn.execute(text("""
+        SELECT t.relname AS table_name, i.relname AS index_name, am.amname, ix.indisunique,
+               array_agg(a.attname ORDER BY k.ord) AS columns,
+               array_agg(CASE WHEN oc.opcdefault THEN '' ELSE oc.opcname END ORDER BY k.ord) AS opclasses
+        FROM pg_index ix
+        JOIN pg_class i ON i.oid = ix.indexrelid
+        JOIN pg_class t ON t.oid = ix.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        JOIN pg_am am ON am.oid = i.relam
+        CROSS JOIN LATERAL unnest(ix.indkey::int2[], ix.indclass::oid[]) WITH ORDINALITY AS k(attnum, opclass, ord)
+        JOIN pg_attribute a ON a.attrelid = t.oid AND a.attnum = k.attnum
+        JOIN pg_opclass oc ON oc.oid = k.opclass
+        WHERE n.nspname = current_schema()
+        GROUP BY t.relname, i.relname, am.amname, ix.indisunique
+    """))
+    return {
+        row.index_name: _signature(row.table_name, row.amname, row.indisunique, list(row.columns), list(row.opclasses))
+        for row in r.all()
+    }
+
+
+async def report_missing_indexes(conn: AsyncConnection) -> list[str]:
+    """Имена индексов/ограничений из моделей, которых нет в базе ни под этим именем, ни с той же сигнатурой."""
+    expected = expected_indexes()
+    existing = await existing_indexes(conn)
+    signatures = set(existing.values())
+    missing = [name for name, sig in expected.items() if name not in existing and sig not in signatures]
+    if missing:
+        logger.warning("Missing indexes/constraints (run `alembic upgrade head`): %s", ", ".join(sorted(missing)))
+    return missing
@@ -0,0 +1,182 @@
+"""Отдача файлов из локального хранилища: ETag/Last-Modified, 304, Range, X-Accel-Redirect.
+
+Имена в хранилище неизменяемы (SHA-256 блоба, uuid старых загрузок, производные
+имена вариантов), поэтому ETag — само имя: сильный и одинаковый на всех узлах, в
+отличие от mtime-size у StaticFiles/FileResponse. Условные запросы (If-None-Match,
+If-Modified-Since) отвечаются 304 без чтения файла; Range (один диапазон, с
+If-Range) — 206, чтобы видео и большие PDF докачивались. С X_ACCEL_REDIRECT_PREFIX
+тело отдаёт nginx (sendfile) из internal-location, воркер шлёт только заголовки.
+"""
+import mimetypes
+import os
+import stat
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from urllib.parse import quote
+
+import anyio
+from fastapi import HTTPException
+from starlette.requests import Request
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+
+CHUNK_SIZE = 256 * 1024
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def content_etag(key: str) -> str:
+    return f'"{Path(key).stem}"'
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted == filename:
+        return f'attachment; filename="{filename}"'
+    return f"attachment; filename*=utf-8''{quoted}"
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """Слабое сравнение (RFC 9110, If-None-Match)."""
+    if header.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+def _not_newer_than(header: str, mtime: float) -> bool | None:
+    try:
+        return int(parsedate_to_datetime(header).timestamp()) >= int(mtime)
+    except (TypeError, ValueError):
+        return None
+
+
+def _same_date(header: str, mtime: float) -> bool:
+    try:
+        return int(parsedate_to_datetime(header).timestamp()) == int(mtime)
+    except (TypeError, ValueError):
+        return False
+
+
+def is_not_modified(request: Request, etag: str, mtime: float) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    return bool(if_modified_since) and bool(_not_newer_than(if_modified_since, mtime))
+
+
+def requested_range(request: Request, etag: str, mtime: float, size: int) -> tuple[int, int] | None:
+    """(start, end) включительно или None — отдать файл целиком. Неудовлетворимый диапазон — RangeNotSatisfiable."""
+    header = request.headers.get("range")
+    if not header or not header.startswith("bytes="):
+        return None
+    if_range = request.headers.get("if-range")
+    if if_range is not None:
+        # If-Range (RFC 9110): ETag — строгое сравнение (слабый тег не совпадает никогда),
+        # дата — точное совпадение с Last-Modified; иначе файл целиком
+        if if_range.startswith(("W/", '"')):
+            if if_range.startswith("W/") or if_range != etag:
+                return None
+        elif not _same_date(if_range, mtime):
+            return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec:
+        return None  # несколько диапазонов не поддерживаем — целиком (RFC это допускает)
+    first, sep, last = spec.partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            suffix = int(last)
+            if suffix == 0:
+                raise RangeNotSatisfiable
+            start, end = max(size - suffix, 0), size - 1
+    except ValueError:
+        return None
+    if start < 0 or start >= size or start > end:
+        raise RangeNotSatisfiable
+    return start, end
+
+
+class FileRangeResponse(Response):
+    """Байты [start, end] файла кусками по CHUNK_SIZE; на HEAD — только заголовки."""
+
+    def __init__(self, path: Path, start: int, end: int, status_code: int, headers: dict, media_type: str) -> None:
+        super().__init__(status_code=status_code, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        remaining = self.end - self.start + 1
+        if scope["method"].upper() == "HEAD" or remaining <= 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining > 0:
+                chunk = await file.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # Файл укоротился на ходу — закрываем тело
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+async def serve_file(
+    request: Request,
+    path: Path,
+    key: str,
+    media_type: str | None = None,
+    filename: str | None = None,
+    cache_control: str | None = None,
+) -> Response:
+    """Ответ на GET/HEAD файла key из локального хранилища (path — его путь на диске)."""
+    try:
+        st = await anyio.to_thread.run_sync(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if not stat.S_ISREG(st.st_mode):
+        raise HTTPException(status_code=404, detail="File not found")
+    etag = content_etag(key)
+    headers = {
+        "etag": etag,
+        "last-modified": formatdate(st.st_mtime, usegmt=True),
+        "accept-ranges": "bytes",
+    }
+    if cache_control:
+        headers["cache-control"] = cache_control
+    if filename:
+        headers["content-disposition"] = content_disposition(filename)
+    if is_not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+    media_type = media_type or mimetypes.guess_type(key)[0] or "application/octet-stream"
+    if settings.x_accel_redirect_prefix and "if-range" not in request.headers:
+        # Range и sendfile — на стороне nginx (internal-location на тот же каталог);
+        # If-Range nginx сверил бы со своими валидаторами, поэтому такие запросы отдаём сами
+        headers["x-accel-redirect"] = settings.x_accel_redirect_prefix + quote(key)
+        return Response(headers=headers, media_type=media_type)
+    size = st.st_size
+    try:
+        byte_range = requested_range(request, etag, st.st_mtime, size)
+    except RangeNotSatisfiable:
+        headers["content-range"] = f"bytes */{size}"
+        return Response(status_code=416, headers=headers)
+    status_code = 200
+    start, end = 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = 206
+        headers["content-range"] = f"bytes {start}-{end}/{size}"
+    headers["content-length"] = str(end - start + 1)
+    return FileRangeResponse(path, start, end, status_code, headers, media_type)
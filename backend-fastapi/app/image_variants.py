@@ -0,0 +1,182 @@
+"""Уменьшенные копии загруженных картинок (thumb / medium, WebP).
+
+Варианты считаются в пуле процессов (Pillow держит GIL на ресайзе): сразу после
+загрузки — в фоне, а для старых файлов — лениво, при первом запросе
+GET /api/upload/variants/{variant}/{stored_name}. Готовые файлы лежат в хранилище
+под ключами variants/... (app/storage.py); если хранилище не локальное, исходник
+скачивается во временный каталог, а варианты выгружаются обратно. Имя исходника
+(uuid или SHA-256 блоба, app/blob_store.py) не меняется, поэтому и варианты
+неизменяемы — их можно кэшировать навсегда.
+
+Модуль импортируется дочерними процессами пула (spawn), поэтому на верхнем уровне
+здесь только stdlib и Pillow.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Вариант -> максимальная сторона, px
+VARIANTS = {"thumb": 320, "medium": 1280}
+VARIANTS_DIR = "variants"
+WEBP_QUALITY = 80
+MAX_IMAGE_PIXELS = 50_000_000
+# GIF не трогаем: превью потеряло бы анимацию
+RENDERABLE_EXT = {".jpg", ".jpeg", ".png", ".webp"}
+UPLOADS_URL_PREFIX = "/api/uploads/"
+VARIANT_URL_PREFIX = "/api/upload/variants"
+
+
+def is_renderable(stored_name: str) -> bool:
+    return Path(stored_name).suffix.lower() in RENDERABLE_EXT
+
+
+def variant_filename(stored_name: str, variant: str) -> str:
+    return f"{Path(stored_name).stem}_{variant}.webp"
+
+
+def variant_key(stored_name: str, variant: str) -> str:
+    return f"{VARIANTS_DIR}/{variant_filename(stored_name, variant)}"
+
+
+def variant_urls(url: str | None) -> dict[str, str | None]:
+    """thumb_url / medium_url для вложения с url загруженного к нам файла (иначе None)."""
+    urls: dict[str, str | None] = {f"{v}_url": None for v in VARIANTS}
+    if not url or not url.startswith(UPLOADS_URL_PREFIX):
+        return urls
+    stored_name = url[len(UPLOADS_URL_PREFIX):]
+    if ".." in stored_name or stored_name.startswith(VARIANTS_DIR + "/") or not is_renderable(stored_name):
+        return urls
+    for variant in VARIANTS:
+        urls[f"{variant}_url"] = f"{VARIANT_URL_PREFIX}/{variant}/{stored_name}"
+    return urls
+
+
+def render_variants(source: str, targets: list[tuple[str, int]]) -> int:
+    """В дочернем процессе: открыть исходник один раз и записать варианты (target, max_side). Возвращает число записанных."""
+    from PIL import Image, ImageOps
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    written = 0
+    with Image.open(source) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+        for target, max_side in targets:
+            copy = img.copy()
+            copy.thumbnail((max_side, max_side), Image.LANCZOS)
+            tmp = f"{target}.tmp"
+            copy.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(tmp, target)
+            written += 1
+    return written
+
+
+class ImagePipeline:
+    def __init__(self, storage=None, workers: int = 2) -> None:
+        self.storage = storage
+        self.workers = workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._background: set[asyncio.Task] = set()
+        self.rendered = 0
+        self.failed = 0
+        self.lazy = 0
+
+    def configure(self, storage, workers: int) -> None:
+        self.shutdown()
+        self.storage = storage
+        self.workers = workers
+
+    def shutdown(self) -> None:
+        for task in self._background:
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, source: str, targets: list[tuple[str, int]]) -> int:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return await asyncio.get_running_loop().run_in_executor(self._executor, render_variants, source, targets)
+
+    async def _job(self, stored_name: str) -> int:
+        # Повторная загрузка того же блоба — варианты уже посчитаны
+        if all([await self.storage.exists(variant_key(stored_name, v)) for v in VARIANTS]):
+            return 0
+        local = self.storage.local_path(stored_name)
+        if local is not None:
+            targets = [(str(self.storage.local_path(variant_key(stored_name, v))), size) for v, size in VARIANTS.items()]
+            Path(targets[0][0]).parent.mkdir(parents=True, exist_ok=True)
+            return await self._run(str(local), targets)
+        with tempfile.TemporaryDirectory(dir=self.storage.temp_dir) as tmp:
+            source = Path(tmp) / "source"
+            if not await self.storage.fetch(stored_name, source):
+                raise FileNotFoundError(stored_name)
+            targets = [(str(Path(tmp) / variant_filename(stored_name, v)), size) for v, size in VARIANTS.items()]
+            written = await self._run(str(source), targets)
+            for variant, (target, _) in zip(VARIANTS, targets):
+                await self.storage.put_file(variant_key(stored_name, variant), Path(target), "image/webp")
+            return written
+
+    async def _render(self, stored_name: str) -> None:
+        """Посчитать все варианты файла; параллельные вызовы для одного файла ждут общий результат."""
+        pending = self._inflight.get(stored_name)
+        if pending is not None:
+            try:
+                await asyncio.shield(pending)
+            except Exception:
+                pass  # ошибку уже учёл и залогировал первый вызов
+            return
+        future = asyncio.ensure_future(self._job(stored_name))
+        self._inflight[stored_name] = future
+        try:
+            written = await asyncio.shield(future)
+            self.rendered += written
+        except BrokenProcessPool as e:
+            # Процесс пула упал (например, OOM на огромной картинке) — следующий вызов создаст пул заново
+            self.failed += 1
+            self._executor = None
+            logger.warning("Image variant pool broken on %s: %s", stored_name, e)
+        except Exception as e:
+            self.failed += 1
+            logger.warning("Image variants failed for %s: %s", stored_name, e)
+        finally:
+            self._inflight.pop(stored_name, None)
+
+    def schedule(self, stored_name: str) -> None:
+        """Сразу после загрузки: посчитать варианты в фоне."""
+        if self.storage is None or not is_renderable(stored_name):
+            return
+        task = asyncio.create_task(self._render(stored_name))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def ensure(self, stored_name: str, variant: str) -> bool:
+        """Есть ли вариант в хранилище; для старых файлов — посчитать сейчас и сохранить."""
+        key = variant_key(stored_name, variant)
+        if await self.storage.exists(key):
+            return True
+        if not is_renderable(stored_name) or not await self.storage.exists(stored_name):
+            return False
+        self.lazy += 1
+        await self._render(stored_name)
+        return await self.storage.exists(key)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "inflight": len(self._inflight),
+            "rendered": self.rendered,
+            "failed": self.failed,
+            "lazy": self.lazy,
+        }
+
+
+image_pipeline = ImagePipeline()
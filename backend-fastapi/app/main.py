@@ -1,31 +1,41 @@
 import asyncio
 import sys
+import time
 from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, Response
 
 try:
-    from sqlalchemy import text
     from app.api.endpoints import auth, users, chats, messages, upload
-    from app.api.endpoints.upload import UPLOADS_DIR
     from app.api.ws import get_router as get_ws_router
-    from app.database import engine
-    from app.models import Base
-    from app.migrate_handle import run_all_migrations
+    from app.database import engine, read_engine, pool_stats, dispose_engines
+    from app.db_migrate import check_indexes, current_revision, ensure_schema, head_revision
+    from app.core.config import settings
+    from app.core.security import password_hasher
+    from app.image_variants import image_pipeline
+    from app.blob_store import blob_collector
+    from app.storage import storage
+    from app.ws_manager import ws_manager
+    from app.ws_broadcast import make_broadcast_backend
+    from app.notifications import chats_notifier, read_receipts
+    from app.membership import membership_cache
+    from app.user_cache import user_cache
+    from app.write_behind import message_queue
+    from app.metrics import MetricsMiddleware, setup_metrics, metrics_response
 except Exception as e:
     print(f"App import failed: {type(e).__name__}: {e}", file=sys.stderr)
     raise
 
 
-async def _wait_for_db(max_attempts: int = 10, delay: float = 2.0):
-    """Ждём, пока БД станет доступна (DNS/сеть в Docker могут подниматься с задержкой)."""
+async def _wait_for_db(max_attempts: int = 10, delay: float = 2.0) -> str | None:
+    """Ждём, пока БД станет доступна (DNS/сеть в Docker могут подниматься с задержкой).
+
+    Пробный запрос — сразу чтение версии схемы из alembic_version, её и возвращаем.
+    """
     for attempt in range(1, max_attempts + 1):
         try:
-            async with engine.begin() as conn:
-                await conn.execute(text("SELECT 1"))
-            return
+            return await current_revision(engine)
         except Exception as e:
             if attempt == max_attempts:
                 raise
@@ -35,12 +45,66 @@ async def _wait_for_db(max_attempts: int = 10, delay: float = 2.0):
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    await _wait_for_db()
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        await run_all_migrations(conn)
+    started = time.perf_counter()
+    revision = await _wait_for_db()
+    db_ready = time.perf_counter()
+    # Схема — только через Alembic (alembic/versions): мигрирует один воркер под advisory-lock,
+    # при актуальной версии шаг пропускается
+    migrated = False
+    if settings.migrate_on_startup:
+        migrated = await ensure_schema(engine, revision)
+    elif revision != head_revision():
+        print(f"Schema version {revision} != head {head_revision()}, run `alembic upgrade head`", file=sys.stderr)
+    if settings.check_indexes_on_startup:
+        await check_indexes(engine)
+    schema_ready = time.perf_counter()
+    ws_manager.configure(settings.ws_send_queue_size, settings.ws_slow_consumer_policy)
+    chats_notifier.window = settings.chats_updated_debounce_ms / 1000
+    read_receipts.window = settings.read_receipts_debounce_ms / 1000
+    membership_cache.maxsize = settings.membership_cache_size
+    membership_cache.ttl = settings.membership_cache_ttl_seconds
+    image_pipeline.configure(storage, settings.image_variant_workers)
+    blob_collector.configure(
+        engine,
+        storage,
+        settings.blob_gc_interval_seconds,
+        settings.blob_gc_grace_hours,
+        settings.blob_gc_batch,
+    )
+    password_hasher.configure(settings.password_hash_workers, settings.password_hash_max_queue, settings.bcrypt_rounds)
+    message_queue.configure(
+        settings.message_write_mode,
+        settings.write_behind_durability,
+        settings.write_behind_max_pending,
+        settings.write_behind_batch_size,
+        settings.write_behind_flush_ms,
+    )
+    engines = {"primary": engine}
+    if read_engine is not engine:
+        engines["replica"] = read_engine
+    setup_metrics(ws_manager, engines)
+    await ws_manager.start(make_broadcast_backend(settings.broadcast_backend, settings.redis_url))
+    await message_queue.start()
+    blob_collector.start()
+    done = time.perf_counter()
+    print(
+        f"Startup {done - started:.3f}s (db {db_ready - started:.3f}s, "
+        f"schema {schema_ready - db_ready:.3f}s{' migrated' if migrated else ''}, "
+        f"services {done - schema_ready:.3f}s)",
+        file=sys.stderr,
+    )
     yield
-    await engine.dispose()
+    # Сначала дописываем очередь сообщений, потом гасим рассылку и пул
+    stopping = time.perf_counter()
+    await blob_collector.stop()
+    await message_queue.drain()
+    await chats_notifier.flush_all()
+    await read_receipts.flush_all()
+    await ws_manager.stop()
+    password_hasher.shutdown()
+    image_pipeline.shutdown()
+    await dispose_engines()
+    print(f"Shutdown {time.perf_counter() - stopping:.3f}s", file=sys.stderr)
 
 
 # Разрешаемые origins для CORS
@@ -82,6 +146,7 @@ app.add_middleware(
     allow_headers=["*"],
     expose_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(auth.router, prefix="/api")
 app.include_router(users.router, prefix="/api")  # /list, /me — до роутера с {user_id}
@@ -89,11 +154,31 @@ app.include_router(users.router_with_id, prefix="/api")
 app.include_router(chats.router, prefix="/api")
 app.include_router(messages.router, prefix="/api")
 app.include_router(upload.router, prefix="/api")
+app.include_router(upload.files_router, prefix="/api")
 app.include_router(get_ws_router(), prefix="/api")
-UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
-app.mount("/api/uploads", StaticFiles(directory=str(UPLOADS_DIR)), name="uploads")
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    return metrics_response()
 
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "service": "chat-api"}
+    return {
+        "status": "ok",
+        "service": "chat-api",
+        "ws": ws_manager.stats(),
+        "chats_updated": chats_notifier.stats(),
+        "read_receipts": read_receipts.stats(),
+        "membership_cache": membership_cache.stats(),
+        "user_cache": user_cache.stats(),
+        "write_behind": message_queue.stats(),
+        "user_search_cache": users.user_search_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "storage": storage.kind,
+        "image_variants": image_pipeline.stats(),
+        "blob_gc": blob_collector.stats(),
+        "db_pool": pool_stats(engine),
+        "db_replica_pool": pool_stats(read_engine) if read_engine is not engine else None,
+    }
@@ -0,0 +1,71 @@
+"""Кэш состава чатов в памяти процесса: chat_id -> {user_id: role}.
+
+Проверки доступа и рассылка по участникам читают отсюда, а не из chat_members.
+Записи живут ttl секунд, всего не больше maxsize чатов (LRU). Эндпоинты, меняющие
+состав, вызывают invalidate() после коммита; через общий бэкенд рассылки
+(BROADCAST_BACKEND=redis) инвалидация доходит и до остальных воркеров.
+"""
+import time
+from collections import OrderedDict
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ChatMember
+from app.ws_manager import ws_manager, ConnectionManager
+
+INVALIDATE_KIND = "membership_invalidate"
+
+
+class MembershipCache:
+    def __init__(self, manager: ConnectionManager, maxsize: int = 10000, ttl: float = 60.0) -> None:
+        self._manager = manager
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[UUID, tuple[float, dict[UUID, str]]] = OrderedDict()
+        # Растёт при каждой инвалидации: загрузка, пересёкшаяся с инвалидацией, не кладётся в кэш
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        manager.on_control(INVALIDATE_KIND, self._on_remote_invalidate)
+
+    async def members(self, db: AsyncSession, chat_id: UUID) -> dict[UUID, str]:
+        entry = self._entries.get(chat_id)
+        now = time.monotonic()
+        if entry and entry[0] > now:
+            self._entries.move_to_end(chat_id)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        generation = self._generation
+        r = await db.execute(select(ChatMember.user_id, ChatMember.role).where(ChatMember.chat_id == chat_id))
+        members = {uid: role or "member" for uid, role in r.all()}
+        # Состав, прочитанный с реплики, может отставать — в кэш не кладём
+        if generation == self._generation and not db.info.get("replica"):
+            self._entries[chat_id] = (now + self.ttl, members)
+            self._entries.move_to_end(chat_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return members
+
+    async def role(self, db: AsyncSession, chat_id: UUID, user_id: UUID) -> str | None:
+        """Роль пользователя в чате или None, если он не участник."""
+        return (await self.members(db, chat_id)).get(user_id)
+
+    def invalidate_local(self, chat_id: UUID) -> None:
+        self._generation += 1
+        self._entries.pop(chat_id, None)
+
+    async def invalidate(self, chat_id: UUID) -> None:
+        self.invalidate_local(chat_id)
+        await self._manager.publish_control(INVALIDATE_KIND, str(chat_id))
+
+    async def _on_remote_invalidate(self, room: str) -> None:
+        self.invalidate_local(UUID(room))
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+membership_cache = MembershipCache(ws_manager)
@@ -0,0 +1,121 @@
+"""Запись нового сообщения одним запросом и общий сериализатор для REST и WebSocket.
+
+Сообщение, все вложения, сводка чата и курсор прочтения отправителя пишутся одним SQL-выражением
+(data-modifying CTE с RETURNING); id и время назначаются в приложении, поэтому
+ответ и WS-payload собираются без повторного SELECT.
+"""
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from uuid import UUID
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.chat_summary import message_created_stmt, sender_read_stmt
+from app.models import Message, Attachment
+from app.schemas.message import AttachmentCreate
+from app.image_variants import variant_urls
+from app.blob_store import blob_sha256
+
+
+def sender_name_of(user) -> str | None:
+    if not user:
+        return None
+    return user.username or getattr(user, "handle", None)
+
+
+def serialize_message(msg, sender_name: str | None = None, attachments=None) -> dict:
+    """JSON-совместимый dict сообщения: payload для WS и вход для MessageResponse."""
+    if attachments is None:
+        attachments = msg.attachments
+    updated_at = getattr(msg, "updated_at", None)
+    return {
+        "id": str(msg.id),
+        "chat_id": str(msg.chat_id),
+        "user_id": str(msg.user_id),
+        "content": msg.content,
+        "type": msg.type,
+        "created_at": msg.created_at.isoformat(),
+        "updated_at": updated_at.isoformat() if updated_at else None,
+        "attachments": [
+            {
+                "id": str(a.id),
+                "url": a.url,
+                "type": a.type,
+                "filename": a.filename,
+                "thumb_url": getattr(a, "thumb_url", None),
+                "medium_url": getattr(a, "medium_url", None),
+            }
+            for a in attachments
+        ],
+        "sender_name": sender_name,
+    }
+
+
+def build_message_rows(
+    chat_id: UUID,
+    user_id: UUID,
+    content: str | None,
+    msg_type: str,
+    attachments: list[AttachmentCreate] | None = None,
+) -> tuple[dict, list[dict]]:
+    """Строки messages/attachments с id и временем, назначенными в приложении."""
+    message_id = uuid.uuid4()
+    now = datetime.now(timezone.utc)
+    message_row = {
+        "id": message_id,
+        "chat_id": chat_id,
+        "user_id": user_id,
+        "content": content,
+        "type": msg_type,
+        "created_at": now,
+        "updated_at": now,
+    }
+    att_rows = [
+        {
+            "id": uuid.uuid4(),
+            "message_id": message_id,
+            "url": a.url,
+            "type": a.type,
+            "filename": a.filename,
+            **variant_urls(a.url),
+            # По blob_sha256 триггер увеличит blobs.ref_count
+            "blob_sha256": blob_sha256(a.url),
+            "created_at": now,
+        }
+        for a in attachments or []
+    ]
+    return message_row, att_rows
+
+
+def serialize_rows(message_row: dict, att_rows: list[dict], sender_name: str | None = None) -> dict:
+    return serialize_message(
+        SimpleNamespace(**message_row), sender_name, [SimpleNamespace(**row) for row in att_rows]
+    )
+
+
+async def insert_message(
+    db: AsyncSession,
+    chat_id: UUID,
+    user_id: UUID,
+    content: str | None,
+    msg_type: str,
+    attachments: list[AttachmentCreate] | None = None,
+    sender_name: str | None = None,
+) -> dict:
+    """INSERT сообщения + вложений + UPDATE сводки чата и read_seq отправителя за один round trip. Коммит — за вызывающим."""
+    message_row, att_rows = build_message_rows(chat_id, user_id, content, msg_type, attachments)
+    messages_t = Message.__table__
+    attachments_t = Attachment.__table__
+    m = insert(messages_t).values(**message_row).returning(messages_t.c.created_at).cte("m")
+    stmt = select(m.c.created_at)
+    if att_rows:
+        stmt = stmt.add_cte(insert(attachments_t).values(att_rows).returning(attachments_t.c.id).cte("a"))
+    summary = message_created_stmt(chat_id, message_row["id"], content, message_row["created_at"], user_id)
+    stmt = stmt.add_cte(summary.returning(summary.table.c.id).cte("s"))
+    sender = sender_read_stmt(chat_id, user_id)
+    stmt = stmt.add_cte(sender.returning(sender.table.c.id).cte("r"))
+    created_at = (await db.execute(stmt)).scalar_one()
+    message_row["created_at"] = message_row["updated_at"] = created_at
+    return serialize_rows(message_row, att_rows, sender_name)
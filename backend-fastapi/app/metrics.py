@@ -0,0 +1,229 @@
+"""Метрики Prometheus (GET /metrics).
+
+Собираются без правок эндпоинтов:
+- MetricsMiddleware — латентность по шаблону маршрута, число и время SQL-запросов
+  за запрос, объём и скорость загрузок (multipart-тела);
+- события SQLAlchemy before/after_cursor_execute — время каждого запроса к БД;
+- WsCollector — при каждом сборе читает состояние ws_manager (соединения, размеры
+  комнат, глубина очередей отправки) и пулов соединений.
+Метрики — на процесс: при нескольких воркерах Prometheus опрашивает каждый.
+"""
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeHistogramMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from starlette.responses import Response
+
+from app.core.config import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROOM_SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 1000)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Время обработки HTTP-запроса", ("method", "route", "status"),
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "SQL-запросов за HTTP-запрос", ("route",),
+    buckets=(0, 1, 2, 3, 4, 6, 8, 12, 16, 32, 64),
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Суммарное время SQL за HTTP-запрос", ("route",), buckets=LATENCY_BUCKETS,
+)
+DB_QUERY_SECONDS = Histogram("db_query_duration_seconds", "Время одного SQL-запроса", buckets=LATENCY_BUCKETS)
+WS_FANOUT_SECONDS = Histogram(
+    "ws_broadcast_fanout_seconds", "Раскладка события по очередям сокетов комнаты", ("kind",),
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5),
+)
+WS_FANOUT_RECIPIENTS = Histogram(
+    "ws_broadcast_recipients", "Получателей одного события в этом процессе", ("kind",), buckets=ROOM_SIZE_BUCKETS,
+)
+PASSWORD_HASH_SECONDS = Histogram(
+    "password_hash_duration_seconds", "Время bcrypt", ("op",), buckets=(0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0),
+)
+PASSWORD_HASH_QUEUE_SECONDS = Histogram(
+    "password_hash_queue_seconds", "Ожидание свободного потока bcrypt", buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+PASSWORD_HASH_PENDING = Gauge("password_hash_pending", "bcrypt-задач в работе и в очереди")
+UPLOAD_BYTES = Histogram(
+    "http_upload_bytes", "Размер multipart-тела запроса", ("route",),
+    buckets=(1e4, 1e5, 1e6, 5e6, 1e7, 5e7, 1e8),
+)
+UPLOAD_THROUGHPUT = Histogram(
+    "http_upload_throughput_bytes_per_second", "Скорость приёма multipart-тела", ("route",),
+    buckets=(1e5, 1e6, 5e6, 1e7, 5e7, 1e8, 5e8),
+)
+
+
+@dataclass
+class RequestStats:
+    """SQL-активность текущего HTTP-запроса."""
+    queries: int = 0
+    db_seconds: float = 0.0
+    # Тексты запросов — только в режиме QUERY_DEBUG (app/query_debug.py)
+    statements: Counter | None = None
+
+
+current_request: ContextVar[RequestStats | None] = ContextVar("current_request", default=None)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: латентность по шаблону маршрута (/api/chats/{chat_id}, а не конкретный id)."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        debug = settings.query_debug
+        stats = RequestStats(statements=Counter() if debug else None)
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+        body_bytes = 0
+        is_upload = b"multipart/form-data" in dict(scope.get("headers") or ()).get(b"content-type", b"")
+
+        async def counting_receive():
+            nonlocal body_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                body_bytes += len(message.get("body", b""))
+            return message
+
+        async def tracking_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if debug:
+                    message = _with_query_headers(message, stats, scope)
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive if is_upload else receive, tracking_send)
+        finally:
+            current_request.reset(token)
+            elapsed = time.perf_counter() - started
+            route = _route_label(scope)
+            HTTP_REQUEST_SECONDS.labels(scope["method"], route, str(status)).observe(elapsed)
+            HTTP_REQUEST_DB_QUERIES.labels(route).observe(stats.queries)
+            HTTP_REQUEST_DB_SECONDS.labels(route).observe(stats.db_seconds)
+            if is_upload and body_bytes:
+                UPLOAD_BYTES.labels(route).observe(body_bytes)
+                UPLOAD_THROUGHPUT.labels(route).observe(body_bytes / max(elapsed, 1e-6))
+
+
+def _with_query_headers(message: dict, stats: RequestStats, scope) -> dict:
+    from app.query_debug import report
+
+    problems = report(stats, scope["method"], _route_label(scope), settings.query_repeat_threshold)
+    headers = list(message.get("headers", ()))
+    headers.append((b"x-query-count", str(stats.queries).encode()))
+    if problems:
+        headers.append((b"x-query-warnings", "; ".join(problems).encode("latin-1", "replace")))
+    return {**message, "headers": headers}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    elapsed = time.perf_counter() - conn.info["query_started"].pop()
+    DB_QUERY_SECONDS.observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if stats.statements is not None:
+            stats.statements[statement] += 1
+
+
+def _handle_error(exception_context) -> None:
+    conn = exception_context.connection
+    if conn is not None and conn.info.get("query_started"):
+        conn.info["query_started"].pop()
+
+
+def instrument_engine(engine) -> None:
+    """Повесить замер SQL на движок (AsyncEngine или Engine); повторный вызов безопасен."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    if event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+class WsCollector:
+    """Состояние WebSocket и пулов БД — снимается в момент сбора метрик."""
+
+    def __init__(self, manager, engines: dict) -> None:
+        self._manager = manager
+        self._engines = engines
+
+    def collect(self):
+        from app.database import pool_stats
+
+        stats = self._manager.stats()
+        yield GaugeMetricFamily("ws_connections", "Открытые WebSocket-соединения", value=stats["connections"])
+        rooms = stats["chat_rooms"]
+        yield GaugeMetricFamily("ws_chat_rooms", "Комнаты чатов с подписчиками", value=len(rooms))
+        buckets, cumulative = [], 0
+        sizes = sorted(rooms.values())
+        i = 0
+        for bound in ROOM_SIZE_BUCKETS:
+            while i < len(sizes) and sizes[i] <= bound:
+                cumulative += 1
+                i += 1
+            buckets.append((str(bound), cumulative))
+        buckets.append(("+Inf", len(sizes)))
+        yield GaugeHistogramMetricFamily(
+            "ws_chat_room_size", "Распределение числа сокетов по комнатам", buckets=buckets, gsum_value=sum(sizes),
+        )
+        yield GaugeMetricFamily("ws_send_queue_depth", "Сообщений в очередях отправки (всего)", value=stats["queued"])
+        yield GaugeMetricFamily("ws_send_queue_depth_max", "Самая длинная очередь отправки", value=stats["max_queue_depth"])
+        yield CounterMetricFamily("ws_messages_sent", "Отправлено сообщений в сокеты", value=stats["sent"])
+        dropped = CounterMetricFamily("ws_messages_dropped", "Отброшено сообщений", labels=("reason",))
+        for reason, count in stats["dropped"].items():
+            dropped.add_metric((reason,), count)
+        yield dropped
+
+        in_use = GaugeMetricFamily("db_pool_checked_out", "Выданные соединения пула", labels=("pool",))
+        waits = CounterMetricFamily("db_pool_waits", "Ожидания свободного соединения", labels=("pool",))
+        wait_max = GaugeMetricFamily("db_pool_wait_seconds_max", "Максимальное ожидание соединения", labels=("pool",))
+        timeouts = CounterMetricFamily("db_pool_timeouts", "Таймауты ожидания соединения", labels=("pool",))
+        for name, engine in self._engines.items():
+            ps = pool_stats(engine)
+            in_use.add_metric((name,), ps["checked_out"])
+            waits.add_metric((name,), ps["waits"])
+            wait_max.add_metric((name,), ps["wait_ms_max"] / 1000)
+            timeouts.add_metric((name,), ps["timeouts"])
+        yield from (in_use, waits, wait_max, timeouts)
+
+
+_collector: WsCollector | None = None
+
+
+def setup_metrics(manager, engines: dict) -> None:
+    """Подключить замер SQL к движкам и коллектор состояния (один раз на процесс)."""
+    global _collector
+    for engine in engines.values():
+        instrument_engine(engine)
+    if _collector is None:
+        _collector = WsCollector(manager, engines)
+        REGISTRY.register(_collector)
+
+
+def metrics_response() -> Response:
+    return Response(generate_latest(REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -2,5 +2,6 @@ from app.models.base import Base
 from app.models.user import User
 from app.models.chat import Chat, ChatMember
 from app.models.message import Message, Attachment
+from app.models.blob import Blob
 
-__all__ = ["Base", "User", "Chat", "ChatMember", "Message", "Attachment"]
+__all__ = ["Base", "User", "Chat", "ChatMember", "Message", "Attachment", "Blob"]
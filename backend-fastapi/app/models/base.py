@@ -1,5 +1,10 @@
+from sqlalchemy import DDL, event
 from sqlalchemy.orm import DeclarativeBase
 
 
 class Base(DeclarativeBase):
     pass
+
+
+# Триграммные GIN-индексы требуют pg_trgm, если схема создаётся через create_all (тесты, скрипты), а не Alembic
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
@@ -0,0 +1,66 @@
+from sqlalchemy import BigInteger, Column, DDL, DateTime, Index, Integer, String, event, text
+from datetime import datetime
+
+from app.models.base import Base
+from app.models.message import Attachment
+
+
+class Blob(Base):
+    """Загруженный файл, адресуемый SHA-256 содержимого (app/blob_store.py)."""
+    __tablename__ = "blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    # Путь относительно каталога загрузок: blobs/ab/<sha256><ext>
+    path = Column(String(255), nullable=False)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String(100), nullable=True)
+    # Число вложений со ссылкой на блоб; ведут триггеры на attachments
+    ref_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    # Повторная загрузка того же содержимого продлевает отсрочку сборки мусора
+    last_uploaded_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+
+    __table_args__ = (
+        # Кандидаты на сборку мусора: WHERE ref_count <= 0 AND last_uploaded_at < ?
+        Index("idx_blobs_orphans", "last_uploaded_at", postgresql_where=text("ref_count <= 0")),
+    )
+
+
+# Счётчик ссылок — триггерами уровня оператора: учитываются и многострочные INSERT
+# (write-behind), и каскадные удаления сообщений и чатов. Тот же SQL — в миграции 0006 и init.sql
+BLOB_REFCOUNT_DDL = (
+    """
+    CREATE OR REPLACE FUNCTION blobs_ref_add() RETURNS TRIGGER AS $$
+    BEGIN
+        UPDATE blobs b SET ref_count = b.ref_count + n.cnt
+        FROM (SELECT blob_sha256, count(*) AS cnt FROM new_rows WHERE blob_sha256 IS NOT NULL GROUP BY blob_sha256) n
+        WHERE b.sha256 = n.blob_sha256;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE OR REPLACE FUNCTION blobs_ref_remove() RETURNS TRIGGER AS $$
+    BEGIN
+        UPDATE blobs b SET ref_count = b.ref_count - o.cnt
+        FROM (SELECT blob_sha256, count(*) AS cnt FROM old_rows WHERE blob_sha256 IS NOT NULL GROUP BY blob_sha256) o
+        WHERE b.sha256 = o.blob_sha256;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS attachments_blob_ref_add ON attachments",
+    """
+    CREATE TRIGGER attachments_blob_ref_add AFTER INSERT ON attachments
+        REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION blobs_ref_add()
+    """,
+    "DROP TRIGGER IF EXISTS attachments_blob_ref_remove ON attachments",
+    """
+    CREATE TRIGGER attachments_blob_ref_remove AFTER DELETE ON attachments
+        REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION blobs_ref_remove()
+    """,
+)
+
+# Для схем от create_all (тесты, скрипты)
+for _statement in BLOB_REFCOUNT_DDL:
+    event.listen(Attachment.__table__, "after_create", DDL(_statement))
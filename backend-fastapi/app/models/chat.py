@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey
+from sqlalchemy import Column, String, DateTime, ForeignKey, Integer, BigInteger, Index, UniqueConstraint, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.models.base import Base
@@ -14,6 +14,19 @@ class Chat(Base):
     name = Column(String(255), nullable=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Денормализованная сводка для списка чатов — обновляется в той же транзакции, что и запись сообщения (app/chat_summary.py)
+    last_message_id = Column(UUID(as_uuid=True), nullable=True)
+    last_message_preview = Column(String(255), nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    last_message_user_id = Column(UUID(as_uuid=True), nullable=True)
+    members_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Сколько сообщений записано в чат за всё время; непрочитанные участника = message_seq - ChatMember.read_seq
+    message_seq = Column(BigInteger, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        # Порядок списка чатов: последняя активность (у пустого чата — время создания), затем id
+        Index("idx_chats_activity", func.coalesce(last_message_at, created_at).desc(), id),
+    )
 
     members = relationship("ChatMember", back_populates="chat", cascade="all, delete-orphan")
     messages = relationship("Message", back_populates="chat", cascade="all, delete-orphan")
@@ -27,6 +40,16 @@ class ChatMember(Base):
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     role = Column(String(20), default="member")  # admin | member
     joined_at = Column(DateTime(timezone=True), default=datetime.utcnow)
+    # Курсор прочтения (app/read_state.py); read_seq — Chat.message_seq на момент прочтения
+    last_read_message_id = Column(UUID(as_uuid=True), nullable=True)
+    last_read_at = Column(DateTime(timezone=True), nullable=True)
+    read_seq = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     chat = relationship("Chat", back_populates="members")
     user = relationship("User", back_populates="chat_memberships")
+
+    __table_args__ = (
+        # Покрывает и поиск по chat_id (состав чата, проверки доступа)
+        UniqueConstraint("chat_id", "user_id", name="uq_chat_members_chat_user"),
+        Index("idx_chat_members_user", "user_id"),
+    )
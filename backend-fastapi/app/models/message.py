@@ -1,10 +1,13 @@
-from sqlalchemy import Column, String, Text, DateTime, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index, Computed
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from app.models.base import Base
 import uuid
 from datetime import datetime
 
+# Конфигурация полнотекстового поиска (та же, что в infrastructure/postgres/init.sql)
+FTS_CONFIG = "russian"
+
 
 class Message(Base):
     __tablename__ = "messages"
@@ -16,11 +19,28 @@ class Message(Base):
     type = Column(String(20), default="text")  # text | image | file
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
     updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Хранимый tsvector для поиска; deferred — история сообщений его не грузит
+    content_tsv = deferred(
+        Column(TSVECTOR, Computed(f"to_tsvector('{FTS_CONFIG}', coalesce(content, ''))", persisted=True))
+    )
 
     chat = relationship("Chat", back_populates="messages")
     user = relationship("User", back_populates="messages")
     attachments = relationship("Attachment", back_populates="message", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset-пагинация истории: WHERE chat_id = ? AND (created_at, id) < (?, ?)
+        Index("idx_messages_chat_created_id", "chat_id", created_at.desc(), id.desc()),
+        Index("idx_messages_content_tsv", "content_tsv", postgresql_using="gin"),
+        # Триграммы — для коротких и частичных запросов (ILIKE '%...%'); нужен pg_trgm, см. models/base.py
+        Index(
+            "idx_messages_content_trgm",
+            "content",
+            postgresql_using="gin",
+            postgresql_ops={"content": "gin_trgm_ops"},
+        ),
+    )
+
 
 class Attachment(Base):
     __tablename__ = "attachments"
@@ -30,6 +50,15 @@ class Attachment(Base):
     url = Column(String(500), nullable=False)
     type = Column(String(50), nullable=True)
     filename = Column(String(255), nullable=True)
+    # Уменьшенные WebP-копии картинок (app/image_variants.py); для прочих файлов — NULL
+    thumb_url = Column(String(500), nullable=True)
+    medium_url = Column(String(500), nullable=True)
+    # Блоб загруженного к нам файла (app/blob_store.py); без FK — ссылки ведёт счётчик blobs.ref_count
+    blob_sha256 = Column(String(64), nullable=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow)
 
     message = relationship("Message", back_populates="attachments")
+
+    __table_args__ = (
+        Index("idx_attachments_message", "message_id"),
+    )
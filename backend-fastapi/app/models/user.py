@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from app.models.base import Base
@@ -21,3 +21,15 @@ class User(Base):
 
     chat_memberships = relationship("ChatMember", back_populates="user")
     messages = relationship("Message", back_populates="user")
+
+    __table_args__ = (
+        # Поиск людей (/users/list): префикс handle — btree с pattern_ops, подстрока/опечатки — триграммы
+        Index("idx_users_handle_prefix", "handle", postgresql_ops={"handle": "varchar_pattern_ops"}),
+        Index("idx_users_handle_trgm", "handle", postgresql_using="gin", postgresql_ops={"handle": "gin_trgm_ops"}),
+        Index(
+            "idx_users_username_trgm",
+            "username",
+            postgresql_using="gin",
+            postgresql_ops={"username": "gin_trgm_ops"},
+        ),
+    )
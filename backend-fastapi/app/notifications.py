@@ -0,0 +1,161 @@
+"""Агрегаторы событий chats_updated и read_receipts.
+
+Вместо отдельного {"type": "chats_updated"} на каждое сообщение каждому участнику
+события копятся по пользователю в окне debounce и уходят одним сообщением с дельтой:
+{"type": "chats_updated", "chats": [{"chat_id": ..., "last_message": {...} | null, "new_messages": n}]}.
+Клиент обновляет только перечисленные чаты и не перезапрашивает весь список;
+new_messages — сколько чужих сообщений пришло за окно (прибавляется к unread_count).
+
+Сдвиги курсоров прочтения копятся по чату: в комнату чата уходит одно
+{"type": "read_receipts", "chat_id": ..., "receipts": [...]} на окно, а другим
+устройствам читателя — {"type": "chat_read", ...} с новым счётчиком непрочитанных.
+"""
+import asyncio
+import logging
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.chat_summary import last_message_dict
+from app.models import Chat
+from app.membership import membership_cache
+from app.ws_manager import ws_manager, ConnectionManager
+
+logger = logging.getLogger(__name__)
+
+
+class ChatsUpdatedAggregator:
+    def __init__(self, manager: ConnectionManager, window: float = 0.15) -> None:
+        self._manager = manager
+        self.window = window
+        # user_id -> chat_id -> дельта; последняя запись по чату побеждает
+        self._pending: dict[str, dict[str, dict]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        # Запущенные рассылки: ссылка держит задачу до завершения (иначе её может собрать GC)
+        self._background: set[asyncio.Task] = set()
+        self.flushed = 0
+        self.coalesced = 0
+
+    def notify(self, user_ids, chat_id: str, last_message: dict | None, sender_id: str | None = None) -> None:
+        """sender_id — для нового сообщения: остальным участникам оно добавляется в new_messages."""
+        loop = asyncio.get_running_loop()
+        for uid in user_ids:
+            uid = str(uid)
+            chats = self._pending.setdefault(uid, {})
+            prev = chats.get(chat_id)
+            if prev is not None:
+                self.coalesced += 1
+            new_messages = prev["new_messages"] if prev else 0
+            if sender_id is not None and uid != sender_id:
+                new_messages += 1
+            chats[chat_id] = {"chat_id": chat_id, "last_message": last_message, "new_messages": new_messages}
+            if uid not in self._timers:
+                self._timers[uid] = loop.call_later(self.window, self._schedule_flush, uid)
+
+    def _schedule_flush(self, user_id: str) -> None:
+        task = asyncio.create_task(self._flush_user(user_id))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _flush_user(self, user_id: str) -> None:
+        self._timers.pop(user_id, None)
+        chats = self._pending.pop(user_id, None)
+        if not chats:
+            return
+        self.flushed += 1
+        try:
+            await self._manager.broadcast_to_user(user_id, {"type": "chats_updated", "chats": list(chats.values())})
+        except Exception as e:
+            logger.warning("chats_updated flush failed: %s", e)
+
+    async def flush_all(self) -> None:
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        for uid in list(self._pending):
+            await self._flush_user(uid)
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"pending_users": len(self._pending), "flushed": self.flushed, "coalesced": self.coalesced}
+
+
+class ReadReceiptsAggregator:
+    def __init__(self, manager: ConnectionManager, window: float = 0.5) -> None:
+        self._manager = manager
+        self.window = window
+        # chat_id -> user_id -> состояние прочтения; последний сдвиг курсора побеждает
+        self._pending: dict[str, dict[str, dict]] = {}
+        self._timers: dict[str, asyncio.TimerHandle] = {}
+        # Запущенные рассылки: ссылка держит задачу до завершения (иначе её может собрать GC)
+        self._background: set[asyncio.Task] = set()
+        self.flushed = 0
+        self.coalesced = 0
+
+    def notify(self, chat_id: str, user_id: str, state: dict) -> None:
+        readers = self._pending.setdefault(chat_id, {})
+        if user_id in readers:
+            self.coalesced += 1
+        readers[user_id] = state
+        if chat_id not in self._timers:
+            self._timers[chat_id] = asyncio.get_running_loop().call_later(self.window, self._schedule_flush, chat_id)
+
+    def _schedule_flush(self, chat_id: str) -> None:
+        task = asyncio.create_task(self._flush_chat(chat_id))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _flush_chat(self, chat_id: str) -> None:
+        self._timers.pop(chat_id, None)
+        readers = self._pending.pop(chat_id, None)
+        if not readers:
+            return
+        self.flushed += 1
+        receipts = [
+            {"user_id": uid, "last_read_message_id": s["last_read_message_id"], "last_read_at": s["last_read_at"]}
+            for uid, s in readers.items()
+        ]
+        try:
+            await self._manager.broadcast_to_chat(
+                chat_id, {"type": "read_receipts", "chat_id": chat_id, "receipts": receipts}
+            )
+            for uid, state in readers.items():
+                await self._manager.broadcast_to_user(uid, {"type": "chat_read", **state})
+        except Exception as e:
+            logger.warning("read_receipts flush failed: %s", e)
+
+    async def flush_all(self) -> None:
+        for handle in self._timers.values():
+            handle.cancel()
+        self._timers.clear()
+        for chat_id in list(self._pending):
+            await self._flush_chat(chat_id)
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {"pending_chats": len(self._pending), "flushed": self.flushed, "coalesced": self.coalesced}
+
+
+chats_notifier = ChatsUpdatedAggregator(ws_manager)
+read_receipts = ReadReceiptsAggregator(ws_manager)
+
+
+async def notify_chat_members(
+    db: AsyncSession, chat_id: UUID, last_message: dict | None = None, sender_id: UUID | None = None
+) -> None:
+    """Участники — из кэша состава; сводка чата — из last_message, если он известен вызывающему
+    (новое сообщение, тогда же передаётся sender_id), иначе одним чтением по первичному ключу.
+    Дельта ставится в агрегатор."""
+    members = await membership_cache.members(db, chat_id)
+    if not members:
+        return
+    if last_message is None:
+        r = await db.execute(
+            select(Chat.last_message_id, Chat.last_message_preview, Chat.last_message_at).where(Chat.id == chat_id)
+        )
+        summary = r.first()
+        last_message = last_message_dict(summary) if summary else None
+    chats_notifier.notify(members.keys(), str(chat_id), last_message, str(sender_id) if sender_id else None)
@@ -0,0 +1,73 @@
+"""Поиск N+1 и бюджет SQL-запросов на эндпоинт (QUERY_DEBUG=true, только для разработки и тестов).
+
+MetricsMiddleware уже считает запросы текущего HTTP-запроса (app.metrics.RequestStats);
+в режиме отладки он дополнительно запоминает тексты запросов и сводит их в «формы» —
+SQL с параметрами, свёрнутыми в «?». Одна и та же форма QUERY_REPEAT_THRESHOLD раз и
+больше — признак N+1 (запрос в цикле по элементам): пишется в лог и в заголовок
+X-Query-Warnings. Превышение бюджета из QUERY_BUDGETS — туда же. Число запросов
+отдаётся в X-Query-Count, по нему тесты проверяют бюджет через HTTP-клиент;
+вне HTTP — контекстный менеджер count_queries().
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import contextmanager
+
+from app.metrics import RequestStats, current_request
+
+logger = logging.getLogger(__name__)
+
+# (метод, шаблон маршрута) -> максимум SQL-запросов при холодных кэшах
+QUERY_BUDGETS: dict[tuple[str, str], int] = {
+    ("GET", "/api/chats"): 4,
+    ("POST", "/api/chats"): 6,
+    ("GET", "/api/chats/{chat_id}"): 4,
+    ("GET", "/api/messages/chat/{chat_id}"): 7,
+    ("POST", "/api/messages/chat/{chat_id}"): 4,
+    ("GET", "/api/messages/search"): 8,
+    ("GET", "/api/users/list"): 3,
+}
+
+_PARAMS = re.compile(r"\$\d+|%\(\w+\)s|\?")
+_PARAM_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+_SPACES = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """SQL без значений: IN ($1, $2, ...) и IN ($1) дают одну форму."""
+    shape = _PARAMS.sub("?", statement)
+    shape = _PARAM_LISTS.sub("?", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+
+def find_problems(stats: RequestStats, method: str, route: str, repeat_threshold: int) -> list[str]:
+    problems = []
+    budget = QUERY_BUDGETS.get((method, route))
+    if budget is not None and stats.queries > budget:
+        problems.append(f"budget {stats.queries}/{budget}")
+    shapes: Counter[str] = Counter()
+    for statement, count in (stats.statements or {}).items():
+        shapes[statement_shape(statement)] += count
+    for shape, count in shapes.most_common():
+        if count < repeat_threshold:
+            break
+        problems.append(f"repeated x{count}: {shape[:120]}")
+    return problems
+
+
+def report(stats: RequestStats, method: str, route: str, repeat_threshold: int) -> list[str]:
+    problems = find_problems(stats, method, route, repeat_threshold)
+    for problem in problems:
+        logger.warning("%s %s: %s", method, route, problem)
+    return problems
+
+
+@contextmanager
+def count_queries():
+    """Считать SQL-запросы в блоке (тот же asyncio-контекст): with count_queries() as q: ...; q.queries."""
+    stats = RequestStats(statements=Counter())
+    token = current_request.set(stats)
+    try:
+        yield stats
+    finally:
+        current_request.reset(token)
@@ -0,0 +1,108 @@
+"""Курсоры прочтения и счётчики непрочитанных.
+
+Число непрочитанных не считается через COUNT(*) по messages: у чата есть счётчик
+записанных сообщений chats.message_seq (растёт в том же UPDATE, что и сводка,
+app/chat_summary.py), у участника — read_seq, значение этого счётчика на момент
+прочтения. Непрочитанные = message_seq - read_seq; список чатов получает их из
+уже присоединённой строки chat_members. Свои сообщения сдвигают read_seq
+отправителя вместе с message_seq.
+
+mark_read сдвигает курсор (только вперёд) и пересчитывает read_seq по хвосту
+после курсора (чужие сообщения; свои и так учтены в read_seq) — не дальше
+UNREAD_SCAN_LIMIT строк по индексу (chat_id, created_at, id).
+Удалённые непрочитанные сообщения из счётчика уходят при следующем mark_read.
+"""
+from uuid import UUID
+
+from sqlalchemy import func, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Chat, ChatMember, Message
+
+# Дальше хвост не считаем: клиент показывает «999+»
+UNREAD_SCAN_LIMIT = 1000
+
+
+def unread_count(message_seq: int, read_seq: int) -> int:
+    return max(message_seq - read_seq, 0)
+
+
+def read_state_dict(chat_id, last_read_message_id, last_read_at, unread: int) -> dict:
+    """Состояние прочтения в формате ReadStateResponse и WS-события chat_read."""
+    return {
+        "chat_id": str(chat_id),
+        "last_read_message_id": str(last_read_message_id) if last_read_message_id else None,
+        "last_read_at": last_read_at.isoformat() if last_read_at else None,
+        "unread_count": unread,
+    }
+
+
+async def mark_read(
+    db: AsyncSession, chat_id: UUID, user_id: UUID, message_id: UUID | None = None
+) -> tuple[dict, bool] | None:
+    """Сдвинуть курсор участника до message_id (без него — до последнего сообщения чата).
+
+    Возвращает (состояние, сдвинулся ли курсор) или None, если пользователь не участник.
+    message_id не из этого чата (или ещё в очереди write-behind) — курсор не сдвигается.
+    Коммит — за вызывающим.
+    """
+    r = await db.execute(
+        select(
+            Chat.message_seq,
+            Chat.last_message_id,
+            Chat.last_message_at,
+            ChatMember.read_seq,
+            ChatMember.last_read_message_id,
+            ChatMember.last_read_at,
+        )
+        .join(ChatMember, (ChatMember.chat_id == Chat.id) & (ChatMember.user_id == user_id))
+        .where(Chat.id == chat_id)
+    )
+    row = r.first()
+    if row is None:
+        return None
+    current = read_state_dict(
+        chat_id, row.last_read_message_id, row.last_read_at, unread_count(row.message_seq, row.read_seq)
+    )
+    target_id, target_at, tail = row.last_message_id, row.last_message_at, 0
+    if message_id is not None and message_id != row.last_message_id:
+        created_at = await db.scalar(
+            select(Message.created_at).where(Message.id == message_id, Message.chat_id == chat_id)
+        )
+        if created_at is None:
+            return current, False
+        target_id, target_at = message_id, created_at
+        after = (
+            select(Message.id)
+            .where(
+                Message.chat_id == chat_id,
+                Message.user_id != user_id,
+                tuple_(Message.created_at, Message.id) > tuple_(created_at, message_id),
+            )
+            .limit(UNREAD_SCAN_LIMIT)
+            .subquery()
+        )
+        tail = await db.scalar(select(func.count()).select_from(after))
+    if target_id is None or (row.last_read_at is not None and target_at <= row.last_read_at):
+        return current, False
+    members_t = ChatMember.__table__
+    # message_seq — из уже прочитанной строки: сообщения, записанные после неё, остаются непрочитанными;
+    # greatest — не откатывает read_seq, выросший за это время от своих сообщений;
+    # условие по last_read_at — параллельный mark_read дальше по истории не откатывается
+    read_seq = await db.scalar(
+        update(members_t)
+        .where(
+            members_t.c.chat_id == chat_id,
+            members_t.c.user_id == user_id,
+            or_(members_t.c.last_read_at.is_(None), members_t.c.last_read_at < target_at),
+        )
+        .values(
+            last_read_message_id=target_id,
+            last_read_at=target_at,
+            read_seq=func.greatest(members_t.c.read_seq, row.message_seq - tail),
+        )
+        .returning(members_t.c.read_seq)
+    )
+    if read_seq is None:
+        return current, False
+    return read_state_dict(chat_id, target_id, target_at, unread_count(row.message_seq, read_seq)), True
@@ -47,6 +47,21 @@ class ChatResponse(BaseModel):
     members_count: int | None = None
     current_user_role: str | None = None  # admin | member — роль текущего пользователя
     last_message: dict | None = None
+    unread_count: int = 0
+    last_read_message_id: UUID | None = None
+    # Только в GET /chats/{id}: докуда дочитали остальные участники (для отметок «прочитано»)
+    peers_last_read_at: datetime | None = None
 
     class Config:
         from_attributes = True
+
+
+class MarkReadRequest(BaseModel):
+    message_id: UUID | None = None  # по умолчанию — до последнего сообщения чата
+
+
+class ReadStateResponse(BaseModel):
+    chat_id: UUID
+    last_read_message_id: UUID | None
+    last_read_at: datetime | None
+    unread_count: int
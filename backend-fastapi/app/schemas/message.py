@@ -27,6 +27,8 @@ class AttachmentResponse(BaseModel):
     url: str
     type: str | None
     filename: str | None
+    thumb_url: str | None = None  # WebP до 320px — для списков и превью
+    medium_url: str | None = None  # WebP до 1280px — для показа в ленте
 
     class Config:
         from_attributes = True
@@ -45,3 +47,8 @@ class MessageResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class MessageSearchResult(MessageResponse):
+    snippet: str | None = None  # HTML: текст экранирован, совпадения в <mark>…</mark>
+    rank: float | None = None  # релевантность (только для полнотекстового режима)
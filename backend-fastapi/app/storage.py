@@ -0,0 +1,357 @@
+"""Хранилище загруженных файлов: локальный диск или S3-совместимое (MinIO, AWS S3 и т. п.).
+
+Ключи — пути вида blobs/ab/<sha256>.jpg и variants/<sha256>_thumb.webp. В базе и в
+ответах API у файла постоянный URL /api/uploads/<token>/<key> (токен загрузки,
+app/blob_store.py): локально файл отдаёт API (app/file_serving.py), для S3 —
+редирект на публичный адрес бакета (S3_PUBLIC_URL) или на presigned GET. Ключи
+блобов выводятся из содержимого, поэтому бакет с публичным чтением их не скрывает —
+для S3 лучше приватный бакет и presigned GET.
+
+Прямая загрузка (POST /api/upload/presign): клиент получает presigned PUT и кладёт
+байты сам — во временный ключ incoming/<nonce>; в blobs/ их переносит
+POST /api/upload/complete (app/blob_store.py). Для S3 это URL бакета — хранилище проверяет длину и SHA-256
+(x-amz-checksum-sha256), воркер API байтов не видит. Для локального диска — URL
+PUT /api/upload/direct/<key>, подписанный HMAC: тот же протокол для клиента, хэш
+проверяется при приёме. Перед переносом complete ещё раз сверяет объект (verify):
+не все S3-совместимые хранилища проверяют и сохраняют x-amz-checksum-sha256.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote, urlencode
+
+from app.core.config import settings
+
+DEFAULT_UPLOAD_DIR = Path(__file__).resolve().parent.parent / "uploads"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+UPLOADS_URL_PREFIX = "/api/uploads/"
+# Прямые загрузки до POST /api/upload/complete
+INCOMING_DIR = "incoming"
+
+
+class Storage:
+    kind = ""
+    # Каталог временных файлов приёма загрузок
+    temp_dir: Path
+    # url() не истекает — редирект на него можно кэшировать навсегда
+    stable_urls = True
+
+    def local_path(self, key: str) -> Path | None:
+        """Путь на диске, если файлы лежат локально (тогда их отдаёт StaticFiles / FileResponse)."""
+        return None
+
+    def url(self, key: str) -> str:
+        raise NotImplementedError
+
+    def download_url(self, key: str, filename: str) -> str:
+        """URL скачивания с Content-Disposition: attachment (для хранилищ без local_path)."""
+        raise NotImplementedError
+
+    def presign_upload(self, key: str, content_type: str, size: int, sha256: str) -> dict:
+        """{"method", "url", "headers"} для прямой загрузки файла клиентом."""
+        raise NotImplementedError
+
+    async def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    async def put_file(self, key: str, source: Path, content_type: str | None) -> None:
+        """Положить файл под key; source после вызова может отсутствовать (перемещён)."""
+        raise NotImplementedError
+
+    async def fetch(self, key: str, target: Path) -> bool:
+        """Скачать объект в локальный файл; False, если его нет."""
+        raise NotImplementedError
+
+    async def move(self, source_key: str, key: str, content_type: str | None) -> None:
+        """Перенести объект source_key под key (прямая загрузка -> блоб)."""
+        raise NotImplementedError
+
+    async def verify(self, key: str, size: int, sha256: str) -> bool:
+        """Объект key есть и совпадает с заявленными размером и SHA-256."""
+        raise NotImplementedError
+
+    async def delete(self, keys: list[str]) -> None:
+        raise NotImplementedError
+
+    async def purge_incoming(self, older_than: datetime) -> int:
+        """Удалить брошенные прямые загрузки (без complete) старше older_than; вернуть их число."""
+        raise NotImplementedError
+
+
+class LocalStorage(Storage):
+    kind = "local"
+
+    def __init__(self, root: Path, secret: str, presign_ttl: int = 900) -> None:
+        self.root = root
+        self.temp_dir = root
+        self._secret = secret.encode()
+        self.presign_ttl = presign_ttl
+        root.mkdir(parents=True, exist_ok=True)
+
+    def local_path(self, key: str) -> Path:
+        return self.root / key
+
+    def url(self, key: str) -> str:
+        return UPLOADS_URL_PREFIX + key
+
+    def _signature(self, key: str, size: int, sha256: str, expires: int) -> str:
+        message = f"{key}\n{size}\n{sha256}\n{expires}".encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def presign_upload(self, key: str, content_type: str, size: int, sha256: str) -> dict:
+        expires = int(time.time()) + self.presign_ttl
+        query = urlencode({
+            "size": size, "sha256": sha256, "expires": expires,
+            "sig": self._signature(key, size, sha256, expires),
+        })
+        return {
+            "method": "PUT",
+            "url": f"/api/upload/direct/{quote(key)}?{query}",
+            "headers": {"Content-Type": content_type},
+        }
+
+    def verify_upload(self, key: str, size: int, sha256: str, expires: int, sig: str) -> bool:
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(sig, self._signature(key, size, sha256, expires))
+
+    async def exists(self, key: str) -> bool:
+        return (self.root / key).is_file()
+
+    async def put_file(self, key: str, source: Path, content_type: str | None) -> None:
+        def place() -> None:
+            target = self.root / key
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(source, target)
+
+        await asyncio.to_thread(place)
+
+    async def fetch(self, key: str, target: Path) -> bool:
+        return False  # файлы уже на диске: local_path
+
+    async def move(self, source_key: str, key: str, content_type: str | None) -> None:
+        await self.put_file(key, self.root / source_key, content_type)
+
+    async def verify(self, key: str, size: int, sha256: str) -> bool:
+        # Хэш сверил direct_upload при приёме — в incoming/ другой записи нет
+        try:
+            return (self.root / key).stat().st_size == size
+        except FileNotFoundError:
+            return False
+
+    async def delete(self, keys: list[str]) -> None:
+        def remove() -> None:
+            for key in keys:
+                try:
+                    (self.root / key).unlink()
+                except FileNotFoundError:
+                    pass
+
+        await asyncio.to_thread(remove)
+
+    async def purge_incoming(self, older_than: datetime) -> int:
+        def purge() -> int:
+            directory = self.root / INCOMING_DIR
+            if not directory.is_dir():
+                return 0
+            removed = 0
+            for path in directory.iterdir():
+                try:
+                    if path.stat().st_mtime < older_than.timestamp():
+                        path.unlink()
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+            return removed
+
+        return await asyncio.to_thread(purge)
+
+
+class S3Storage(Storage):
+    """S3-совместимый бакет через boto3 (вызовы — в пуле потоков).
+
+    client / presign_client можно передать снаружи (например, клиент к MinIO или moto в тестах).
+    """
+    kind = "s3"
+
+    def __init__(
+        self,
+        bucket: str,
+        endpoint_url: str = "",
+        presign_endpoint_url: str = "",
+        region: str = "us-east-1",
+        access_key: str = "",
+        secret_key: str = "",
+        public_url: str = "",
+        presign_ttl: int = 900,
+        temp_dir: Path | None = None,
+        client=None,
+        presign_client=None,
+    ) -> None:
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/")
+        self.stable_urls = bool(self.public_url)
+        self.presign_ttl = presign_ttl
+        self.temp_dir = temp_dir or DEFAULT_UPLOAD_DIR / ".tmp"
+        self.temp_dir.mkdir(parents=True, exist_ok=True)
+        if client is None:
+            client = self._make_client(endpoint_url, region, access_key, secret_key)
+        self._client = client
+        # Адрес бакета снаружи может отличаться от адреса внутри сети (http://minio:9000)
+        if presign_client is None and presign_endpoint_url and presign_endpoint_url != endpoint_url:
+            presign_client = self._make_client(presign_endpoint_url, region, access_key, secret_key)
+        self._presign_client = presign_client or client
+
+    @staticmethod
+    def _make_client(endpoint_url: str, region: str, access_key: str, secret_key: str):
+        import boto3
+        from botocore.config import Config
+
+        return boto3.client(
+            "s3",
+            endpoint_url=endpoint_url or None,
+            region_name=region,
+            aws_access_key_id=access_key or None,
+            aws_secret_access_key=secret_key or None,
+            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+        )
+
+    def _presign(self, method: str, params: dict) -> str:
+        return self._presign_client.generate_presigned_url(
+            method, Params={"Bucket": self.bucket, **params}, ExpiresIn=self.presign_ttl
+        )
+
+    def url(self, key: str) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{quote(key)}"
+        return self._presign("get_object", {"Key": key})
+
+    def download_url(self, key: str, filename: str) -> str:
+        return self._presign("get_object", {
+            "Key": key,
+            "ResponseContentType": "application/octet-stream",
+            "ResponseContentDisposition": f"attachment; filename*=UTF-8''{quote(filename)}",
+        })
+
+    def presign_upload(self, key: str, content_type: str, size: int, sha256: str) -> dict:
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode()
+        url = self._presign("put_object", {
+            "Key": key,
+            "ContentType": content_type,
+            "ContentLength": size,
+            "ChecksumSHA256": checksum,
+            "CacheControl": IMMUTABLE_CACHE_CONTROL,
+        })
+        return {
+            "method": "PUT",
+            "url": url,
+            "headers": {
+                "Content-Type": content_type,
+                "x-amz-checksum-sha256": checksum,
+                "Cache-Control": IMMUTABLE_CACHE_CONTROL,
+            },
+        }
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await asyncio.to_thread(self._client.head_object, Bucket=self.bucket, Key=key)
+        except self._client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def put_file(self, key: str, source: Path, content_type: str | None) -> None:
+        extra = {"CacheControl": IMMUTABLE_CACHE_CONTROL}
+        if content_type:
+            extra["ContentType"] = content_type
+        await asyncio.to_thread(self._client.upload_file, str(source), self.bucket, key, ExtraArgs=extra)
+
+    async def fetch(self, key: str, target: Path) -> bool:
+        try:
+            await asyncio.to_thread(self._client.download_file, self.bucket, key, str(target))
+        except self._client.exceptions.ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def move(self, source_key: str, key: str, content_type: str | None) -> None:
+        extra = {"CacheControl": IMMUTABLE_CACHE_CONTROL, "MetadataDirective": "REPLACE"}
+        if content_type:
+            extra["ContentType"] = content_type
+        await asyncio.to_thread(
+            self._client.copy_object,
+            Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": source_key}, **extra,
+        )
+        await asyncio.to_thread(self._client.delete_object, Bucket=self.bucket, Key=source_key)
+
+    async def verify(self, key: str, size: int, sha256: str) -> bool:
+        def check() -> bool:
+            try:
+                head = self._client.head_object(Bucket=self.bucket, Key=key, ChecksumMode="ENABLED")
+            except self._client.exceptions.ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                    return False
+                raise
+            if head["ContentLength"] != size:
+                return False
+            checksum = head.get("ChecksumSHA256")
+            if checksum:
+                return checksum == base64.b64encode(bytes.fromhex(sha256)).decode()
+            # Хранилище контрольную сумму не сохранило — считаем по содержимому
+            digest = hashlib.sha256()
+            body = self._client.get_object(Bucket=self.bucket, Key=key)["Body"]
+            for chunk in iter(lambda: body.read(1024 * 1024), b""):
+                digest.update(chunk)
+            return digest.hexdigest() == sha256
+
+        return await asyncio.to_thread(check)
+
+    async def purge_incoming(self, older_than: datetime) -> int:
+        def stale() -> list[str]:
+            keys = []
+            paginator = self._client.get_paginator("list_objects_v2")
+            for page in paginator.paginate(Bucket=self.bucket, Prefix=INCOMING_DIR + "/"):
+                keys.extend(o["Key"] for o in page.get("Contents", ()) if o["LastModified"] < older_than)
+            return keys
+
+        keys = await asyncio.to_thread(stale)
+        if keys:
+            await self.delete(keys)
+        return len(keys)
+
+    async def delete(self, keys: list[str]) -> None:
+        for i in range(0, len(keys), 1000):
+            objects = [{"Key": key} for key in keys[i:i + 1000]]
+            await asyncio.to_thread(
+                self._client.delete_objects, Bucket=self.bucket, Delete={"Objects": objects, "Quiet": True}
+            )
+
+
+def make_storage(settings) -> Storage:
+    """Хранилище по STORAGE_BACKEND: local | s3."""
+    if settings.storage_backend == "local":
+        root = Path(settings.upload_dir) if settings.upload_dir else DEFAULT_UPLOAD_DIR
+        return LocalStorage(root, settings.jwt_secret, settings.presign_ttl_seconds)
+    if settings.storage_backend == "s3":
+        return S3Storage(
+            settings.s3_bucket,
+            endpoint_url=settings.s3_endpoint_url,
+            presign_endpoint_url=settings.s3_presign_endpoint_url,
+            region=settings.s3_region,
+            access_key=settings.s3_access_key,
+            secret_key=settings.s3_secret_key,
+            public_url=settings.s3_public_url,
+            presign_ttl=settings.presign_ttl_seconds,
+            temp_dir=Path(settings.upload_dir) / ".tmp" if settings.upload_dir else None,
+        )
+    raise ValueError(f"Unknown storage backend: {settings.storage_backend}")
+
+
+storage = make_storage(settings)
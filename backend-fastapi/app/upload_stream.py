@@ -0,0 +1,214 @@
+"""Потоковый приём multipart-загрузок.
+
+Тело запроса читается кусками из request.stream() и сразу разбирается парсером
+python-multipart: данные каждого файла копятся в небольшом буфере и пишутся во
+временный файл в каталоге загрузок в пуле потоков (там же считается SHA-256).
+Лимиты на файл, на запрос и на число файлов проверяются по ходу чтения — при
+превышении приём обрывается с 413/400, а частично записанные файлы удаляются.
+Память на запрос ограничена размером буфера, а не размером файлов.
+
+receive_body — то же для «сырого» тела (PUT одного файла по подписанной ссылке,
+app/storage.py).
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+WRITE_BUFFER_BYTES = 256 * 1024
+# Запас на заголовки частей и границы multipart сверх лимита на данные
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+@dataclass
+class ReceivedFile:
+    """Файл, целиком принятый во временный файл temp_path."""
+    filename: str
+    content_type: str | None
+    temp_path: Path
+    size: int = 0
+    sha256: str = ""
+
+
+@dataclass
+class _Part:
+    headers: dict[bytes, bytes] = field(default_factory=dict)
+    file: ReceivedFile | None = None
+    handle: object | None = None
+    hasher: object | None = None
+    buffer: bytearray = field(default_factory=bytearray)
+
+
+def _open(path: Path):
+    return open(path, "wb")
+
+
+def _write(handle, hasher, data: bytes) -> None:
+    hasher.update(data)
+    handle.write(data)
+
+
+def _close(handle) -> None:
+    handle.close()
+
+
+def _unlink(paths: list[Path]) -> None:
+    for path in paths:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+async def receive_files(
+    request: Request,
+    temp_dir: Path,
+    max_file_bytes: int,
+    max_request_bytes: int,
+    max_files: int,
+) -> list[ReceivedFile]:
+    """Принять файлы из multipart-тела во временные файлы в temp_dir.
+
+    Вызывающий отвечает за судьбу temp_path принятых файлов (переместить или удалить);
+    при любой ошибке приёма временные файлы удаляются здесь.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Ожидается multipart/form-data")
+    limit = max_request_bytes + MULTIPART_OVERHEAD_BYTES
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit:
+        raise HTTPException(status_code=413, detail="Слишком большой запрос")
+
+    events: list[tuple[str, bytes | None]] = []
+    header_name = bytearray()
+    header_value = bytearray()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_name.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.extend(data[start:end])
+
+    def on_header_end() -> None:
+        events.append(("header", bytes(header_name).lower() + b"\0" + bytes(header_value)))
+        header_name.clear()
+        header_value.clear()
+
+    callbacks = {
+        "on_part_begin": lambda: events.append(("begin", None)),
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": lambda: events.append(("headers", None)),
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", None)),
+    }
+    parser = MultipartParser(params[b"boundary"], callbacks)
+    temp_dir.mkdir(parents=True, exist_ok=True)
+
+    received: list[ReceivedFile] = []
+    temp_paths: list[Path] = []
+    part = _Part()
+    total = 0
+
+    async def flush(p: _Part) -> None:
+        if p.buffer:
+            data = bytes(p.buffer)
+            p.buffer.clear()
+            await asyncio.to_thread(_write, p.handle, p.hasher, data)
+
+    try:
+        async for chunk in request.stream():
+            total += len(chunk)
+            if total > limit:
+                raise HTTPException(status_code=413, detail="Слишком большой запрос")
+            parser.write(chunk)
+            for kind, payload in events:
+                if kind == "begin":
+                    part = _Part()
+                elif kind == "header":
+                    name, _, value = payload.partition(b"\0")
+                    part.headers[name] = value
+                elif kind == "headers":
+                    _, options = parse_options_header(part.headers.get(b"content-disposition", b""))
+                    if b"filename" not in options:
+                        continue  # обычные поля формы не нужны
+                    if len(received) >= max_files:
+                        raise HTTPException(status_code=400, detail=f"Не больше {max_files} файлов")
+                    temp_path = temp_dir / f".upload-{uuid.uuid4().hex}"
+                    temp_paths.append(temp_path)
+                    part.file = ReceivedFile(
+                        filename=options[b"filename"].decode("utf-8", "replace"),
+                        content_type=part.headers.get(b"content-type", b"").decode("latin-1") or None,
+                        temp_path=temp_path,
+                    )
+                    received.append(part.file)
+                    part.hasher = hashlib.sha256()
+                    part.handle = await asyncio.to_thread(_open, temp_path)
+                elif kind == "data" and part.file is not None:
+                    part.file.size += len(payload)
+                    if part.file.size > max_file_bytes:
+                        raise HTTPException(status_code=413, detail=f"Файл «{part.file.filename}» слишком большой")
+                    part.buffer.extend(payload)
+                    if len(part.buffer) >= WRITE_BUFFER_BYTES:
+                        await flush(part)
+                elif kind == "end" and part.file is not None:
+                    await flush(part)
+                    await asyncio.to_thread(_close, part.handle)
+                    part.handle = None
+                    part.file.sha256 = part.hasher.hexdigest()
+            events.clear()
+        parser.finalize()
+        if part.handle is not None:
+            raise HTTPException(status_code=400, detail="Оборванное multipart-тело")
+    except BaseException:
+        if part.handle is not None:
+            await asyncio.to_thread(_close, part.handle)
+        await asyncio.to_thread(_unlink, temp_paths)
+        raise
+    return received
+
+
+async def receive_body(request: Request, temp_dir: Path, filename: str, max_bytes: int) -> ReceivedFile:
+    """Принять тело запроса целиком во временный файл в temp_dir (с SHA-256)."""
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail="Слишком большой файл")
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    file = ReceivedFile(
+        filename=filename,
+        content_type=request.headers.get("content-type"),
+        temp_path=temp_dir / f".upload-{uuid.uuid4().hex}",
+    )
+    hasher = hashlib.sha256()
+    buffer = bytearray()
+    handle = await asyncio.to_thread(_open, file.temp_path)
+    try:
+        async for chunk in request.stream():
+            file.size += len(chunk)
+            if file.size > max_bytes:
+                raise HTTPException(status_code=413, detail="Слишком большой файл")
+            buffer.extend(chunk)
+            if len(buffer) >= WRITE_BUFFER_BYTES:
+                await asyncio.to_thread(_write, handle, hasher, bytes(buffer))
+                buffer.clear()
+        if buffer:
+            await asyncio.to_thread(_write, handle, hasher, bytes(buffer))
+        await asyncio.to_thread(_close, handle)
+    except BaseException:
+        await asyncio.to_thread(_close, handle)
+        await asyncio.to_thread(_unlink, [file.temp_path])
+        raise
+    file.sha256 = hasher.hexdigest()
+    return file
+
+
+async def discard(files: list[ReceivedFile]) -> None:
+    """Удалить временные файлы, которые не были перемещены."""
+    await asyncio.to_thread(_unlink, [f.temp_path for f in files if os.path.exists(f.temp_path)])
@@ -0,0 +1,72 @@
+"""Короткоживущий кэш профилей пользователей: user_id -> UserResponse.
+
+Профиль нужен там, где реально используются поля пользователя (GET /users/me,
+имя отправителя в сообщениях); проверка токена в БД не ходит. update_me вызывает
+invalidate() после коммита; через общий бэкенд рассылки инвалидация доходит до
+остальных воркеров.
+"""
+import time
+from collections import OrderedDict
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import User
+from app.schemas.user import UserResponse
+from app.ws_manager import ws_manager, ConnectionManager
+
+INVALIDATE_KIND = "user_invalidate"
+
+
+class UserCache:
+    def __init__(self, manager: ConnectionManager, maxsize: int = 10000, ttl: float = 30.0) -> None:
+        self._manager = manager
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict[UUID, tuple[float, UserResponse]] = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        manager.on_control(INVALIDATE_KIND, self._on_remote_invalidate)
+
+    def put(self, user: User) -> UserResponse:
+        profile = UserResponse.model_validate(user)
+        self._entries[user.id] = (time.monotonic() + self.ttl, profile)
+        self._entries.move_to_end(user.id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return profile
+
+    async def get(self, db: AsyncSession, user_id: UUID) -> UserResponse | None:
+        entry = self._entries.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        generation = self._generation
+        r = await db.execute(select(User).where(User.id == user_id))
+        user = r.scalar_one_or_none()
+        if not user:
+            return None
+        if generation != self._generation:
+            return UserResponse.model_validate(user)
+        return self.put(user)
+
+    def invalidate_local(self, user_id: UUID) -> None:
+        self._generation += 1
+        self._entries.pop(user_id, None)
+
+    async def invalidate(self, user_id: UUID) -> None:
+        self.invalidate_local(user_id)
+        await self._manager.publish_control(INVALIDATE_KIND, str(user_id))
+
+    async def _on_remote_invalidate(self, room: str) -> None:
+        self.invalidate_local(UUID(room))
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+user_cache = UserCache(ws_manager)
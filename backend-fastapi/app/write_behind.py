@@ -0,0 +1,253 @@
+"""Отложенная запись сообщений (write-behind) с групповым коммитом.
+
+В режиме MESSAGE_WRITE_MODE=write_behind принятое сообщение получает id и время в
+приложении, сразу рассылается, а в Postgres его пишет фоновая задача пачками:
+многострочный INSERT сообщений и вложений, один UPDATE сводки на чат и прирост
+счётчиков непрочитанных (chats.message_seq, read_seq отправителей) — в одной
+транзакции на пачку.
+
+Durability (WRITE_BEHIND_DURABILITY):
+- async  — ответ сразу после постановки в очередь; при падении процесса
+           неуспевшие сообщения теряются;
+- commit — ответ после коммита пачки, в которую попало сообщение (группировка
+           коммитов сохраняется, задержка — до одного интервала сброса).
+Очередь ограничена WRITE_BEHIND_MAX_PENDING: при переполнении отправитель ждёт
+до enqueue_timeout секунд, затем получает QueueFullError (HTTP 503).
+
+Если пачка не записалась после повторов, она делится пополам до отдельных
+сообщений: теряются только строки, которые не пишутся сами по себе (например,
+чат удалён между отправкой и записью). После начала drain() сообщения пишутся
+сразу, мимо очереди.
+"""
+import asyncio
+import logging
+from uuid import UUID
+
+from sqlalchemy import insert, update, bindparam, or_
+
+from app.database import AsyncSessionLocal
+from app.message_writer import build_message_rows, serialize_rows, insert_message
+from app.models import Chat, Message, Attachment
+from app.chat_summary import make_preview, sender_read_stmt
+from app.schemas.message import AttachmentCreate
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("async", "commit")
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class MessageWriteBehind:
+    def __init__(
+        self,
+        max_pending: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.02,
+        durability: str = "async",
+        enqueue_timeout: float = 1.0,
+    ) -> None:
+        self.enabled = False
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self.enqueue_timeout = enqueue_timeout
+        self._pending: list[tuple[dict, list[dict], asyncio.Future | None]] = []
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.flushed_batches = 0
+        self.flushed_messages = 0
+        self.failed_messages = 0
+        self.rejected = 0
+
+    def configure(self, mode: str, durability: str, max_pending: int, batch_size: int, flush_ms: int) -> None:
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown write-behind durability: {durability}")
+        self.enabled = mode == "write_behind"
+        self.durability = durability
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._stopping = False
+            self._task = asyncio.create_task(self._writer())
+
+    async def submit(
+        self,
+        chat_id: UUID,
+        user_id: UUID,
+        content: str | None,
+        msg_type: str,
+        attachments: list[AttachmentCreate] | None = None,
+        sender_name: str | None = None,
+    ) -> dict:
+        while len(self._pending) >= self.max_pending:
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise QueueFullError("Message queue is full")
+        if self._stopping:
+            # Писатель останавливается (shutdown) и очередь больше не разбирает — пишем сразу
+            async with AsyncSessionLocal() as db:
+                payload = await insert_message(db, chat_id, user_id, content, msg_type, attachments, sender_name)
+                await db.commit()
+            return payload
+        message_row, att_rows = build_message_rows(chat_id, user_id, content, msg_type, attachments)
+        future = asyncio.get_running_loop().create_future() if self.durability == "commit" else None
+        self._pending.append((message_row, att_rows, future))
+        if len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+        if future is not None:
+            await future
+        return serialize_rows(message_row, att_rows, sender_name)
+
+    async def _writer(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._pending:
+                batch = self._pending[: self.batch_size]
+                del self._pending[: self.batch_size]
+                self._space.set()
+                await self._flush(batch)
+            if self._stopping:
+                return
+
+    async def _write(self, batch: list[tuple[dict, list[dict], asyncio.Future | None]]) -> None:
+        """Одна транзакция на пачку: сообщения, вложения, сводки и счётчики чатов."""
+        messages = [m for m, _, _ in batch]
+        attachments = [a for _, atts, _ in batch for a in atts]
+        # Сводка: по каждому чату — последнее сообщение пачки
+        latest: dict = {}
+        for m in messages:
+            latest[m["chat_id"]] = m
+        summaries = [
+            {
+                "b_chat_id": m["chat_id"],
+                "b_id": m["id"],
+                "b_preview": make_preview(m["content"]),
+                "b_at": m["created_at"],
+                "b_user_id": m["user_id"],
+            }
+            for m in latest.values()
+        ]
+        # Счётчики: +n сообщений на чат и +n к read_seq каждого отправителя в этом чате
+        per_chat: dict = {}
+        per_sender: dict = {}
+        for m in messages:
+            per_chat[m["chat_id"]] = per_chat.get(m["chat_id"], 0) + 1
+            key = (m["chat_id"], m["user_id"])
+            per_sender[key] = per_sender.get(key, 0) + 1
+        seq_rows = [{"b_chat_id": cid, "b_count": n} for cid, n in per_chat.items()]
+        sender_rows = [{"b_chat_id": cid, "b_user_id": uid, "b_count": n} for (cid, uid), n in per_sender.items()]
+        chats_t = Chat.__table__
+        summary_stmt = (
+            update(chats_t)
+            .where(chats_t.c.id == bindparam("b_chat_id"))
+            .where(or_(chats_t.c.last_message_at.is_(None), chats_t.c.last_message_at <= bindparam("b_at")))
+            .values(
+                last_message_id=bindparam("b_id"),
+                last_message_preview=bindparam("b_preview"),
+                last_message_at=bindparam("b_at"),
+                last_message_user_id=bindparam("b_user_id"),
+                updated_at=bindparam("b_at"),
+            )
+        )
+        # Отдельно от сводки: её UPDATE пропускает чат, если там уже есть более новое сообщение
+        seq_stmt = (
+            update(chats_t)
+            .where(chats_t.c.id == bindparam("b_chat_id"))
+            .values(message_seq=chats_t.c.message_seq + bindparam("b_count"))
+        )
+        sender_stmt = sender_read_stmt(bindparam("b_chat_id"), bindparam("b_user_id"), bindparam("b_count"))
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(Message.__table__), messages)
+            if attachments:
+                await db.execute(insert(Attachment.__table__), attachments)
+            await db.execute(summary_stmt, summaries)
+            await db.execute(seq_stmt, seq_rows)
+            await db.execute(sender_stmt, sender_rows)
+            await db.commit()
+
+    async def _flush(self, batch: list[tuple[dict, list[dict], asyncio.Future | None]], attempts: int = 3) -> None:
+        error: Exception | None = None
+        for attempt in range(attempts):
+            try:
+                await self._write(batch)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                logger.warning("Write-behind flush of %d failed (attempt %d): %s", len(batch), attempt + 1, e)
+                if attempt + 1 < attempts:
+                    await asyncio.sleep(0.1 * (attempt + 1))
+        if error is not None and len(batch) > 1:
+            # Сообщения уже разосланы: ищем делением пополам строки, которые не пишутся, остальные сохраняем
+            mid = len(batch) // 2
+            await self._flush(batch[:mid], attempts=1)
+            await self._flush(batch[mid:], attempts=1)
+            return
+        if error is not None:
+            self.failed_messages += len(batch)
+            logger.error("Write-behind dropped message %s: %s", batch[0][0]["id"], error)
+        else:
+            self.flushed_batches += 1
+            self.flushed_messages += len(batch)
+        for _, _, future in batch:
+            if future is not None and not future.done():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(None)
+
+    async def drain(self) -> None:
+        """Для shutdown: дописать всё, что в очереди, и остановить писателя."""
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "pending": len(self._pending),
+            "flushed_batches": self.flushed_batches,
+            "flushed_messages": self.flushed_messages,
+            "failed_messages": self.failed_messages,
+            "rejected": self.rejected,
+        }
+
+
+message_queue = MessageWriteBehind()
+
+
+async def write_message(
+    db,
+    chat_id: UUID,
+    user_id: UUID,
+    content: str | None,
+    msg_type: str,
+    attachments: list[AttachmentCreate] | None = None,
+    sender_name: str | None = None,
+) -> dict:
+    """Записать новое сообщение: сразу одним запросом с коммитом или через очередь write-behind."""
+    if message_queue.enabled:
+        return await message_queue.submit(chat_id, user_id, content, msg_type, attachments, sender_name)
+    payload = await insert_message(db, chat_id, user_id, content, msg_type, attachments, sender_name)
+    await db.commit()
+    return payload
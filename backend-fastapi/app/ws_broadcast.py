@@ -0,0 +1,109 @@
+"""Бэкенды рассылки для ConnectionManager.
+
+broadcast_to_chat / broadcast_to_user публикуют событие один раз, а каждый узел
+(воркер uvicorn или реплика) доставляет его своим локальным сокетам.
+- memory — один процесс, как раньше;
+- redis  — Redis pub/sub, для нескольких воркеров/реплик.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+# deliver(kind, room, text): kind = "chat" | "user" | служебный вид, room = chat_id | user_id, text — готовый JSON
+Deliver = Callable[[str, str, str], Awaitable[None]]
+
+
+class BroadcastBackend:
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def publish(self, kind: str, room: str, text: str) -> None:
+        raise NotImplementedError
+
+    async def stop(self) -> None:
+        pass
+
+
+class MemoryBroadcastBackend(BroadcastBackend):
+    """Доставка только в текущем процессе."""
+
+    async def publish(self, kind: str, room: str, text: str) -> None:
+        await self._deliver(kind, room, text)
+
+
+class RedisBroadcastBackend(BroadcastBackend):
+    """Redis pub/sub: узел-отправитель доставляет локально сразу, остальные — из подписки.
+
+    client можно передать снаружи (например, fakeredis.aioredis.FakeRedis в тестах).
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", channel: str = "chat:ws", client=None) -> None:
+        self._url = url
+        self._channel = channel
+        self._client = client
+        self._node_id = uuid.uuid4().hex
+        self._pubsub = None
+        self._listener: asyncio.Task | None = None
+
+    async def start(self, deliver: Deliver) -> None:
+        await super().start(deliver)
+        if self._client is None:
+            try:
+                from redis import asyncio as aioredis
+            except ImportError as e:
+                raise RuntimeError("BROADCAST_BACKEND=redis требует пакет redis") from e
+            self._client = aioredis.from_url(self._url)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        await self._pubsub.subscribe(self._channel)
+        self._listener = asyncio.create_task(self._listen())
+
+    async def publish(self, kind: str, room: str, text: str) -> None:
+        await self._deliver(kind, room, text)
+        envelope = json.dumps({"o": self._node_id, "k": kind, "r": room, "t": text})
+        try:
+            await self._client.publish(self._channel, envelope)
+        except Exception as e:
+            logger.warning("Redis publish failed: %s", e)
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                async for message in self._pubsub.listen():
+                    if message.get("type") != "message":
+                        continue
+                    try:
+                        env = json.loads(message["data"])
+                    except (ValueError, TypeError):
+                        continue
+                    if env.get("o") == self._node_id:
+                        continue
+                    await self._deliver(env["k"], env["r"], env["t"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Redis subscription error, resubscribing: %s", e)
+                await asyncio.sleep(1.0)
+
+    async def stop(self) -> None:
+        if self._listener:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except (asyncio.CancelledError, Exception):
+                pass
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        if self._client is not None:
+            await self._client.aclose()
+
+
+def make_broadcast_backend(name: str, redis_url: str) -> BroadcastBackend:
+    if name == "redis":
+        return RedisBroadcastBackend(redis_url)
+    if name == "memory":
+        return MemoryBroadcastBackend()
+    raise ValueError(f"Unknown broadcast backend: {name}")
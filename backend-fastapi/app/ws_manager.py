@@ -1,20 +1,63 @@
-"""Менеджер WebSocket-подключений: комнаты по chat_id и по user_id (для chats_updated)."""
+"""Менеджер WebSocket-подключений: комнаты по chat_id и по user_id (для chats_updated).
+
+У каждого сокета своя ограниченная очередь исходящих и задача-писатель: рассылка только
+кладёт текст в очереди и не ждёт медленных клиентов. Переполнение очереди обрабатывается
+политикой slow_consumer_policy:
+- drop_oldest — выбросить самое старое сообщение;
+- coalesce    — не ставить копию уже ожидающего сообщения, иначе как drop_oldest;
+- disconnect  — закрыть соединение (клиент переподключится и перечитает состояние).
+"""
+import asyncio
 import json
 import logging
-from collections import defaultdict
-from typing import Any
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable
 
 from starlette.websockets import WebSocket
 
+from app.ws_broadcast import BroadcastBackend, MemoryBroadcastBackend
+from app.metrics import WS_FANOUT_SECONDS, WS_FANOUT_RECIPIENTS
+
 logger = logging.getLogger(__name__)
 
+SLOW_CONSUMER_POLICIES = ("drop_oldest", "coalesce", "disconnect")
+
+
+class _Outbox:
+    """Очередь исходящих одного сокета и её писатель."""
+
+    def __init__(self, maxsize: int) -> None:
+        self.queue: deque[str] = deque()
+        self.maxsize = maxsize
+        self.ready = asyncio.Event()
+        self.task: asyncio.Task | None = None
+
 
 class ConnectionManager:
-    def __init__(self) -> None:
+    def __init__(
+        self,
+        backend: BroadcastBackend | None = None,
+        queue_size: int = 256,
+        slow_consumer_policy: str = "drop_oldest",
+    ) -> None:
+        if slow_consumer_policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Unknown slow consumer policy: {slow_consumer_policy}")
+        self._backend = backend or MemoryBroadcastBackend()
+        self._started = False
+        self._queue_size = queue_size
+        self._policy = slow_consumer_policy
+        self._outboxes: dict[WebSocket, _Outbox] = {}
+        self._dropped: dict[str, int] = defaultdict(int)
+        self._sent = 0
+        # Служебные события через тот же бэкенд рассылки (например, инвалидация кэшей)
+        self._control_handlers: dict[str, Callable[[str], Awaitable[None]]] = {}
         self._chat_rooms: dict[str, set[WebSocket]] = defaultdict(set)
         self._ws_rooms: dict[WebSocket, set[str]] = defaultdict(set)
         self._user_rooms: dict[str, set[WebSocket]] = defaultdict(set)
         self._ws_user: dict[WebSocket, str] = {}
+        # Закрытия медленных сокетов: ссылка держит задачу до завершения (иначе её может собрать GC)
+        self._background: set[asyncio.Task] = set()
 
     def join(self, ws: WebSocket, chat_id: str) -> None:
         self._chat_rooms[chat_id].add(ws)
@@ -30,7 +73,18 @@ class ConnectionManager:
             del self._chat_rooms[chat_id]
         self._ws_rooms[ws].discard(chat_id)
 
+    def configure(self, queue_size: int | None = None, slow_consumer_policy: str | None = None) -> None:
+        if slow_consumer_policy is not None:
+            if slow_consumer_policy not in SLOW_CONSUMER_POLICIES:
+                raise ValueError(f"Unknown slow consumer policy: {slow_consumer_policy}")
+            self._policy = slow_consumer_policy
+        if queue_size is not None:
+            self._queue_size = queue_size
+
     def disconnect(self, ws: WebSocket) -> None:
+        outbox = self._outboxes.pop(ws, None)
+        if outbox and outbox.task and outbox.task is not asyncio.current_task():
+            outbox.task.cancel()
         for chat_id in list(self._ws_rooms.get(ws, ())):
             self._chat_rooms[chat_id].discard(ws)
             if not self._chat_rooms[chat_id]:
@@ -43,27 +97,111 @@ class ConnectionManager:
             if not self._user_rooms[uid]:
                 del self._user_rooms[uid]
 
-    async def broadcast_to_chat(self, chat_id: str, payload: dict[str, Any]) -> None:
-        text = json.dumps(payload, default=str)
-        dead: list[WebSocket] = []
-        for ws in self._chat_rooms.get(chat_id, ()):
-            try:
-                await ws.send_text(text)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
+    async def start(self, backend: BroadcastBackend | None = None) -> None:
+        """Запуск бэкенда рассылки (из lifespan). backend заменяет текущий, если передан."""
+        if backend is not None:
+            self._backend = backend
+        await self._backend.start(self._deliver_local)
+        self._started = True
+
+    async def stop(self) -> None:
+        if self._started:
+            await self._backend.stop()
+            self._started = False
+
+    def on_control(self, kind: str, handler: Callable[[str], Awaitable[None]]) -> None:
+        self._control_handlers[kind] = handler
+
+    async def publish_control(self, kind: str, room: str) -> None:
+        if not self._started:
+            await self.start()
+        await self._backend.publish(kind, room, "")
+
+    async def _deliver_local(self, kind: str, room: str, text: str) -> None:
+        handler = self._control_handlers.get(kind)
+        if handler is not None:
+            await handler(room)
+            return
+        rooms = self._chat_rooms if kind == "chat" else self._user_rooms
+        started = time.perf_counter()
+        sockets = list(rooms.get(room, ()))
+        for ws in sockets:
+            self._enqueue(ws, text)
+        WS_FANOUT_SECONDS.labels(kind).observe(time.perf_counter() - started)
+        WS_FANOUT_RECIPIENTS.labels(kind).observe(len(sockets))
+
+    def _enqueue(self, ws: WebSocket, text: str) -> None:
+        outbox = self._outboxes.get(ws)
+        if outbox is None:
+            outbox = self._outboxes[ws] = _Outbox(self._queue_size)
+            outbox.task = asyncio.create_task(self._writer(ws, outbox))
+        if self._policy == "coalesce" and text in outbox.queue:
+            self._dropped["coalesced"] += 1
+            return
+        if len(outbox.queue) >= outbox.maxsize:
+            if self._policy == "disconnect":
+                self._dropped["disconnected"] += 1
+                logger.info("Slow WebSocket consumer disconnected (queue %d)", len(outbox.queue))
+                self.disconnect(ws)
+                task = asyncio.create_task(self._close(ws))
+                self._background.add(task)
+                task.add_done_callback(self._background.discard)
+                return
+            outbox.queue.popleft()
+            self._dropped["oldest"] += 1
+        outbox.queue.append(text)
+        outbox.ready.set()
+
+    async def _writer(self, ws: WebSocket, outbox: _Outbox) -> None:
+        try:
+            while True:
+                await outbox.ready.wait()
+                while outbox.queue:
+                    await ws.send_text(outbox.queue.popleft())
+                    self._sent += 1
+                outbox.ready.clear()
+        except asyncio.CancelledError:
+            pass
+        except Exception:
             self.disconnect(ws)
 
+    @staticmethod
+    async def _close(ws: WebSocket) -> None:
+        try:
+            await ws.close(code=1013)
+        except Exception:
+            pass
+
+    def stats(self) -> dict[str, Any]:
+        """Глубина очередей, число отброшенных/отправленных сообщений, размеры комнат."""
+        depths = [len(o.queue) for o in self._outboxes.values()]
+        return {
+            "connections": len(self._ws_user),
+            "chat_rooms": {chat_id: len(sockets) for chat_id, sockets in self._chat_rooms.items()},
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "sent": self._sent,
+            "dropped": dict(self._dropped),
+            "policy": self._policy,
+        }
+
+    async def _publish(self, kind: str, room: str, payload: dict[str, Any]) -> None:
+        if not self._started:
+            await self.start()
+        await self._backend.publish(kind, room, json.dumps(payload, default=str))
+
+    async def broadcast_to_chat(self, chat_id: str, payload: dict[str, Any]) -> None:
+        await self._publish("chat", chat_id, payload)
+
     async def broadcast_to_user(self, user_id: str, payload: dict[str, Any]) -> None:
-        text = json.dumps(payload, default=str)
-        dead: list[WebSocket] = []
-        for ws in self._user_rooms.get(user_id, ()):
-            try:
-                await ws.send_text(text)
-            except Exception:
-                dead.append(ws)
-        for ws in dead:
-            self.disconnect(ws)
+        await self._publish("user", user_id, payload)
+
+    def send_to(self, ws: WebSocket, payload: dict[str, Any]) -> None:
+        """Ответ одному сокету этого воркера — через его очередь: писать в сокет может только писатель.
+        Сокет уже отключён (disconnect) — ответ не отправляется."""
+        if ws not in self._ws_user:
+            return
+        self._enqueue(ws, json.dumps(payload, default=str))
 
 
 ws_manager = ConnectionManager()
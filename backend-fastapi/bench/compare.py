@@ -0,0 +1,54 @@
+"""Сравнение двух прогонов bench/run.py.
+
+    python -m bench.compare base.json new.json --threshold 10
+
+Печатает по каждой операции p50/p95/p99, пропускную способность и SQL-запросы на
+операцию «было → стало». Код выхода 1, если p95 какой-либо операции вырос больше
+чем на --threshold процентов (для проверки регрессий в CI).
+"""
+import argparse
+import json
+import sys
+
+
+def _delta(old, new) -> str:
+    if old in (None, 0) or new is None:
+        return ""
+    return f" ({(new - old) / old * 100:+.1f}%)"
+
+
+def compare(base: dict, new: dict, threshold: float) -> bool:
+    regressed = False
+    for name, cur in new["ops"].items():
+        old = base["ops"].get(name)
+        if not old or "skipped" in old or "skipped" in cur:
+            print(f"{name}: no comparable data")
+            continue
+        print(name)
+        for q in ("p50", "p95", "p99"):
+            a, b = old["latency_ms"][q], cur["latency_ms"][q]
+            print(f"  {q:<4} {a} -> {b} ms{_delta(a, b)}")
+        print(f"  rps  {old['throughput_rps']} -> {cur['throughput_rps']}{_delta(old['throughput_rps'], cur['throughput_rps'])}")
+        print(f"  sql  {old.get('db_queries_per_op')} -> {cur.get('db_queries_per_op')}")
+        a, b = old["latency_ms"]["p95"], cur["latency_ms"]["p95"]
+        if a and b and (b - a) / a * 100 > threshold:
+            regressed = True
+            print(f"  REGRESSION: p95 +{(b - a) / a * 100:.1f}% > {threshold}%")
+    return regressed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0, help="допустимый рост p95, %%")
+    args = parser.parse_args()
+    with open(args.base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.new, encoding="utf-8") as f:
+        new = json.load(f)
+    sys.exit(1 if compare(base, new, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
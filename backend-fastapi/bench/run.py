@@ -0,0 +1,312 @@
+"""Нагрузочный прогон REST и WebSocket по данным bench/seed.py.
+
+    cd backend-fastapi
+    pip install -r bench/requirements.txt
+    python -m bench.run --base-url http://localhost:8000 --concurrency 32 --requests 2000 --out run.json
+
+Запускать из каталога бэкенда с тем же .env, что и у сервера: пользователи для
+прогона выбираются прямо из базы, а токены выпускаются локально тем же JWT_SECRET
+(логин меряется отдельной операцией login, а не на подготовке).
+
+Операции (--ops): login, chats, messages, search, ws_fanout. Для каждой — число
+запросов и ошибок, пропускная способность, p50/p95/p99 латентности и SQL-запросов
+на операцию (по разнице счётчиков GET /metrics до и после). ws_fanout: один участник
+самой большой bench-группы шлёт send_message, --ws-clients участников держат сокеты;
+латентность — от отправки до получения new_message каждым получателем.
+Результат — JSON (stdout или --out); сравнение двух прогонов — bench/compare.py.
+"""
+import argparse
+import asyncio
+import json
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import httpx
+import websockets
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import text
+
+from app.core.security import create_access_token
+from app.database import engine
+from bench.seed import CHAT_PREFIX, DEFAULT_PASSWORD, USER_PREFIX, WORDS
+
+OPS = ("login", "chats", "messages", "search", "ws_fanout")
+
+# Маршрут в метриках сервера для каждой HTTP-операции
+ROUTES = {
+    "login": "/api/auth/login",
+    "chats": "/api/chats",
+    "messages": "/api/messages/chat/{chat_id}",
+    "search": "/api/messages/search",
+}
+
+
+def percentile(sorted_values: list[float], q: float) -> float | None:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list[float], errors: int, elapsed: float) -> dict:
+    values = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2) if v is not None else None  # noqa: E731
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(values) / elapsed, 1) if elapsed > 0 else None,
+        "latency_ms": {
+            "p50": ms(percentile(values, 0.50)),
+            "p95": ms(percentile(values, 0.95)),
+            "p99": ms(percentile(values, 0.99)),
+            "max": ms(values[-1] if values else None),
+            "mean": ms(sum(values) / len(values) if values else None),
+        },
+    }
+
+
+async def scrape_db_counters(client: httpx.AsyncClient) -> dict:
+    """(sum, count) гистограммы http_request_db_queries по маршрутам и общий счётчик SQL-запросов."""
+    try:
+        r = await client.get("/metrics")
+        r.raise_for_status()
+    except httpx.HTTPError:
+        return {}
+    out: dict = {}
+    for family in text_string_to_metric_families(r.text):
+        for sample in family.samples:
+            if sample.name == "http_request_db_queries_sum":
+                out.setdefault(sample.labels["route"], [0.0, 0.0])[0] = sample.value
+            elif sample.name == "http_request_db_queries_count":
+                out.setdefault(sample.labels["route"], [0.0, 0.0])[1] = sample.value
+            elif sample.name == "db_query_duration_seconds_count":
+                out["*"] = [sample.value, 0.0]
+    return out
+
+
+def db_queries_per_op(before: dict, after: dict, route: str | None, ops_done: int) -> float | None:
+    if route is None:
+        # WebSocket: все SQL-запросы процесса за прогон на одно отправленное сообщение
+        if "*" not in before or "*" not in after or not ops_done:
+            return None
+        return round((after["*"][0] - before["*"][0]) / ops_done, 2)
+    b, a = before.get(route, [0.0, 0.0]), after.get(route)
+    if not a or a[1] - b[1] <= 0:
+        return None
+    return round((a[0] - b[0]) / (a[1] - b[1]), 2)
+
+
+async def load_fixtures(pool_size: int, ws_clients: int) -> dict:
+    """Пользователи, их чаты и самая большая bench-группа — прямо из базы."""
+    async with engine.connect() as conn:
+        users = (await conn.execute(
+            text(f"SELECT id, username, handle FROM users WHERE handle LIKE '{USER_PREFIX}%' ORDER BY random() LIMIT :n"),
+            {"n": pool_size},
+        )).all()
+        if not users:
+            raise SystemExit("No bench users; run `python -m bench.seed` first")
+        chat_rows = (await conn.execute(
+            text("SELECT user_id, chat_id FROM chat_members WHERE user_id = ANY(:ids)"),
+            {"ids": [u.id for u in users]},
+        )).all()
+        group = (await conn.execute(
+            text(f"SELECT id FROM chats WHERE name LIKE '{CHAT_PREFIX}%' AND type = 'group' ORDER BY members_count DESC LIMIT 1")
+        )).first()
+        group_members = []
+        if group:
+            group_members = (await conn.execute(
+                text("""
+                    SELECT u.id, u.username FROM chat_members m JOIN users u ON u.id = m.user_id
+                    WHERE m.chat_id = :chat_id LIMIT :n
+                """),
+                {"chat_id": group.id, "n": ws_clients + 1},
+            )).all()
+    await engine.dispose()
+    chats_by_user: dict = {}
+    for row in chat_rows:
+        chats_by_user.setdefault(row.user_id, []).append(str(row.chat_id))
+    return {
+        "users": [
+            {"handle": u.handle, "token": create_access_token(str(u.id), u.username), "chats": chats_by_user.get(u.id, [])}
+            for u in users
+        ],
+        "group_id": str(group.id) if group else None,
+        "group_tokens": [create_access_token(str(m.id), m.username) for m in group_members],
+    }
+
+
+async def run_http_op(client: httpx.AsyncClient, name: str, fixtures: dict, args) -> dict:
+    users = fixtures["users"]
+    with_chats = [u for u in users if u["chats"]]
+
+    def make_request():
+        if name == "login":
+            u = random.choice(users)
+            return client.post("/api/auth/login", json={"username": u["handle"], "password": args.password})
+        if name == "chats":
+            u = random.choice(users)
+            return client.get("/api/chats", params={"limit": 50}, headers={"Authorization": f"Bearer {u['token']}"})
+        if name == "messages":
+            u = random.choice(with_chats)
+            return client.get(
+                f"/api/messages/chat/{random.choice(u['chats'])}",
+                params={"limit": 50},
+                headers={"Authorization": f"Bearer {u['token']}"},
+            )
+        u = random.choice(users)
+        return client.get(
+            "/api/messages/search",
+            params={"q": random.choice(WORDS), "limit": 20},
+            headers={"Authorization": f"Bearer {u['token']}"},
+        )
+
+    if name == "messages" and not with_chats:
+        return {"skipped": "bench users have no chats"}
+    latencies: list[float] = []
+    errors = 0
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                r = await make_request()
+                ok = r.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+
+    before = await scrape_db_counters(client)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    after = await scrape_db_counters(client)
+    result = summarize(latencies, errors, elapsed)
+    result["db_queries_per_op"] = db_queries_per_op(before, after, ROUTES[name], len(latencies) + errors)
+    return result
+
+
+async def run_ws_fanout(client: httpx.AsyncClient, fixtures: dict, args) -> dict:
+    tokens = fixtures["group_tokens"]
+    if not fixtures["group_id"] or len(tokens) < 2:
+        return {"skipped": "no bench group with at least 2 members"}
+    chat_id = fixtures["group_id"]
+    ws_url = args.base_url.replace("http", "ws", 1) + "/api/ws"
+    sent_at: dict[str, float] = {}
+    latencies: list[float] = []
+    expected = 0
+    done = asyncio.Event()
+
+    async def receiver(token: str, ready: asyncio.Event):
+        async with websockets.connect(f"{ws_url}?token={token}", max_queue=None) as ws:
+            await ws.send(json.dumps({"type": "join_chat", "chat_id": chat_id}))
+            ready.set()
+            while not done.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), 1.0)
+                except asyncio.TimeoutError:
+                    continue
+                data = json.loads(raw)
+                if data.get("type") != "new_message":
+                    continue
+                tag = (data["message"].get("content") or "").rsplit(" ", 1)[-1]
+                if tag in sent_at:
+                    latencies.append(time.perf_counter() - sent_at[tag])
+                    if len(latencies) >= expected:
+                        done.set()
+
+    receivers = tokens[1:]
+    readies = [asyncio.Event() for _ in receivers]
+    tasks = [asyncio.create_task(receiver(t, e)) for t, e in zip(receivers, readies)]
+    await asyncio.wait_for(asyncio.gather(*(e.wait() for e in readies)), 60)
+    await asyncio.sleep(0.5)  # join_chat обрабатывается асинхронно
+    expected = args.ws_messages * len(receivers)
+
+    before = await scrape_db_counters(client)
+    started = time.perf_counter()
+    async with websockets.connect(f"{ws_url}?token={tokens[0]}") as sender:
+        for i in range(args.ws_messages):
+            tag = f"bench{i}"
+            sent_at[tag] = time.perf_counter()
+            await sender.send(json.dumps({"type": "send_message", "chat_id": chat_id, "content": f"нагрузка {tag}"}))
+            if args.ws_interval_ms:
+                await asyncio.sleep(args.ws_interval_ms / 1000)
+        try:
+            await asyncio.wait_for(done.wait(), args.ws_timeout)
+        except asyncio.TimeoutError:
+            pass
+    elapsed = time.perf_counter() - started
+    done.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    after = await scrape_db_counters(client)
+    result = summarize(latencies, expected - len(latencies), elapsed)
+    result["receivers"] = len(receivers)
+    result["messages_sent"] = args.ws_messages
+    result["db_queries_per_op"] = db_queries_per_op(before, after, None, args.ws_messages)
+    return result
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    fixtures = await load_fixtures(args.users_pool, args.ws_clients)
+    results: dict = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=30) as client:
+        for name in args.ops:
+            if name == "ws_fanout":
+                results[name] = await run_ws_fanout(client, fixtures, args)
+            else:
+                results[name] = await run_http_op(client, name, fixtures, args)
+    return {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "git_revision": git_revision(),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "requests_per_op": args.requests,
+            "users_pool": len(fixtures["users"]),
+        },
+        "ops": results,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--ops", nargs="+", choices=OPS, default=list(OPS))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000, help="запросов на HTTP-операцию")
+    parser.add_argument("--users-pool", type=int, default=1000, help="сколько bench-пользователей задействовать")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--ws-clients", type=int, default=500, help="получателей в большой группе")
+    parser.add_argument("--ws-messages", type=int, default=200)
+    parser.add_argument("--ws-interval-ms", type=float, default=10.0, help="пауза между send_message")
+    parser.add_argument("--ws-timeout", type=float, default=30.0)
+    parser.add_argument("--out", help="файл для JSON (иначе stdout)")
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
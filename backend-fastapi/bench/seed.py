@@ -0,0 +1,209 @@
+"""Наполнение локальной базы данными для нагрузочных прогонов (bench/run.py).
+
+    cd backend-fastapi
+    python -m bench.seed --users 100000 --chats 50000 --messages 10000000 --max-group 5000
+
+Генерация идёт на стороне Postgres (generate_series), сообщения — пачками по
+--batch в отдельных транзакциях. Пользователи — bench_u<N> с общим паролем
+--password, чаты называются bench-<N>: --reset удаляет прошлый набор по этим
+признакам. Чат 1 — самая большая группа (--max-group участников), остальные группы
+мельче (распределение с длинным хвостом); сообщения сильнее концентрируются в
+первых чатах. В конце — сводка чатов (last_message_*, members_count, message_seq) и ANALYZE.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy import text
+
+from app.core.security import get_password_hash
+from app.chat_summary import PREVIEW_MAX_LEN
+from app.database import engine
+
+USER_PREFIX = "bench_u"
+CHAT_PREFIX = "bench-"
+DEFAULT_PASSWORD = "benchpass"
+
+WORDS = [
+    "привет", "встреча", "завтра", "проект", "отчёт", "документ", "созвон", "вечером", "утром", "пятница",
+    "задача", "релиз", "сервер", "база", "данные", "поиск", "сообщение", "группа", "файл", "картинка",
+    "фотография", "договорились", "спасибо", "отлично", "посмотрю", "напишу", "позвоню", "офис", "дома",
+    "обед", "кофе", "погода", "дождь", "солнце", "выходные", "отпуск", "билеты", "поезд", "самолёт",
+    "музыка", "фильм", "книга", "код", "ошибка", "тест", "деплой", "ревью", "ветка", "коммит", "сборка",
+    "deploy", "review", "release", "backend", "frontend", "postgres", "redis", "docker", "nginx", "python",
+]
+
+
+async def _exec(conn, sql: str, **params) -> None:
+    await conn.execute(text(sql), params)
+    await conn.commit()
+
+
+async def reset(conn) -> None:
+    await _exec(conn, f"DELETE FROM chats WHERE name LIKE '{CHAT_PREFIX}%'")
+    await _exec(conn, f"DELETE FROM users WHERE handle LIKE '{USER_PREFIX}%'")
+
+
+async def seed(args) -> dict:
+    timings: dict[str, float] = {}
+    async with engine.connect() as conn:
+        exists = (await conn.execute(text(f"SELECT count(*) FROM users WHERE handle LIKE '{USER_PREFIX}%'"))).scalar()
+        await conn.commit()
+        if exists and not args.reset:
+            raise SystemExit(f"{exists} bench users already exist; pass --reset to recreate")
+        started = time.perf_counter()
+        if args.reset:
+            await reset(conn)
+        timings["reset"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await _exec(
+            conn,
+            f"""
+            INSERT INTO users (id, username, handle, password_hash, online_status, created_at, updated_at)
+            SELECT gen_random_uuid(), 'Bench User ' || g, '{USER_PREFIX}' || g, :hash, 'offline', now(), now()
+            FROM generate_series(1, :n) g
+            """,
+            hash=get_password_hash(args.password),
+            n=args.users,
+        )
+        await _exec(conn, f"""
+            CREATE TEMP TABLE bu AS
+            SELECT substr(handle, {len(USER_PREFIX) + 1})::int AS idx, id FROM users WHERE handle LIKE '{USER_PREFIX}%'
+        """)
+        await _exec(conn, "CREATE UNIQUE INDEX ON bu (idx)")
+        timings["users"] = time.perf_counter() - started
+
+        # Чаты: каждый group_every-й — группа с размером из «тяжёлого хвоста», чат 1 — максимальная группа
+        started = time.perf_counter()
+        group_every = max(1, round(1 / args.group_ratio)) if args.group_ratio > 0 else 0
+        await _exec(
+            conn,
+            """
+            CREATE TEMP TABLE bc AS
+            SELECT g AS idx, gen_random_uuid() AS id, kind AS type,
+                   CASE WHEN g = 1 THEN :max_group
+                        WHEN kind = 'group' THEN 3 + floor(power(random(), 6) * greatest(:max_group - 3, 0))::int
+                        ELSE 2 END AS size
+            FROM generate_series(1, :n) g
+            CROSS JOIN LATERAL (
+                SELECT CASE WHEN g = 1 OR (:every > 0 AND g % :every = 0) THEN 'group' ELSE 'private' END AS kind
+            ) k
+            """,
+            n=args.chats,
+            max_group=min(args.max_group, args.users),
+            every=group_every,
+        )
+        # Участники: псевдослучайные пользователи без повторов внутри чата, ord — порядковый номер
+        await _exec(
+            conn,
+            """
+            CREATE TEMP TABLE bm AS
+            SELECT chat_idx, (row_number() OVER (PARTITION BY chat_idx ORDER BY user_idx) - 1)::int AS ord, user_id
+            FROM (
+                SELECT DISTINCT c.idx AS chat_idx, u.idx AS user_idx, u.id AS user_id
+                FROM bc c
+                CROSS JOIN LATERAL generate_series(0, c.size - 1) o
+                JOIN bu u ON u.idx = 1 + ((c.idx::bigint * 7919 + o::bigint * 104729) % :users)
+            ) s
+            """,
+            users=args.users,
+        )
+        await _exec(conn, "CREATE UNIQUE INDEX ON bm (chat_idx, ord)")
+        await _exec(conn, "UPDATE bc SET size = s.n FROM (SELECT chat_idx, count(*) AS n FROM bm GROUP BY chat_idx) s WHERE bc.idx = s.chat_idx")
+        await _exec(conn, "CREATE UNIQUE INDEX ON bc (idx)")
+        for table in ("bu", "bc", "bm"):
+            await _exec(conn, f"ANALYZE {table}")
+        await _exec(conn, f"""
+            INSERT INTO chats (id, type, name, created_at, updated_at, members_count)
+            SELECT id, type, '{CHAT_PREFIX}' || idx, now() - interval '{args.days} days', now() - interval '{args.days} days', size
+            FROM bc
+        """)
+        await _exec(conn, """
+            INSERT INTO chat_members (id, chat_id, user_id, role, joined_at)
+            SELECT gen_random_uuid(), c.id, m.user_id, CASE WHEN m.ord = 0 THEN 'admin' ELSE 'member' END,
+                   now() - make_interval(days => :days)
+            FROM bm m JOIN bc c ON c.idx = m.chat_idx
+        """, days=args.days)
+        timings["chats"] = time.perf_counter() - started
+
+        # Сообщения: время растёт с номером, чат — с перекосом к первым (горячим) чатам
+        started = time.perf_counter()
+        step_ms = args.days * 86400 * 1000 / max(args.messages, 1)
+        for lo in range(1, args.messages + 1, args.batch):
+            hi = min(lo + args.batch - 1, args.messages)
+            await _exec(
+                conn,
+                """
+                INSERT INTO messages (id, chat_id, user_id, content, type, created_at, updated_at)
+                SELECT gen_random_uuid(), c.id, m.user_id, w.content, 'text', s.ts, s.ts
+                FROM (
+                    SELECT g, 1 + floor(power(random(), 2) * :chats)::int AS chat_idx, random() AS r,
+                           now() - make_interval(days => :days) + make_interval(secs => g * CAST(:step_ms AS double precision) / 1000) AS ts
+                    FROM generate_series(CAST(:lo AS int), CAST(:hi AS int)) g
+                ) s
+                JOIN bc c ON c.idx = s.chat_idx
+                JOIN bm m ON m.chat_idx = s.chat_idx AND m.ord = floor(s.r * c.size)::int
+                CROSS JOIN LATERAL (
+                    SELECT string_agg(ws.words[1 + floor(random() * array_length(ws.words, 1))::int], ' ') AS content
+                    FROM generate_series(1, 3 + (s.g % 10)), (SELECT CAST(:words AS text[]) AS words) ws
+                ) w
+                """,
+                chats=args.chats,
+                days=args.days,
+                step_ms=step_ms,
+                lo=lo,
+                hi=hi,
+                words=WORDS,
+            )
+            print(json.dumps({"messages": hi, "elapsed_s": round(time.perf_counter() - started, 1)}), flush=True)
+        timings["messages"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        await _exec(conn, f"""
+            UPDATE chats c SET last_message_id = l.id, last_message_preview = left(l.content, {PREVIEW_MAX_LEN}),
+                   last_message_at = l.created_at, last_message_user_id = l.user_id, updated_at = l.created_at
+            FROM (
+                SELECT DISTINCT ON (chat_id) chat_id, id, content, created_at, user_id
+                FROM messages WHERE chat_id IN (SELECT id FROM bc)
+                ORDER BY chat_id, created_at DESC, id DESC
+            ) l
+            WHERE c.id = l.chat_id
+        """)
+        # Счётчики непрочитанных: у участников вся сгенерированная история непрочитана
+        await _exec(conn, """
+            UPDATE chats c SET message_seq = n.cnt
+            FROM (SELECT chat_id, count(*) AS cnt FROM messages WHERE chat_id IN (SELECT id FROM bc) GROUP BY chat_id) n
+            WHERE c.id = n.chat_id
+        """)
+        for table in ("users", "chats", "chat_members", "messages"):
+            await _exec(conn, f"ANALYZE {table}")
+        timings["summary"] = time.perf_counter() - started
+    await engine.dispose()
+    return {
+        "users": args.users,
+        "chats": args.chats,
+        "messages": args.messages,
+        "max_group": args.max_group,
+        "timings_s": {k: round(v, 2) for k, v in timings.items()},
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--chats", type=int, default=50_000)
+    parser.add_argument("--messages", type=int, default=10_000_000)
+    parser.add_argument("--max-group", type=int, default=5_000)
+    parser.add_argument("--group-ratio", type=float, default=0.1, help="доля групповых чатов")
+    parser.add_argument("--days", type=int, default=365, help="на сколько дней назад растянуть историю")
+    parser.add_argument("--batch", type=int, default=500_000, help="сообщений на транзакцию")
+    parser.add_argument("--password", default=DEFAULT_PASSWORD)
+    parser.add_argument("--reset", action="store_true", help="удалить прошлый набор bench_u*/bench-*")
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(seed(args))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Регистрация: гонка двух регистраций одного ника даёт 400, а не 500.
+
+Сессия БД подменяется: коммит новой строки падает с IntegrityError, как при
+срабатывании уникального индекса на users.handle.
+"""
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError
+
+from app.api.endpoints import auth
+from app.database import get_db
+from app.main import app
+
+
+class RacingSession:
+    """Проверка ника ничего не находит, а вставка упирается в уникальный индекс."""
+
+    def __init__(self) -> None:
+        self.added = []
+        self.rolled_back = False
+
+    async def execute(self, statement):
+        class Result:
+            def scalar_one_or_none(self):
+                return None
+        return Result()
+
+    def add(self, obj) -> None:
+        self.added.append(obj)
+
+    async def commit(self) -> None:
+        if self.added:
+            raise IntegrityError("INSERT INTO users", {}, Exception("duplicate key value violates unique constraint"))
+
+    async def rollback(self) -> None:
+        self.rolled_back = True
+
+
+def test_concurrent_registration_returns_400(monkeypatch):
+    session = RacingSession()
+
+    async def fake_db():
+        yield session
+
+    async def fake_hash(password: str) -> str:
+        return "hash"
+
+    monkeypatch.setattr(auth.password_hasher, "hash", fake_hash)
+    app.dependency_overrides[get_db] = fake_db
+    try:
+        response = TestClient(app).post("/api/auth/register", json={"username": "alice", "password": "secret123"})
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+    assert response.status_code == 400
+    assert response.json()["detail"] == auth.HANDLE_TAKEN_DETAIL
+    assert session.rolled_back
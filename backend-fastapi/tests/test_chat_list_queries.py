@@ -0,0 +1,83 @@
+"""Список чатов: число SQL-запросов не зависит от числа чатов (нет N+1).
+
+Нужна PostgreSQL со схемой на head (DATABASE_URL, как у приложения); без неё тест пропускается.
+Запросы считает app.query_debug.count_queries() через хуки app.metrics на движке.
+"""
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import delete, select
+
+from app.api.deps import Principal
+from app.api.endpoints.chats import list_chats
+from app.database import AsyncSessionLocal, engine
+from app.db_migrate import current_revision, head_revision
+from app.metrics import instrument_engine
+from app.models import Chat, ChatMember, User
+from app.query_debug import count_queries
+
+
+async def _seed(owner: User, count: int) -> list[User]:
+    """count чатов владельца: поровну личных (с отдельным собеседником) и групповых."""
+    peers = []
+    async with AsyncSessionLocal() as db:
+        for i in range(count):
+            chat = Chat(type="private" if i % 2 else "group", name=f"chat {i}", members_count=2)
+            peer = User(username=f"peer {i}", handle=f"t_{uuid.uuid4().hex[:20]}", password_hash="-")
+            peers.append(peer)
+            db.add_all([chat, peer])
+            await db.flush()
+            db.add_all([
+                ChatMember(chat_id=chat.id, user_id=owner.id, role="admin"),
+                ChatMember(chat_id=chat.id, user_id=peer.id),
+            ])
+        await db.commit()
+    return peers
+
+
+async def _count_list_queries(owner: User) -> tuple[int, int]:
+    async with AsyncSessionLocal() as db:
+        with count_queries() as stats:
+            chats = await list_chats(skip=0, limit=100, db=db, current_user=Principal(id=owner.id))
+    return stats.queries, len(chats)
+
+
+async def _cleanup(users: list[User]) -> None:
+    ids = [u.id for u in users]
+    async with AsyncSessionLocal() as db:
+        chat_ids = select(ChatMember.chat_id).where(ChatMember.user_id.in_(ids))
+        await db.execute(delete(Chat).where(Chat.id.in_(chat_ids)))
+        await db.execute(delete(User).where(User.id.in_(ids)))
+        await db.commit()
+
+
+async def _run() -> list[tuple[int, int]]:
+    try:
+        revision = await current_revision(engine)
+    except Exception as e:
+        pytest.skip(f"PostgreSQL недоступна: {e}")
+    if revision != head_revision():
+        pytest.skip(f"схема {revision} != head {head_revision()}")
+    instrument_engine(engine)
+    owner = User(username="owner", handle=f"t_{uuid.uuid4().hex[:20]}", password_hash="-")
+    async with AsyncSessionLocal() as db:
+        db.add(owner)
+        await db.commit()
+    users = [owner]
+    try:
+        results, seeded = [], 0
+        for total in (2, 20):
+            users += await _seed(owner, total - seeded)
+            seeded = total
+            results.append(await _count_list_queries(owner))
+        return results
+    finally:
+        await _cleanup(users)
+        await engine.dispose()
+
+
+def test_list_chats_query_count_is_constant():
+    (few_queries, few), (many_queries, many) = asyncio.run(_run())
+    assert (few, many) == (2, 20)
+    assert many_queries == few_queries
@@ -0,0 +1,149 @@
+"""Прямая загрузка presign -> PUT -> complete и отказы: чужая квитанция, другие байты, лишний размер.
+
+Хранилища — LocalStorage во временном каталоге и S3Storage на moto (пакет из
+tests/requirements.txt) или на настоящем S3/MinIO из TEST_S3_ENDPOINT. БД подменена:
+reserve только вычисляет ключ блоба, коммит ничего не делает.
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+from app import blob_store
+from app.api.deps import Principal, get_current_principal
+from app.api.endpoints import upload
+from app.database import get_db
+from app.main import app
+from app.storage import LocalStorage, S3Storage
+
+DATA = b"direct upload payload"
+SHA = hashlib.sha256(DATA).hexdigest()
+USER = uuid.uuid4()
+
+
+class NoDb:
+    async def commit(self) -> None:
+        pass
+
+
+@pytest.fixture(params=["local", "s3"])
+def storage(request, tmp_path):
+    if request.param == "local":
+        yield LocalStorage(tmp_path, "test-secret")
+        return
+    endpoint = os.environ.get("TEST_S3_ENDPOINT")
+    server = None
+    if not endpoint:
+        moto_server = pytest.importorskip("moto.server")
+        server = moto_server.ThreadedMotoServer(port=0, verbose=False)
+        server.start()
+        host, port = server.get_host_and_port()
+        endpoint = f"http://{host}:{port}"
+    s3 = S3Storage(
+        # moto хранит состояние на процесс: у каждого теста свой бакет
+        os.environ.get("TEST_S3_BUCKET", f"uploads-{uuid.uuid4().hex[:12]}"),
+        endpoint_url=endpoint,
+        access_key=os.environ.get("TEST_S3_ACCESS_KEY", "test"),
+        secret_key=os.environ.get("TEST_S3_SECRET_KEY", "test"),
+        temp_dir=tmp_path,
+    )
+    try:
+        s3._client.create_bucket(Bucket=s3.bucket)
+    except s3._client.exceptions.ClientError:
+        pass  # бакет уже есть (TEST_S3_ENDPOINT)
+    yield s3
+    if server is not None:
+        server.stop()
+
+
+@pytest.fixture
+def client(storage, monkeypatch):
+    async def no_db():
+        yield NoDb()
+
+    async def reserve(db, sha256, size, ext, content_type):
+        return blob_store.blob_key(sha256, ext)
+
+    monkeypatch.setattr(upload, "storage", storage)
+    monkeypatch.setattr(blob_store, "reserve", reserve)
+    monkeypatch.setattr(upload.image_pipeline, "schedule", lambda key: None)
+    app.dependency_overrides[get_db] = no_db
+    app.dependency_overrides[get_current_principal] = lambda: Principal(id=USER)
+    yield TestClient(app)
+    app.dependency_overrides.pop(get_db, None)
+    app.dependency_overrides.pop(get_current_principal, None)
+
+
+def _presign(client, size=len(DATA), sha256=SHA):
+    response = client.post("/api/upload/presign", json={"filename": "note.txt", "size": size, "sha256": sha256})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _put(client, presigned, content: bytes) -> int:
+    upload_ = presigned["upload"]
+    if upload_["url"].startswith("http"):
+        return httpx.put(upload_["url"], content=content, headers=upload_["headers"]).status_code
+    return client.put(upload_["url"], content=content, headers=upload_["headers"]).status_code
+
+
+def _complete(client, presigned, sha256=SHA):
+    return client.post(
+        "/api/upload/complete", json={"filename": "note.txt", "sha256": sha256, "upload_id": presigned["upload_id"]}
+    )
+
+
+def _exists(storage, key) -> bool:
+    return asyncio.run(storage.exists(key))
+
+
+def _incoming_key(presigned) -> str:
+    return f"incoming/{presigned['upload_id'].split(':')[0]}"
+
+
+def test_presign_put_complete(client, storage):
+    presigned = _presign(client)
+    assert "file" not in presigned  # готовый файл по одному хэшу не выдаётся
+    assert _complete(client, presigned).status_code == 409  # байтов ещё нет
+    assert _put(client, presigned, DATA) == 200
+    response = _complete(client, presigned)
+    assert response.status_code == 200, response.text
+    assert blob_store.resolve_key(response.json()["url"].removeprefix("/api/uploads/")) == blob_store.blob_key(SHA, ".txt")
+    assert _exists(storage, blob_store.blob_key(SHA, ".txt"))
+    assert not _exists(storage, _incoming_key(presigned))
+
+
+def test_complete_rejects_foreign_and_forged_tickets(client):
+    presigned = _presign(client)
+    assert _put(client, presigned, DATA) == 200
+    app.dependency_overrides[get_current_principal] = lambda: Principal(id=uuid.uuid4())
+    assert _complete(client, presigned).status_code == 404
+    app.dependency_overrides[get_current_principal] = lambda: Principal(id=USER)
+    nonce, size, ext, expires, signature = presigned["upload_id"].split(":")
+    forged = {**presigned, "upload_id": ":".join((nonce, "1", ext, expires, signature))}
+    assert _complete(client, forged).status_code == 404
+    assert _complete(client, presigned, sha256="0" * 64).status_code == 404
+
+
+def test_presign_rejects_oversize(client):
+    too_big = upload.settings.upload_max_file_mb * upload.MB + 1
+    response = client.post("/api/upload/presign", json={"filename": "big.bin", "size": too_big, "sha256": SHA})
+    assert response.status_code == 413
+
+
+@pytest.mark.parametrize("tamper", [bytes.upper, lambda data: data + b"!!"], ids=["checksum", "oversize"])
+def test_mismatched_bytes_never_become_a_blob(client, storage, tamper):
+    data = f"payload {uuid.uuid4()}".encode()  # своё содержимое: блоб не мог остаться от других тестов
+    sha256 = hashlib.sha256(data).hexdigest()
+    presigned = _presign(client, len(data), sha256)
+    put_status = _put(client, presigned, tamper(data))
+    response = _complete(client, presigned, sha256)
+    # Хранилище отвергает PUT (S3, локальный приём) — или complete не принимает объект при сверке
+    assert put_status != 200 or response.status_code == 400
+    assert response.status_code in (400, 409)
+    assert not _exists(storage, blob_store.blob_key(sha256, ".txt"))
+    assert not _exists(storage, _incoming_key(presigned))
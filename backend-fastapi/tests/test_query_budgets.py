@@ -0,0 +1,83 @@
+"""Бюджеты SQL-запросов из app.query_debug.QUERY_BUDGETS — для каждого объявленного эндпоинта.
+
+Запросы идут через HTTP-клиент с QUERY_DEBUG: число берётся из X-Query-Count.
+Нужна PostgreSQL (DATABASE_URL, как у приложения); без неё тест пропускается.
+"""
+import asyncio
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import delete
+
+from app.core.config import settings
+from app.database import AsyncSessionLocal, engine
+from app.db_migrate import current_revision
+from app.main import app
+from app.models import Chat, User
+from app.query_debug import QUERY_BUDGETS
+
+
+async def _db_available() -> bool:
+    try:
+        await current_revision(engine)
+        return True
+    except Exception:
+        return False
+    finally:
+        await engine.dispose()
+
+
+async def _cleanup(user_ids: list[str], chat_ids: list[str]) -> None:
+    user_ids, chat_ids = [uuid.UUID(i) for i in user_ids], [uuid.UUID(i) for i in chat_ids]
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(Chat).where(Chat.id.in_(chat_ids)))
+        await db.execute(delete(User).where(User.id.in_(user_ids)))
+        await db.commit()
+
+
+def _register(client: TestClient, handle: str) -> tuple[str, dict]:
+    response = client.post("/api/auth/register", json={"username": handle, "password": "budget-test"})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    return body["user"]["id"], {"Authorization": f"Bearer {body['access_token']}"}
+
+
+def test_endpoints_stay_within_query_budgets(monkeypatch):
+    if not asyncio.run(_db_available()):
+        pytest.skip("PostgreSQL недоступна")
+    monkeypatch.setattr(settings, "query_debug", True)
+    prefix = f"qb{uuid.uuid4().hex[:8]}"
+    measured: dict[tuple[str, str], int] = {}
+    user_ids, chat_ids = [], []
+
+    with TestClient(app) as client:
+        def call(method: str, route: str, url: str, **kwargs):
+            response = client.request(method, url, **kwargs)
+            assert response.status_code == 200, (method, url, response.text)
+            measured[(method, route)] = int(response.headers["x-query-count"])
+            return response.json()
+
+        try:
+            alice_id, alice = _register(client, f"{prefix}_alice")
+            user_ids.append(alice_id)
+            bob_id, _ = _register(client, f"{prefix}_bob")
+            user_ids.append(bob_id)
+            chat = call("POST", "/api/chats", "/api/chats", json={"type": "private", "member_ids": [bob_id]}, headers=alice)
+            chat_ids.append(chat["id"])
+            for i in range(3):
+                call(
+                    "POST", "/api/messages/chat/{chat_id}", f"/api/messages/chat/{chat['id']}",
+                    json={"content": f"budget check message {i}"}, headers=alice,
+                )
+            call("GET", "/api/chats", "/api/chats", headers=alice)
+            call("GET", "/api/chats/{chat_id}", f"/api/chats/{chat['id']}", headers=alice)
+            call("GET", "/api/messages/chat/{chat_id}", f"/api/messages/chat/{chat['id']}", headers=alice)
+            call("GET", "/api/messages/search", "/api/messages/search", params={"q": "budget check"}, headers=alice)
+            call("GET", "/api/users/list", "/api/users/list", params={"search": prefix}, headers=alice)
+        finally:
+            client.portal.call(_cleanup, user_ids, chat_ids)
+
+    assert set(measured) == set(QUERY_BUDGETS), "у каждого бюджета должен быть замер"
+    over = {key: (count, QUERY_BUDGETS[key]) for key, count in measured.items() if count > QUERY_BUDGETS[key]}
+    assert not over, f"превышен бюджет (запросов, бюджет): {over}"
@@ -0,0 +1,59 @@
+"""Публичные URL загрузок: блобы, варианты и незавершённые загрузки — только по токену.
+
+Хранилище — LocalStorage во временном каталоге; БД не нужна.
+"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app import blob_store
+from app.api.endpoints import upload
+from app.main import app
+from app.storage import LocalStorage
+
+SHA = "ab" * 32
+BLOB = f"blobs/ab/{SHA}.txt"
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    storage = LocalStorage(tmp_path, "test-secret")
+    monkeypatch.setattr(upload, "storage", storage)
+    for key in (BLOB, f"variants/thumb/blobs/ab/{SHA}.webp", "incoming/0123abcd", "legacy.txt"):
+        (tmp_path / key).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / key).write_bytes(b"secret")
+    return TestClient(app)
+
+
+def test_blob_served_with_token(client):
+    assert client.get(f"/api/uploads/{blob_store.public_key(BLOB)}").status_code == 200
+    assert client.get(f"/api/upload/download/{blob_store.public_key(BLOB)}").status_code == 200
+
+
+def test_legacy_key_served_as_is(client):
+    assert client.get("/api/uploads/legacy.txt").status_code == 200
+
+
+@pytest.mark.parametrize("key", [
+    BLOB,
+    f"%2E/{BLOB}",
+    f"%2E/%2E/{BLOB}",
+    f"%2F{BLOB}",
+    f"%2F%2F{BLOB}",
+    f"x/%2E%2E/{BLOB}",
+    f"0123456789abcdef-{'0' * 32}/{BLOB}",
+    f"variants/thumb/blobs/ab/{SHA}.webp",
+    f"%2E/variants/thumb/blobs/ab/{SHA}.webp",
+    "incoming/0123abcd",
+    "%2E/incoming/0123abcd",
+    "%2F%2Fincoming/0123abcd",
+])
+def test_private_keys_not_served(client, key):
+    for prefix in ("/api/uploads/", "/api/upload/download/", "/api/upload/variants/thumb/"):
+        response = client.get(prefix + key)
+        assert response.status_code in (400, 404), (prefix + key, response.status_code)
+        assert response.content != b"secret"
+
+
+@pytest.mark.parametrize("key", [BLOB, "./" + BLOB, "//" + BLOB, "a//b", "a/./b", "a/../b", "a\\b", ""])
+def test_resolve_key_rejects_bare_and_non_canonical(key):
+    assert blob_store.resolve_key(key) is None
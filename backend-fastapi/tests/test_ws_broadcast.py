@@ -0,0 +1,62 @@
+"""RedisBroadcastBackend: рассылка между узлами через pub/sub.
+
+Два бэкенда — два узла на одном Redis: fakeredis (пакет из tests/requirements.txt)
+или настоящий сервер из TEST_REDIS_URL. Без них тест пропускается.
+"""
+import asyncio
+import os
+
+import pytest
+
+from app.ws_broadcast import RedisBroadcastBackend
+
+
+def _fake_clients(count: int):
+    fakeredis = pytest.importorskip("fakeredis")
+    server = fakeredis.FakeServer()
+    return [fakeredis.aioredis.FakeRedis(server=server) for _ in range(count)]
+
+
+def _real_clients(count: int):
+    url = os.environ.get("TEST_REDIS_URL")
+    if not url:
+        pytest.skip("TEST_REDIS_URL не задан")
+    from redis import asyncio as aioredis
+    return [aioredis.from_url(url) for _ in range(count)]
+
+
+async def _until(predicate, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            return
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.parametrize("make_clients", [_fake_clients, _real_clients], ids=["fakeredis", "redis"])
+def test_fanout_between_nodes(make_clients):
+    clients = make_clients(2)
+
+    async def run():
+        received = {"a": [], "b": []}
+        channel = f"test:ws:{os.getpid()}"
+        nodes = {name: RedisBroadcastBackend(channel=channel, client=client) for name, client in zip(received, clients)}
+        for name, node in nodes.items():
+            async def deliver(kind, room, text, name=name):
+                received[name].append((kind, room, text))
+            await node.start(deliver)
+        try:
+            await nodes["a"].publish("chat", "c1", '{"n": 1}')
+            await nodes["b"].publish("user", "u1", '{"n": 2}')
+            await _until(lambda: len(received["a"]) >= 2 and len(received["b"]) >= 2)
+            await asyncio.sleep(0.1)  # своё сообщение из подписки не должно прийти второй раз
+        finally:
+            for node in nodes.values():
+                await node.stop()
+        return received
+
+    received = asyncio.run(run())
+    # Каждый узел получает каждое событие ровно один раз: своё — локально, чужое — из подписки
+    expected = sorted([("chat", "c1", '{"n": 1}'), ("user", "u1", '{"n": 2}')])
+    assert sorted(received["a"]) == expected
+    assert sorted(received["b"]) == expected
@@ -0,0 +1,52 @@
+"""Очереди исходящих ConnectionManager: ответы одному сокету и политика disconnect."""
+import asyncio
+
+from app.ws_manager import ConnectionManager
+
+
+class FakeSocket:
+    def __init__(self) -> None:
+        self.sent: list[str] = []
+        self.closed: int | None = None
+
+    async def send_text(self, text: str) -> None:
+        self.sent.append(text)
+
+    async def close(self, code: int) -> None:
+        self.closed = code
+
+
+def test_send_to_goes_through_outbox():
+    async def run():
+        manager, ws = ConnectionManager(), FakeSocket()
+        manager.join_user(ws, "u1")
+        manager.send_to(ws, {"type": "error", "detail": "overloaded"})
+        await asyncio.sleep(0.01)
+        manager.disconnect(ws)
+        return ws.sent
+
+    assert asyncio.run(run()) == ['{"type": "error", "detail": "overloaded"}']
+
+
+def test_send_to_disconnected_socket_starts_no_writer():
+    async def run():
+        manager, ws = ConnectionManager(), FakeSocket()
+        manager.join_user(ws, "u1")
+        manager.disconnect(ws)
+        manager.send_to(ws, {"type": "error"})
+        return manager._outboxes, ws.sent
+
+    assert asyncio.run(run()) == ({}, [])
+
+
+def test_disconnect_policy_closes_slow_socket():
+    async def run():
+        manager, ws = ConnectionManager(queue_size=1, slow_consumer_policy="disconnect"), FakeSocket()
+        manager.join_user(ws, "u1")
+        manager.send_to(ws, {"n": 1})
+        manager.send_to(ws, {"n": 2})  # очередь полна, писатель ещё не успел
+        pending = len(manager._background)
+        await asyncio.sleep(0.01)
+        return pending, ws.closed, manager._background, manager.stats()["connections"]
+
+    assert asyncio.run(run()) == (1, 1013, set(), 0)
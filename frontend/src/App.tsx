@@ -9,6 +9,7 @@ import { ChatList } from '@/components/Chat/ChatList';
 import { ChatWindow } from '@/components/Chat/ChatWindow';
 import { Settings } from '@/components/Settings/Settings';
 import { Loader } from '@/components/Common/Loader';
+import type { Chat, ChatReadState, ChatsUpdatedDelta } from '@/types/chat';
 
 const queryClient = new QueryClient();
 
@@ -37,10 +38,43 @@ function ChatLayout() {
 
   useEffect(() => {
     if (!socket) return;
-    const handler = () => qc.invalidateQueries({ queryKey: ['chats'] });
+    // Сервер присылает дельту по изменившимся чатам; если какого-то чата нет в кэше — перечитываем список
+    const handler = (payload?: { chats?: ChatsUpdatedDelta[] | null }) => {
+      const deltas = payload?.chats;
+      const cached = qc.getQueryData<Chat[]>(['chats']);
+      if (!deltas || !cached || deltas.some((d) => !cached.some((c) => c.id === d.chat_id))) {
+        qc.invalidateQueries({ queryKey: ['chats'] });
+        return;
+      }
+      const byId = new Map(deltas.map((d) => [d.chat_id, d]));
+      const next = cached.map((c) => {
+        const d = byId.get(c.id);
+        if (!d) return c;
+        // Открытый чат отмечается прочитанным в ChatWindow — счётчик не растёт
+        const unread = c.id === selectedChatId ? 0 : (c.unread_count ?? 0) + (d.new_messages ?? 0);
+        return { ...c, last_message: d.last_message, unread_count: unread };
+      });
+      const activity = (c: Chat) => c.last_message?.created_at ?? '';
+      next.sort((a, b) => (activity(a) < activity(b) ? 1 : activity(a) > activity(b) ? -1 : 0));
+      qc.setQueryData<Chat[]>(['chats'], next);
+    };
+    // Чат прочитан на этом или другом устройстве — счётчик приходит готовым
+    const handleRead = (state: ChatReadState) => {
+      qc.setQueryData<Chat[]>(['chats'], (old) =>
+        old?.map((c) =>
+          c.id === state.chat_id
+            ? { ...c, unread_count: state.unread_count, last_read_message_id: state.last_read_message_id }
+            : c
+        )
+      );
+    };
     socket.on('chats_updated', handler);
-    return () => socket.off('chats_updated', handler);
-  }, [socket, qc]);
+    socket.on('chat_read', handleRead);
+    return () => {
+      socket.off('chats_updated', handler);
+      socket.off('chat_read', handleRead);
+    };
+  }, [socket, qc, selectedChatId]);
 
   return (
     <div className="flex h-[100dvh] max-h-screen w-full overflow-hidden bg-gray-200 md:h-screen">
@@ -256,11 +256,18 @@ export function ChatList({ selectedChatId, onSelectChat }: ChatListProps) {
                             </p>
                           )}
                         </div>
-                        {chat.last_message && (
-                          <span className="text-xs text-gray-500">
-                            {formatMessageDate(chat.last_message.created_at)}
-                          </span>
-                        )}
+                        <div className="flex shrink-0 flex-col items-end gap-1">
+                          {chat.last_message && (
+                            <span className="text-xs text-gray-500">
+                              {formatMessageDate(chat.last_message.created_at)}
+                            </span>
+                          )}
+                          {!!chat.unread_count && chat.id !== selectedChatId && (
+                            <span className="min-w-[1.25rem] rounded-full bg-green-600 px-1.5 text-center text-xs font-semibold leading-5 text-white">
+                              {chat.unread_count > 999 ? '999+' : chat.unread_count}
+                            </span>
+                          )}
+                        </div>
                       </button>
                       {chat.type === 'group' && (
                         <button
@@ -20,7 +20,7 @@ import { MessageBubble } from './MessageBubble';
 import { MessageInput } from './MessageInput';
 import { Loader } from '@/components/Common/Loader';
 import { Avatar } from '@/components/Common/Avatar';
-import type { Chat, Message } from '@/types/chat';
+import type { Chat, Message, ReadReceipts } from '@/types/chat';
 import type { User } from '@/types/user';
 
 interface ChatWindowProps {
@@ -30,7 +30,7 @@ interface ChatWindowProps {
 
 export function ChatWindow({ chatId, onBack }: ChatWindowProps) {
   const { user } = useAuth();
-  const { socket, connected } = useSocket();
+  const { socket, connected, markRead } = useSocket();
   const qc = useQueryClient();
   const { data: chat } = useChat(chatId);
   const { data: messages, isLoading } = useMessages(chatId);
@@ -41,6 +41,7 @@ export function ChatWindow({ chatId, onBack }: ChatWindowProps) {
   const [addMembersOpen, setAddMembersOpen] = useState(false);
   const [addMembersSearch, setAddMembersSearch] = useState('');
   const [addMembersSelected, setAddMembersSelected] = useState<User[]>([]);
+  const [peersReadAt, setPeersReadAt] = useState<string | null>(null);
   const bottomRef = useRef<HTMLDivElement>(null);
 
   const { data: addMembersUsers } = useUsersList(addMembersSearch);
@@ -57,6 +58,41 @@ export function ChatWindow({ chatId, onBack }: ChatWindowProps) {
     bottomRef.current?.scrollIntoView({ behavior: 'smooth' });
   }, [sortedMessages]);
 
+  // Открытый чат прочитан до последнего чужого сообщения; свои сообщения счётчик не увеличивают
+  const lastMessage = sortedMessages.length ? sortedMessages[sortedMessages.length - 1] : null;
+  const lastIncomingId =
+    lastMessage && lastMessage.user_id !== user?.id && !lastMessage.id.startsWith(TEMP_ID_PREFIX) ? lastMessage.id : null;
+  useEffect(() => {
+    if (!chatId || !lastIncomingId) return;
+    markRead(chatId, lastIncomingId);
+    qc.setQueryData<Chat[]>(['chats'], (old) => old?.map((c) => (c.id === chatId ? { ...c, unread_count: 0 } : c)));
+  }, [chatId, lastIncomingId, markRead, qc]);
+
+  // Отметки «прочитано»: начальное значение — из GET /api/chats/{id}, дальше — из read_receipts
+  useEffect(() => {
+    setPeersReadAt(chat?.peers_last_read_at ?? null);
+  }, [chatId, chat?.peers_last_read_at]);
+
+  useEffect(() => {
+    if (!chatId || !socket || !user?.id) return;
+    const currentUserId = user.id;
+    const handler = (payload: ReadReceipts) => {
+      if (payload.chat_id !== chatId) return;
+      const times = payload.receipts
+        .filter((r) => r.user_id !== currentUserId && r.last_read_at)
+        .map((r) => r.last_read_at as string);
+      if (!times.length) return;
+      setPeersReadAt((prev) =>
+        [prev, ...times].reduce<string | null>(
+          (max, t) => (t && (!max || new Date(t).getTime() > new Date(max).getTime()) ? t : max),
+          null
+        )
+      );
+    };
+    socket.on('read_receipts', handler);
+    return () => socket.off('read_receipts', handler);
+  }, [chatId, socket, user?.id]);
+
   useEffect(() => {
     if (!chatId || !socket || !user?.id) return;
     const currentUserId = user.id;
@@ -302,6 +338,7 @@ export function ChatWindow({ chatId, onBack }: ChatWindowProps) {
             key={msg.id}
             message={msg}
             isOwn={msg.user_id === user?.id}
+            isRead={!!peersReadAt && new Date(msg.created_at).getTime() <= new Date(peersReadAt).getTime()}
             showAuthor={sortedMessages.some((m) => m.user_id !== msg.user_id)}
             onSaveEdit={(messageId, content) =>
               updateMessage.mutate({ messageId, content })
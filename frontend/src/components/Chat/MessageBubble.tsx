@@ -1,6 +1,7 @@
 import { useEffect, useRef, useState } from 'react';
 import { formatMessageDate } from '@/utils/dateFormatter';
 import type { Message } from '@/types/chat';
+import { TEMP_ID_PREFIX } from '@/hooks/useChat';
 
 const URL_REGEX = /(https?:\/\/[^\s<>]+)/g;
 
@@ -46,6 +47,8 @@ function linkify(text: string, isOwn: boolean): (string | React.ReactElement)[]
 interface MessageBubbleProps {
   message: Message;
   isOwn: boolean;
+  /** Своё сообщение прочитано кем-то из собеседников */
+  isRead?: boolean;
   showAuthor?: boolean;
   onSaveEdit?: (messageId: string, content: string | null) => void;
   onDelete?: (messageId: string) => void;
@@ -84,6 +87,7 @@ async function downloadInBackground(
 export function MessageBubble({
   message,
   isOwn,
+  isRead,
   showAuthor,
   onSaveEdit,
   onDelete,
@@ -225,9 +229,11 @@ export function MessageBubble({
               const isImage = (a.type || '').startsWith('image/');
               const origin = typeof window !== 'undefined' ? window.location.origin : '';
               const src = a.url.startsWith('http') ? a.url : `${origin}${a.url}`;
+              // В ленте — уменьшенная копия, по клику открывается оригинал
+              const preview = a.medium_url ? (a.medium_url.startsWith('http') ? a.medium_url : `${origin}${a.medium_url}`) : src;
               const storedName = a.url.replace(/^.*\/api\/uploads\//, '') || '';
               const downloadUrl = storedName
-                ? `${origin}/api/upload/download/${encodeURIComponent(storedName)}${a.filename ? `?filename=${encodeURIComponent(a.filename)}` : ''}`
+                ? `${origin}/api/upload/download/${storedName.split('/').map(encodeURIComponent).join('/')}${a.filename ? `?filename=${encodeURIComponent(a.filename)}` : ''}`
                 : src;
               const handleDownload = (e: React.MouseEvent) => {
                 e.preventDefault();
@@ -243,7 +249,8 @@ export function MessageBubble({
                 <div key={a.id} className="space-y-1">
                   <a href={src} target="_blank" rel="noopener noreferrer" className="block max-w-full">
                     <img
-                      src={src}
+                      src={preview}
+                      loading="lazy"
                       alt={a.filename || 'Фото'}
                       className="max-h-64 rounded-lg object-contain"
                     />
@@ -278,6 +285,9 @@ export function MessageBubble({
           {message.updated_at && new Date(message.updated_at).getTime() > new Date(message.created_at).getTime() && (
             <span className="ml-1 opacity-80">(ред.)</span>
           )}
+          {isOwn && !message.id.startsWith(TEMP_ID_PREFIX) && (
+            <span className="ml-1" title={isRead ? 'Прочитано' : 'Доставлено'}>{isRead ? '✓✓' : '✓'}</span>
+          )}
         </p>
       </div>
     </div>
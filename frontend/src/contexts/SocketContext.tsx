@@ -1,12 +1,15 @@
 import React, { createContext, useCallback, useContext, useEffect, useState } from 'react';
 import { useAuth } from './AuthContext';
 import { getSocket, connectSocket, disconnectSocket } from '@/services/socket';
+import { api } from '@/services/api';
 
 interface SocketContextValue {
   socket: ReturnType<typeof getSocket>;
   connected: boolean;
   joinChat: (chatId: string) => void;
   leaveChat: (chatId: string) => void;
+  /** Сдвинуть курсор прочтения (без messageId — до последнего сообщения): по сокету, без него — REST */
+  markRead: (chatId: string, messageId?: string) => void;
 }
 
 const SocketContext = createContext<SocketContextValue | null>(null);
@@ -57,7 +60,16 @@ export function SocketProvider({ children }: { children: React.ReactNode }) {
     getSocket()?.emit('leave_chat', { chat_id: chatId });
   }, []);
 
-  const value: SocketContextValue = { socket, connected, joinChat, leaveChat };
+  const markRead = useCallback((chatId: string, messageId?: string) => {
+    const s = getSocket();
+    if (s?.connected) {
+      s.emit('mark_read', messageId ? { chat_id: chatId, message_id: messageId } : { chat_id: chatId });
+      return;
+    }
+    api.post(`/api/chats/${chatId}/read`, messageId ? { message_id: messageId } : undefined).catch(() => {});
+  }, []);
+
+  const value: SocketContextValue = { socket, connected, joinChat, leaveChat, markRead };
   return <SocketContext.Provider value={value}>{children}</SocketContext.Provider>;
 }
 
@@ -24,6 +24,28 @@ async function handleResponse<T>(res: Response): Promise<T> {
   return res.json();
 }
 
+type UploadedFile = { url: string; type?: string; filename?: string };
+
+async function sha256Hex(buffer: ArrayBuffer): Promise<string> {
+  const digest = await crypto.subtle.digest('SHA-256', buffer);
+  return Array.from(new Uint8Array(digest), (b) => b.toString(16).padStart(2, '0')).join('');
+}
+
+/** Прямая загрузка: API выдаёт presigned PUT во временный ключ и upload_id, complete превращает его в файл. */
+async function uploadDirect(file: File): Promise<UploadedFile> {
+  const buffer = await file.arrayBuffer();
+  const sha256 = await sha256Hex(buffer);
+  const filename = file.name || 'file';
+  const presigned = await api.post<{
+    upload: { method: string; url: string; headers: Record<string, string> };
+    upload_id: string;
+  }>('/api/upload/presign', { filename, size: file.size, sha256 });
+  const { method, url, headers } = presigned.upload;
+  const put = await fetch(url.startsWith('http') ? url : `${BASE}${url}`, { method, headers, body: buffer });
+  if (!put.ok) throw new Error(`Загрузка не удалась: ${put.status}`);
+  return api.post<UploadedFile>('/api/upload/complete', { filename, sha256, upload_id: presigned.upload_id });
+}
+
 export const api = {
   async get<T>(path: string): Promise<T> {
     const res = await fetch(`${BASE}${path}`, { headers: getHeaders() });
@@ -38,8 +60,14 @@ export const api = {
     return handleResponse<T>(res);
   },
   /** Загрузка файлов: возвращает { files: [{ url, type, filename }] }.
-   * Сначала пробуем через Blob (надёжнее на мобилке), при ошибке — отправка File как есть. */
+   * Сначала — прямая загрузка в хранилище (presign → PUT → complete), затем multipart через API:
+   * через Blob (надёжнее на мобилке), при ошибке — отправка File как есть. */
   async uploadFiles(files: File[]): Promise<{ files: { url: string; type?: string; filename?: string }[] }> {
+    try {
+      return { files: await Promise.all(files.map((f) => uploadDirect(f))) };
+    } catch {
+      // нет crypto.subtle (не https), хранилище недоступно из браузера и т. п.
+    }
     const safeName = (name: string) => {
       const ext = name.includes('.') ? name.slice(name.lastIndexOf('.')) : '';
       const base = name.slice(0, name.lastIndexOf('.') || name.length).replace(/[^\w\s\-\.]/g, '_').slice(0, 80);
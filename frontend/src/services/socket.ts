@@ -101,7 +101,9 @@ function connectSocket(tokenOrUndefined?: string | null): SocketLike {
       if (type === 'new_message' && data.message != null) {
         emitEvent('new_message', data.message);
       } else if (type === 'chats_updated') {
-        emitEvent('chats_updated', {});
+        emitEvent('chats_updated', { chats: Array.isArray(data.chats) ? data.chats : null });
+      } else if (type === 'chat_read' || type === 'read_receipts') {
+        emitEvent(type, data);
       }
     } catch {}
   };
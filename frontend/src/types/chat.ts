@@ -19,6 +19,33 @@ export interface Chat {
     content: string | null;
     created_at: string;
   } | null;
+  /** Непрочитанные сообщения текущего пользователя */
+  unread_count?: number;
+  last_read_message_id?: string | null;
+  /** Только в GET /api/chats/{id}: докуда дочитали остальные участники */
+  peers_last_read_at?: string | null;
+}
+
+/** Элемент дельты из WS-события chats_updated */
+export interface ChatsUpdatedDelta {
+  chat_id: string;
+  last_message: Chat['last_message'];
+  /** Новых чужих сообщений за окно — прибавляется к unread_count */
+  new_messages?: number;
+}
+
+/** Состояние прочтения: ответ POST /api/chats/{id}/read и WS-событие chat_read */
+export interface ChatReadState {
+  chat_id: string;
+  last_read_message_id: string | null;
+  last_read_at: string | null;
+  unread_count: number;
+}
+
+/** WS-событие read_receipts: сдвинувшиеся курсоры участников чата */
+export interface ReadReceipts {
+  chat_id: string;
+  receipts: { user_id: string; last_read_message_id: string | null; last_read_at: string | null }[];
 }
 
 export interface Message {
@@ -30,7 +57,7 @@ export interface Message {
   created_at: string;
   updated_at?: string | null;
   sender_name?: string | null;
-  attachments?: { id: string; url: string; type?: string; filename?: string }[];
+  attachments?: { id: string; url: string; type?: string; filename?: string; thumb_url?: string | null; medium_url?: string | null }[];
 }
 
 export interface Attachment {
@@ -38,4 +65,7 @@ export interface Attachment {
   url: string;
   type?: string;
   filename?: string;
+  /** Уменьшенные WebP-копии картинки (thumb — до 320px, medium — до 1280px) */
+  thumb_url?: string | null;
+  medium_url?: string | null;
 }
@@ -5,7 +5,7 @@ export interface Message {
   content: string | null;
   type: string;
   created_at: string;
-  attachments?: { id: string; url: string; type?: string; filename?: string }[];
+  attachments?: { id: string; url: string; type?: string; filename?: string; thumb_url?: string | null; medium_url?: string | null }[];
 }
 
 export interface SendMessagePayload {
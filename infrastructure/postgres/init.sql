@@ -3,13 +3,15 @@
 
 -- Enable UUID extension
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+-- Trigram indexes for partial-match search
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Users (username = имя, handle = уникальный ID для поиска @handle)
 CREATE TABLE IF NOT EXISTS users (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     username VARCHAR(50) NOT NULL,
     handle VARCHAR(50) UNIQUE NOT NULL,
-    email VARCHAR(255) UNIQUE NOT NULL,
+    email VARCHAR(255) UNIQUE,
     password_hash VARCHAR(255) NOT NULL,
     avatar VARCHAR(500),
     online_status VARCHAR(20) DEFAULT 'offline',
@@ -17,15 +19,31 @@ CREATE TABLE IF NOT EXISTS users (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+-- People search: handle prefix + trigram substring/fuzzy
+CREATE INDEX idx_users_handle_prefix ON users(handle varchar_pattern_ops);
+CREATE INDEX idx_users_handle_trgm ON users USING gin(handle gin_trgm_ops);
+CREATE INDEX idx_users_username_trgm ON users USING gin(username gin_trgm_ops);
+
 -- Chats (type: 'private' | 'group')
 CREATE TABLE IF NOT EXISTS chats (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     type VARCHAR(20) NOT NULL DEFAULT 'private',
     name VARCHAR(255),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    -- Сводка для списка чатов (обновляется приложением вместе с сообщениями)
+    last_message_id UUID,
+    last_message_preview VARCHAR(255),
+    last_message_at TIMESTAMP WITH TIME ZONE,
+    last_message_user_id UUID,
+    members_count INTEGER NOT NULL DEFAULT 0,
+    -- Счётчик сообщений чата: непрочитанные = message_seq - chat_members.read_seq
+    message_seq BIGINT NOT NULL DEFAULT 0
 );
 
+-- Порядок списка чатов: последняя активность (у пустого чата — время создания)
+CREATE INDEX idx_chats_activity ON chats((coalesce(last_message_at, created_at)) DESC, id);
+
 -- Chat members (role: 'admin' | 'member')
 CREATE TABLE IF NOT EXISTS chat_members (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -33,10 +51,13 @@ CREATE TABLE IF NOT EXISTS chat_members (
     user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
     role VARCHAR(20) DEFAULT 'member',
     joined_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    UNIQUE(chat_id, user_id)
+    -- Курсор прочтения участника
+    last_read_message_id UUID,
+    last_read_at TIMESTAMP WITH TIME ZONE,
+    read_seq BIGINT NOT NULL DEFAULT 0,
+    CONSTRAINT uq_chat_members_chat_user UNIQUE(chat_id, user_id)
 );
 
-CREATE INDEX idx_chat_members_chat ON chat_members(chat_id);
 CREATE INDEX idx_chat_members_user ON chat_members(user_id);
 
 -- Messages (type: 'text' | 'image' | 'file')
@@ -47,11 +68,11 @@ CREATE TABLE IF NOT EXISTS messages (
     content TEXT,
     type VARCHAR(20) DEFAULT 'text',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    content_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('russian', coalesce(content, ''))) STORED
 );
 
-CREATE INDEX idx_messages_chat ON messages(chat_id);
-CREATE INDEX idx_messages_created ON messages(chat_id, created_at DESC);
+CREATE INDEX idx_messages_chat_created_id ON messages(chat_id, created_at DESC, id DESC);
 
 -- Attachments
 CREATE TABLE IF NOT EXISTS attachments (
@@ -60,13 +81,30 @@ CREATE TABLE IF NOT EXISTS attachments (
     url VARCHAR(500) NOT NULL,
     type VARCHAR(50),
     filename VARCHAR(255),
+    thumb_url VARCHAR(500),
+    medium_url VARCHAR(500),
+    blob_sha256 VARCHAR(64),
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
 CREATE INDEX idx_attachments_message ON attachments(message_id);
 
--- Full-text search on messages
-CREATE INDEX idx_messages_content_fts ON messages USING gin(to_tsvector('russian', content));
+-- Content-addressed uploads: one file per SHA-256, ref_count maintained by triggers below
+CREATE TABLE IF NOT EXISTS blobs (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    path VARCHAR(255) NOT NULL,
+    size BIGINT NOT NULL,
+    content_type VARCHAR(100),
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_uploaded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_blobs_orphans ON blobs(last_uploaded_at) WHERE ref_count <= 0;
+
+-- Full-text search on messages (stored tsvector) + trigram fallback for short/partial terms
+CREATE INDEX idx_messages_content_tsv ON messages USING gin(content_tsv);
+CREATE INDEX idx_messages_content_trgm ON messages USING gin(content gin_trgm_ops);
 
 -- Updated_at trigger
 CREATE OR REPLACE FUNCTION update_updated_at()
@@ -83,3 +121,29 @@ CREATE TRIGGER chats_updated_at BEFORE UPDATE ON chats
     FOR EACH ROW EXECUTE PROCEDURE update_updated_at();
 CREATE TRIGGER messages_updated_at BEFORE UPDATE ON messages
     FOR EACH ROW EXECUTE PROCEDURE update_updated_at();
+
+-- blobs.ref_count: statement-level, so multi-row inserts and cascaded deletes are counted too
+CREATE OR REPLACE FUNCTION blobs_ref_add()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE blobs b SET ref_count = b.ref_count + n.cnt
+    FROM (SELECT blob_sha256, count(*) AS cnt FROM new_rows WHERE blob_sha256 IS NOT NULL GROUP BY blob_sha256) n
+    WHERE b.sha256 = n.blob_sha256;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION blobs_ref_remove()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE blobs b SET ref_count = b.ref_count - o.cnt
+    FROM (SELECT blob_sha256, count(*) AS cnt FROM old_rows WHERE blob_sha256 IS NOT NULL GROUP BY blob_sha256) o
+    WHERE b.sha256 = o.blob_sha256;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER attachments_blob_ref_add AFTER INSERT ON attachments
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION blobs_ref_add();
+CREATE TRIGGER attachments_blob_ref_remove AFTER DELETE ON attachments
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION blobs_ref_remove();